@@ -0,0 +1,98 @@
+"""
+This module contains micro-benchmarks comparing the converters against their original implementations.
+
+Usage: python -m benchmarks.bench_converters [--number N]
+
+Author: Diógenes Dornelles Costa
+Creation Date: May 15, 2024
+Version: 1.0
+"""
+
+import argparse
+from timeit import timeit
+from typing import Any, Callable
+
+from benchmarks import reference
+from utils.float_converter import float_converter
+from utils.integer_converter import integer_converter
+
+FLOAT_INPUTS: dict[str, Any] = {
+    "float": 1234.56,
+    "plain": "1234.56",
+    "brl": "1.234.567,89",
+    "currency": "R$ 1.234,56",
+    "text": "abc123,45def",
+    "empty": "",
+}
+
+INTEGER_INPUTS: dict[str, Any] = {
+    "int": 12345678000190,
+    "digits": "12345678000190",
+    "masked": "12.345.678/0001-90",
+    "text": "CNPJ 12.345.678/0001-90 (matriz)",
+    "empty": "",
+}
+
+
+def per_call(func: Callable[[Any], Any], value: Any, number: int) -> float:
+    """Measures the time of one call, in nanoseconds.
+
+    Args:
+        func (Callable[[Any], Any]): The function to measure.
+        value (Any): The argument of each call.
+        number (int): The number of calls.
+
+    Returns:
+        float: The mean time per call, in nanoseconds.
+    """
+    return timeit(lambda: func(value), number=number) / number * 1e9
+
+
+def compare(
+    name: str,
+    baseline: Callable[[Any], Any],
+    current: Callable[[Any], Any],
+    inputs: dict[str, Any],
+    number: int,
+) -> None:
+    """Prints the per-call time of both implementations and the speedup for each input.
+
+    Args:
+        name (str): The function name.
+        baseline (Callable[[Any], Any]): The original implementation.
+        current (Callable[[Any], Any]): The current implementation.
+        inputs (dict[str, Any]): The inputs, keyed by a label.
+        number (int): The number of calls per measure.
+    """
+    print(f"{name}")
+    print(f"  {'input':<10}{'baseline (ns)':>15}{'current (ns)':>15}{'speedup':>10}")
+    for label, value in inputs.items():
+        assert baseline(value) == current(value), f"{name}({value!r}) differs from baseline"
+        before = per_call(baseline, value, number)
+        after = per_call(current, value, number)
+        print(f"  {label:<10}{before:>15.0f}{after:>15.0f}{before / after:>9.2f}x")
+
+
+def main() -> None:
+    """Runs the converters micro-benchmarks, bypassing the caches to measure the conversion itself."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--number", type=int, default=100_000, help="calls per measure")
+    args = parser.parse_args()
+    compare(
+        "float_converter",
+        reference.float_converter,
+        float_converter.__wrapped__,
+        FLOAT_INPUTS,
+        args.number,
+    )
+    compare(
+        "integer_converter",
+        reference.integer_converter,
+        integer_converter.__wrapped__,
+        INTEGER_INPUTS,
+        args.number,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""
+This module benchmarks every stage of the SIAFI/EFD pipeline on synthetic workbooks, headless.
+
+Usage: python -m benchmarks.bench_pipeline [--rows N] [--cnpjs N] [--overlap R] [--mismatch R] [--repeat N]
+
+Each stage is timed (best of --repeat runs) and then measured once more under tracemalloc for its peak
+memory. Results are appended to a JSON history and compared with the last run with the same parameters.
+
+Author: Diógenes Dornelles Costa
+Creation Date: May 15, 2024
+Version: 1.0
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from time import perf_counter
+from typing import Any, Callable
+
+from headless.stubs import install_stubs
+
+install_stubs()
+
+# pylint: disable=wrong-import-position
+import matplotlib.pyplot as plt  # noqa: E402
+import numpy as np  # type: ignore # noqa: E402
+import openpyxl  # type: ignore # noqa: E402
+import pandas as pd  # noqa: E402
+
+from benchmarks.synthetic import Workbooks, generate  # noqa: E402
+from components.infos import efd_info, parse_info, siafi_info  # noqa: E402
+from components.tables import efd_table, parse_table, siafi_table  # noqa: E402
+from pub_sub.pub_sub import pub_sub  # noqa: E402
+from sheets.efd import Efd  # noqa: E402
+from sheets.parse import Parse  # noqa: E402
+from sheets.siafi import Siafi  # noqa: E402
+from utils.upload import BufferReader  # noqa: E402
+
+ROOT = Path(__file__).resolve().parent.parent
+HISTORY = ROOT / "benchmarks" / "results" / "history.json"
+
+Measure = Callable[[str, Callable[[], Any]], None]
+
+
+def run_pipeline(workbooks: Workbooks, measure: Measure) -> None:
+    """Runs the SIAFI, EFD and Parse pipelines stage by stage, passing each stage to `measure`.
+
+    Args:
+        workbooks (Workbooks): The SIAFI and EFD workbooks.
+        measure (Measure): Callable receiving the stage name and a function running the stage.
+    """
+    pub_sub.reset()
+    siafi = Siafi(["RECOLHEDOR", "DOCUMENTO", "VALOR"], siafi_table, siafi_info)
+    efd = Efd(["CNPJ", "CNO", "VALOR"], efd_table, efd_info)
+    parse = Parse(parse_table, parse_info)
+
+    siafi._file = BufferReader(workbooks.siafi)  # pylint: disable=protected-access
+    measure("siafi.read", siafi.read)
+    measure("siafi.sanitize_columns", siafi.sanitize_columns)
+    measure("siafi.validate_keys", siafi.validate_keys)
+    measure("siafi.apply_groupby", siafi.apply_groupby)
+    measure("siafi.set_dict", siafi.set_dict)
+    measure("siafi.set_describe", siafi.set_describe)
+    measure("siafi.set_view", siafi.set_view)
+    measure("siafi.render", siafi.table.render)
+
+    efd._file = BufferReader(workbooks.efd)  # pylint: disable=protected-access
+    measure("efd.read", efd.read)
+    measure("efd.sanitize_columns", efd.sanitize_columns)
+    measure("efd.validate_keys", efd.validate_keys)
+    measure("efd.set_rollup", efd.set_rollup)
+    measure("efd.set_dict", efd.set_dict)
+    measure("efd.set_describe", efd.set_describe)
+    measure("efd.set_view", efd.set_view)
+    measure("efd.render", efd.table.render)
+
+    parse._siafi = siafi  # pylint: disable=protected-access
+    parse._efd = efd  # pylint: disable=protected-access
+    measure("parse.parse", parse.parse)
+    measure("parse.sanitize_columns", parse.sanitize_columns)
+    measure("parse.set_siafi_greater", parse.set_siafi_greater)
+    measure("parse.set_efd_greater", parse.set_efd_greater)
+    measure("parse.set_dict", parse.set_dict)
+    measure("parse.set_describe", parse.set_describe)
+    measure("parse.plot", parse.plot)
+    measure("parse.set_view", parse.set_view)
+    measure("parse.render", parse.table.render)
+    plt.close("all")
+
+
+def time_stages(workbooks: Workbooks, repeat: int) -> dict[str, float]:
+    """Times every stage, keeping the best of `repeat` runs.
+
+    Args:
+        workbooks (Workbooks): The SIAFI and EFD workbooks.
+        repeat (int): The number of runs.
+
+    Returns:
+        dict[str, float]: The best time of each stage, in seconds.
+    """
+    best: dict[str, float] = {}
+
+    def measure(name: str, stage: Callable[[], Any]) -> None:
+        start = perf_counter()
+        stage()
+        elapsed = perf_counter() - start
+        best[name] = min(elapsed, best.get(name, elapsed))
+
+    for _ in range(repeat):
+        run_pipeline(workbooks, measure)
+    return best
+
+
+def trace_stages(workbooks: Workbooks) -> dict[str, int]:
+    """Measures the peak memory allocated during every stage.
+
+    Args:
+        workbooks (Workbooks): The SIAFI and EFD workbooks.
+
+    Returns:
+        dict[str, int]: The peak of each stage, in bytes above the memory in use when it started.
+    """
+    peaks: dict[str, int] = {}
+
+    def measure(name: str, stage: Callable[[], Any]) -> None:
+        tracemalloc.reset_peak()
+        current, _ = tracemalloc.get_traced_memory()
+        stage()
+        _, peak = tracemalloc.get_traced_memory()
+        peaks[name] = peak - current
+
+    tracemalloc.start()
+    try:
+        run_pipeline(workbooks, measure)
+    finally:
+        tracemalloc.stop()
+    return peaks
+
+
+def git_commit() -> str:
+    """Gets the current commit, if any.
+
+    Returns:
+        str: The abbreviated commit hash, or an empty string.
+    """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def load_history(path: Path) -> list[dict[str, Any]]:
+    """Loads the benchmark history.
+
+    Args:
+        path (Path): The history file.
+
+    Returns:
+        list[dict[str, Any]]: The recorded runs, oldest first.
+    """
+    if path.exists():
+        return json.loads(path.read_text(encoding="utf-8"))
+    return []
+
+
+def report(record: dict[str, Any], previous: dict[str, Any] | None) -> None:
+    """Prints the stages of a run, with the change against a previous run.
+
+    Args:
+        record (dict[str, Any]): The run.
+        previous (dict[str, Any] | None): The previous run with the same parameters.
+    """
+    print(f"{'stage':<26}{'time (ms)':>12}{'peak (MiB)':>12}{'vs last':>10}")
+    for name, stage in record["stages"].items():
+        change = ""
+        if previous and name in previous["stages"] and previous["stages"][name]["seconds"]:
+            change = f"{stage['seconds'] / previous['stages'][name]['seconds'] - 1:+.0%}"
+        print(f"{name:<26}{stage['seconds'] * 1e3:>12.1f}{stage['peak_bytes'] / 2**20:>12.1f}{change:>10}")
+    print(f"{'total':<26}{sum(s['seconds'] for s in record['stages'].values()) * 1e3:>12.1f}")
+
+
+def main() -> None:
+    """Generates the workbooks, benchmarks the pipeline and records the results."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--rows", type=int, default=10_000, help="SIAFI rows")
+    parser.add_argument("--cnpjs", type=int, default=1_000, help="distinct CNPJs on each side")
+    parser.add_argument("--overlap", type=float, default=0.9, help="fraction of SIAFI CNPJs also in EFD")
+    parser.add_argument("--mismatch", type=float, default=0.1, help="fraction of shared CNPJs that differ")
+    parser.add_argument("--cnos", type=int, default=1, help="CNO rows per EFD CNPJ")
+    parser.add_argument("--by-site", action="store_true", help="SIAFI documents collected by CNO")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs, the best one is kept")
+    parser.add_argument("--history", type=Path, default=HISTORY, help="JSON history file")
+    parser.add_argument("--no-record", action="store_true", help="do not append the run to the history")
+    args = parser.parse_args()
+
+    os.chdir(ROOT)  # Components load their templates from ./templates
+    params = {
+        "rows": args.rows,
+        "cnpjs": args.cnpjs,
+        "overlap": args.overlap,
+        "mismatch": args.mismatch,
+        "cnos": args.cnos,
+        "by_site": args.by_site,
+        "seed": args.seed,
+    }
+    workbooks = generate(**params)
+    times = time_stages(workbooks, args.repeat)
+    peaks = trace_stages(workbooks)
+    record = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "params": params,
+        "versions": {
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "openpyxl": openpyxl.__version__,
+        },
+        "stages": {name: {"seconds": times[name], "peak_bytes": peaks.get(name, 0)} for name in times},
+    }
+
+    history = load_history(args.history)
+    previous = next((run for run in reversed(history) if run["params"] == params), None)
+    report(record, previous)
+    if not args.no_record:
+        history.append(record)
+        args.history.parent.mkdir(parents=True, exist_ok=True)
+        args.history.write_text(json.dumps(history, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+This module benchmarks the readers of the registry on the same synthetic data, as xlsx and as CSV.
+
+Usage: python -m benchmarks.bench_readers [--rows N] [--cnpjs N] [--repeat N]
+
+Every reader must give the same frame once the key and value columns are converted, as the pipeline does.
+
+Author: Diógenes Dornelles Costa
+Creation Date: May 15, 2024
+Version: 1.0
+"""
+
+import argparse
+from time import perf_counter
+from typing import Callable
+
+from headless.stubs import install_stubs
+
+install_stubs()
+
+# pylint: disable=wrong-import-position
+import pandas as pd  # noqa: E402
+from pandas import DataFrame  # noqa: E402
+
+from benchmarks.synthetic import SIAFI_HEADER, generate, to_csv, to_xlsx  # noqa: E402
+from sheets.ingestion import read_streaming  # noqa: E402
+from sheets.preflight import PREFLIGHTS, Preflight, detect_format  # noqa: E402
+from sheets.table import READERS, XLSX_ENGINES, float_column, integer_column, read_xlsx  # noqa: E402
+from utils.upload import BufferReader  # noqa: E402
+
+Reader = Callable[[], DataFrame]
+
+
+def layout_of(data: bytes, names: list[str]) -> Preflight:
+    """Finds the pre-flight layout of the data, once, outside the measures.
+
+    Args:
+        data (bytes): The file contents.
+        names (list[str]): The column names.
+
+    Returns:
+        Preflight: The layout.
+    """
+    file = BufferReader(data)
+    return PREFLIGHTS[detect_format(file)](file, names)
+
+
+def readers(xlsx: bytes, csv: bytes, names: list[str]) -> dict[str, Reader]:
+    """Lists the readers to compare, each reading a fresh file over its input.
+
+    Args:
+        xlsx (bytes): The data as a workbook.
+        csv (bytes): The same data as CSV.
+        names (list[str]): The column names.
+
+    Returns:
+        dict[str, Reader]: The readers, by label, the first being the read_excel fallback.
+    """
+    xlsx_layout = layout_of(xlsx, names)
+    csv_layout = layout_of(csv, names)
+    found: dict[str, Reader] = {}
+    for engine in reversed(XLSX_ENGINES):
+        found[f"xlsx read_excel ({engine})"] = (
+            lambda engine=engine: read_xlsx(BufferReader(xlsx), xlsx_layout, names, [engine])
+        )
+    found["xlsx streaming (xml)"] = lambda: read_streaming(BufferReader(xlsx), xlsx_layout, names)
+    found["csv read_csv (c)"] = lambda: READERS["csv"](BufferReader(csv), csv_layout, names)
+    found["csv streaming (c)"] = lambda: read_streaming(BufferReader(csv), csv_layout, names)
+    return found
+
+
+def converted(frame: DataFrame) -> DataFrame:
+    """Converts the key and value columns as the pipeline does, for comparing readers.
+
+    Args:
+        frame (DataFrame): The frame read.
+
+    Returns:
+        DataFrame: The converted frame.
+    """
+    frame = frame.copy()
+    frame[frame.columns[0]] = integer_column(frame[frame.columns[0]])
+    frame[frame.columns[-1]] = float_column(frame[frame.columns[-1]])
+    return frame
+
+
+def main() -> None:
+    """Generates the data in both formats and times every reader on it."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--rows", type=int, default=50_000, help="SIAFI rows")
+    parser.add_argument("--cnpjs", type=int, default=5_000, help="distinct CNPJs")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs, the best one is kept")
+    args = parser.parse_args()
+
+    xlsx = generate(rows=args.rows, cnpjs=args.cnpjs, writer=to_xlsx).siafi
+    csv = generate(rows=args.rows, cnpjs=args.cnpjs, writer=to_csv).siafi
+    print(f"SIAFI, {args.rows} rows: xlsx {len(xlsx) / 2**20:.1f} MiB, csv {len(csv) / 2**20:.1f} MiB")
+    print(f"  {'reader':<28}{'seconds':>10}{'rows/s':>12}{'speedup':>10}")
+
+    baseline = None
+    expected = None
+    for label, read in readers(xlsx, csv, SIAFI_HEADER).items():
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = perf_counter()
+            frame = read()
+            best = min(best, perf_counter() - start)
+        frame = converted(frame)
+        if expected is None:
+            expected, baseline = frame, best
+        else:
+            pd.testing.assert_frame_equal(frame, expected, check_dtype=False)
+        print(f"  {label:<28}{best:>10.3f}{len(frame) / best:>12.0f}{baseline / best:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,448 @@
+"""
+This module contains a differential test harness, running each optimized function side by side with its
+original implementation (benchmarks.reference) on randomized Brazilian-formatted inputs.
+
+Usage: python -m benchmarks.differential [--cases N] [--rows N] [--seed N] [--repeat N]
+
+The inputs mix thousands separators, currency symbols, stray text, empty cells, missing values, negatives
+and duplicated keys, after the edge cases every run checks: 0 then 0.0 then -0.0, NaN and "". Every result
+must be exactly equal to the original one, raising the same exception when the original raises; the time
+of both implementations over all the inputs gives the speedup.
+
+Parse is compared where the original semantics still apply: one Efd row per CNPJ, without CNO (0), joined
+by CNPJ. The original join kept the Efd CNO column where the current one has the rollup OBRAS, so only the
+columns both have are compared.
+
+Author: Diógenes Dornelles Costa
+Creation Date: May 15, 2024
+Version: 1.0
+"""
+
+import argparse
+import sys
+from time import perf_counter
+from typing import Any, Callable, Sequence, TypedDict
+
+from headless.stubs import install_stubs
+
+install_stubs()
+
+# pylint: disable=wrong-import-position
+import numpy as np  # type: ignore # noqa: E402
+import pandas as pd  # noqa: E402
+from pandas import DataFrame, Series  # noqa: E402
+
+from benchmarks import reference  # noqa: E402
+from benchmarks.synthetic import cnpj_check_digits, format_brl, format_cnpj  # noqa: E402
+from components.infos import efd_info, parse_info, siafi_info  # noqa: E402
+from components.tables import efd_table, parse_table, siafi_table  # noqa: E402
+from sheets.efd import Efd  # noqa: E402
+from sheets.parse import Parse  # noqa: E402
+from sheets.siafi import Siafi  # noqa: E402
+from sheets.table import float_column, integer_column  # noqa: E402
+from utils.cache import clear_caches  # noqa: E402
+from utils.float_converter import float_converter  # noqa: E402
+from utils.format_brl_currency import format_brl_currency  # noqa: E402
+from utils.integer_converter import integer_converter  # noqa: E402
+
+PARSE_COLUMNS = ["RECOLHEDOR", "DOCUMENTO", "VALOR_SIAFI", "CNPJ", "VALOR_EFD", "DIFERENÇAS"]
+STRAY_TEXT = ["", " ", "-", "abc", "n/d", "R$", "valor:", "(matriz)", "obs 12"]
+EDGE_VALUES = (0, 0.0, -0.0, np.nan, "")  # in this order, equal keys of a cache that must not share a result
+SHEET_MISSING = (None, "")  # NaN keys make both integer_converter versions raise, failing the sanitization
+MISMATCHES_SHOWN = 5
+
+
+class Outcome(TypedDict):
+    """The comparison of an optimized function with its original implementation."""
+    name: str
+    cases: int
+    mismatches: list[str]
+    reference: float  # seconds, over all the cases
+    fast: float
+
+
+def brl_value(rng: np.random.Generator) -> Any:
+    """Draws a value as found in the VALOR columns.
+
+    Args:
+        rng (np.random.Generator): The random generator.
+
+    Returns:
+        Any: A Brazilian-formatted string, a number, a missing value or stray text.
+    """
+    value = round(float(rng.choice([1, 100, 1e6])) * rng.standard_normal(), 2)
+    kind = rng.integers(10)
+    if kind == 0:
+        return value
+    if kind == 1:
+        return int(value)
+    if kind == 2:
+        return rng.choice([None, np.nan, ""])
+    if kind == 3:
+        return str(rng.choice(STRAY_TEXT))
+    if kind == 4:
+        return f"R$ {format_brl(value)}"
+    if kind == 5:
+        return f"{rng.choice(STRAY_TEXT)} {format_brl(value)} {rng.choice(STRAY_TEXT)}"
+    if kind == 6:
+        return f"{value:.2f}"
+    if kind == 7:
+        return format_brl(value).replace(".", "")
+    return format_brl(value)
+
+
+def key_value(rng: np.random.Generator, keys: np.ndarray, missing: Sequence[Any] = (None, np.nan, "")) -> Any:
+    """Draws a key as found in the RECOLHEDOR and CNPJ columns, from a pool, so keys repeat.
+
+    Args:
+        rng (np.random.Generator): The random generator.
+        keys (np.ndarray): The pool of CNPJs.
+        missing (Sequence[Any], optional): The missing values. Defaults to None, NaN and "".
+
+    Returns:
+        Any: A masked or plain CNPJ, a number, a missing value or stray text.
+    """
+    cnpj = int(rng.choice(keys))
+    kind = rng.integers(8)
+    if kind == 0:
+        return cnpj
+    if kind == 1:
+        return float(cnpj)
+    if kind == 2:
+        return missing[rng.integers(len(missing))]
+    if kind == 3:
+        return f"CNPJ {format_cnpj(cnpj)} {rng.choice(STRAY_TEXT)}"
+    if kind == 4:
+        return f"{cnpj:014d}"
+    return format_cnpj(cnpj)
+
+
+def key_pool(rng: np.random.Generator, size: int) -> np.ndarray:
+    """Draws distinct CNPJs with valid check digits.
+
+    Args:
+        rng (np.random.Generator): The random generator.
+        size (int): The number of CNPJs.
+
+    Returns:
+        np.ndarray: The CNPJs.
+    """
+    bases = np.unique(rng.integers(10**9, 10**12, size=size))
+    return np.array([cnpj_check_digits(int(base)) for base in bases], dtype=np.int64)
+
+
+def siafi_sheet(rng: np.random.Generator, keys: np.ndarray, rows: int) -> DataFrame:
+    """Generates a Siafi sheet sanitized as the original Siafi.sanitize_columns did.
+
+    Args:
+        rng (np.random.Generator): The random generator.
+        keys (np.ndarray): The pool of CNPJs.
+        rows (int): The number of rows.
+
+    Returns:
+        DataFrame: RECOLHEDOR, DOCUMENTO (some missing) and VALOR, sorted by RECOLHEDOR.
+    """
+    df = DataFrame(
+        {
+            "RECOLHEDOR": [reference.integer_converter(key_value(rng, keys, SHEET_MISSING)) for _ in range(rows)],
+            "DOCUMENTO": [None if rng.random() < 0.05 else f"2024NS{n:06d}" for n in range(rows)],
+            "VALOR": [reference.float_converter(brl_value(rng)) for _ in range(rows)],
+        }
+    )
+    df.sort_values(by="RECOLHEDOR", kind="stable", inplace=True)
+    df.reset_index(drop=True, inplace=True)
+    return df
+
+
+def efd_sheet(rng: np.random.Generator, keys: np.ndarray, rows: int) -> DataFrame:
+    """Generates an Efd sheet sanitized as the original Efd.sanitize_columns did, without CNO.
+
+    Args:
+        rng (np.random.Generator): The random generator.
+        keys (np.ndarray): The pool of CNPJs.
+        rows (int): The number of rows, before dropping the duplicated CNPJs.
+
+    Returns:
+        DataFrame: CNPJ, CNO (0) and VALOR, one row per CNPJ, sorted by CNPJ and indexed from 1.
+    """
+    df = DataFrame(
+        {
+            "CNPJ": [reference.integer_converter(key_value(rng, keys, SHEET_MISSING)) for _ in range(rows)],
+            "CNO": np.zeros(rows, dtype=np.int64),
+            "VALOR": [reference.float_converter(brl_value(rng)) for _ in range(rows)],
+        }
+    )
+    df["VALOR"] = df["VALOR"].round(2)
+    df.drop_duplicates(subset="CNPJ", keep="last", inplace=True)
+    df.sort_values(by="CNPJ", inplace=True)
+    df.reset_index(drop=True, inplace=True)
+    df.set_index(np.arange(1, df.shape[0] + 1), inplace=True)
+    return df
+
+
+def columns(rng: np.random.Generator, keys: np.ndarray, rows: int) -> list[Series]:
+    """Generates the columns given to float_column and integer_column, raw and already parsed by a reader.
+
+    Args:
+        rng (np.random.Generator): The random generator.
+        keys (np.ndarray): The pool of CNPJs.
+        rows (int): The number of rows.
+
+    Returns:
+        list[Series]: Object columns of values and of keys, and float, integer and nullable columns.
+    """
+    values = rng.standard_normal(rows) * 1e4
+    return [
+        Series([brl_value(rng) for _ in range(rows)], dtype=object),
+        Series([key_value(rng, keys) for _ in range(rows)], dtype=object),
+        Series(values.round(2)),
+        Series(np.where(rng.random(rows) < 0.1, np.nan, values)),
+        Series(rng.choice(keys, size=rows)),
+        Series(pd.array(np.where(rng.random(rows) < 0.1, None, rng.choice(keys, size=rows)), dtype="Int64")),
+    ]
+
+
+def same(expected: Any, actual: Any) -> bool:
+    """Exact equality: the same type and value, a NaN matching a NaN and 0.0 not matching -0.0.
+
+    Args:
+        expected (Any): The original result.
+        actual (Any): The optimized result.
+
+    Returns:
+        bool: True if both are the same.
+    """
+    if isinstance(expected, DataFrame) or isinstance(actual, DataFrame):
+        try:
+            pd.testing.assert_frame_equal(expected, actual, check_exact=True)
+        except AssertionError:
+            return False
+        return True
+    if isinstance(expected, Series) or isinstance(actual, Series):
+        try:
+            pd.testing.assert_series_equal(expected, actual, check_exact=True)
+        except AssertionError:
+            return False
+        return True
+    if type(expected) is not type(actual):
+        return False
+    if isinstance(expected, float):
+        return repr(expected) == repr(actual)
+    return expected == actual
+
+
+def result(func: Callable[..., Any], case: tuple) -> tuple[str, Any]:
+    """Calls a function, catching the exception it raises.
+
+    Args:
+        func (Callable[..., Any]): The function.
+        case (tuple): Its arguments.
+
+    Returns:
+        tuple[str, Any]: ("value", the result) or ("error", the exception type).
+    """
+    try:
+        return "value", func(*case)
+    except Exception as er:  # pylint: disable=broad-except
+        return "error", type(er)
+
+
+def elapsed(func: Callable[..., Any], cases: Sequence[tuple], repeat: int) -> float:
+    """Times a function over all the cases, starting each run with empty caches.
+
+    Args:
+        func (Callable[..., Any]): The function.
+        cases (Sequence[tuple]): The arguments of each call.
+        repeat (int): The number of runs.
+
+    Returns:
+        float: The best time of a run, in seconds.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        clear_caches()
+        start = perf_counter()
+        for case in cases:
+            result(func, case)
+        best = min(best, perf_counter() - start)
+    return best
+
+
+def differential(
+    name: str,
+    original: Callable[..., Any],
+    fast: Callable[..., Any],
+    cases: Sequence[tuple],
+    repeat: int = 3,
+) -> Outcome:
+    """Runs an optimized function and its original implementation on the same cases.
+
+    Args:
+        name (str): The function name.
+        original (Callable[..., Any]): The original implementation.
+        fast (Callable[..., Any]): The optimized function.
+        cases (Sequence[tuple]): The arguments of each call, which neither function may change.
+        repeat (int, optional): The number of timed runs. Defaults to 3.
+
+    Returns:
+        Outcome: The mismatching cases and the time of both functions.
+    """
+    clear_caches()
+    mismatches = []
+    for case in cases:
+        (expected_kind, expected), (actual_kind, actual) = result(original, case), result(fast, case)
+        if expected_kind != actual_kind or not same(expected, actual):
+            arguments = ", ".join(repr(argument) if np.isscalar(argument) or argument is None
+                                  else type(argument).__name__ for argument in case)
+            mismatches.append(f"{name}({arguments}): {expected!r} != {actual!r}")
+    return Outcome(
+        name=name,
+        cases=len(cases),
+        mismatches=mismatches,
+        reference=elapsed(original, cases, repeat),
+        fast=elapsed(fast, cases, repeat),
+    )
+
+
+def siafi_groupby(df: DataFrame) -> DataFrame:
+    """Runs Siafi.apply_groupby on a sanitized Siafi sheet, which it replaces without changing.
+
+    Args:
+        df (DataFrame): The Siafi sheet.
+
+    Returns:
+        DataFrame: The grouped sheet.
+    """
+    siafi = Siafi(["RECOLHEDOR", "DOCUMENTO", "VALOR"], siafi_table, siafi_info)
+    siafi._df = df  # pylint: disable=protected-access
+    siafi.apply_groupby()
+    return siafi.df
+
+
+def efd_rolled_up(df: DataFrame) -> Efd:
+    """Gets an Efd sheet with its rollup, as Parse.parse expects it.
+
+    Args:
+        df (DataFrame): The Efd sheet, one row per CNPJ, without CNO.
+
+    Returns:
+        Efd: The Efd sheet.
+    """
+    efd = Efd(["CNPJ", "CNO", "VALOR"], efd_table, efd_info)
+    efd._df = df  # pylint: disable=protected-access
+    efd.set_rollup()
+    return efd
+
+
+def parse_by_cnpj(siafi_df: DataFrame, efd: Efd) -> DataFrame:
+    """Runs Parse.parse, joining by CNPJ.
+
+    Args:
+        siafi_df (DataFrame): Siafi grouped by RECOLHEDOR.
+        efd (Efd): The Efd sheet, one row per CNPJ, without CNO.
+
+    Returns:
+        DataFrame: The columns of the join that the original one also has.
+    """
+    siafi = Siafi(["RECOLHEDOR", "DOCUMENTO", "VALOR"], siafi_table, siafi_info)
+    siafi._df = siafi_df  # pylint: disable=protected-access
+    parse = Parse(parse_table, parse_info)
+    parse._siafi = siafi  # pylint: disable=protected-access
+    parse._efd = efd  # pylint: disable=protected-access
+    parse.parse()
+    return parse.df[PARSE_COLUMNS]
+
+
+def parse_reference(siafi_df: DataFrame, efd: Efd) -> DataFrame:
+    """Runs the original Parse.parse on the same sheets as parse_by_cnpj.
+
+    Args:
+        siafi_df (DataFrame): Siafi grouped by RECOLHEDOR.
+        efd (Efd): The Efd sheet, one row per CNPJ, without CNO.
+
+    Returns:
+        DataFrame: The columns compared with parse_by_cnpj.
+    """
+    return reference.parse(siafi_df, efd.df)[PARSE_COLUMNS]
+
+
+def run_all(cases: int, rows: int, seed: int, repeat: int = 3) -> list[Outcome]:
+    """Compares every optimized function with its original implementation.
+
+    Args:
+        cases (int): The number of values for the scalar functions, and a sheet per thousand for the others.
+        rows (int): The number of rows of each column and sheet.
+        seed (int): The seed of the random inputs.
+        repeat (int, optional): The number of timed runs. Defaults to 3.
+
+    Returns:
+        list[Outcome]: The outcome of each function.
+    """
+    rng = np.random.default_rng(seed)
+    keys = key_pool(rng, max(rows // 10, 2))
+    values = [(value,) for value in EDGE_VALUES] + [(brl_value(rng),) for _ in range(cases)]
+    key_cases = [(key_value(rng, keys),) for _ in range(cases)]
+    amounts = [(value,) for value in EDGE_VALUES]
+    amounts += [(value,) for value in [reference.float_converter(value) for (value,) in values]]
+    amounts += [(value,) for (value,) in values if not isinstance(value, float)]
+    sheets = max(cases // 1000, 1)
+    column_cases = [(column,) for _ in range(sheets) for column in columns(rng, keys, rows)]
+    siafi_cases = [(siafi_sheet(rng, keys, rows),) for _ in range(sheets)]
+    parse_cases = [
+        (reference.apply_groupby(siafi_df), efd_rolled_up(efd_sheet(rng, keys, rows // 2))) for (siafi_df,) in siafi_cases
+    ]
+    return [
+        differential("float_converter", reference.float_converter, float_converter, values + key_cases, repeat),
+        differential("integer_converter", reference.integer_converter, integer_converter, key_cases + values, repeat),
+        differential("format_brl_currency", reference.format_brl_currency, format_brl_currency, amounts, repeat),
+        differential(
+            "float_column", lambda column: column.apply(reference.float_converter), float_column, column_cases, repeat
+        ),
+        differential(
+            "integer_column",
+            lambda column: column.apply(reference.integer_converter),
+            integer_column,
+            column_cases,
+            repeat,
+        ),
+        differential("Siafi.apply_groupby", reference.apply_groupby, siafi_groupby, siafi_cases, repeat),
+        differential("Parse.parse", parse_reference, parse_by_cnpj, parse_cases, repeat),
+    ]
+
+
+def report(outcomes: list[Outcome]) -> bool:
+    """Prints the mismatches and the speedup of each function.
+
+    Args:
+        outcomes (list[Outcome]): The outcomes.
+
+    Returns:
+        bool: True if no function mismatched.
+    """
+    print(f"{'function':<22}{'cases':>8}{'mismatches':>12}{'reference (ms)':>16}{'fast (ms)':>12}{'speedup':>10}")
+    for outcome in outcomes:
+        print(
+            f"{outcome['name']:<22}{outcome['cases']:>8}{len(outcome['mismatches']):>12}"
+            f"{outcome['reference'] * 1e3:>16.1f}{outcome['fast'] * 1e3:>12.1f}"
+            f"{outcome['reference'] / outcome['fast']:>9.2f}x"
+        )
+    for outcome in outcomes:
+        for mismatch in outcome["mismatches"][:MISMATCHES_SHOWN]:
+            print(f"  {mismatch}")
+    return not any(outcome["mismatches"] for outcome in outcomes)
+
+
+def main() -> None:
+    """Runs the differential tests, exiting with status 1 on any mismatch."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--cases", type=int, default=10_000, help="values for the scalar functions")
+    parser.add_argument("--rows", type=int, default=10_000, help="rows of each column and sheet")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random inputs")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs, keeping the best")
+    args = parser.parse_args()
+    if not report(run_all(args.cases, args.rows, args.seed, args.repeat)):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+This module keeps the original implementations of optimized functions, used as the baseline by benchmarks.
+
+Author: Diógenes Dornelles Costa
+Creation Date: May 15, 2024
+Version: 1.0
+"""
+
+import re
+from decimal import Decimal
+from typing import Any, Union
+
+import numpy as np  # type: ignore
+import pandas as pd
+from babel.numbers import format_currency  # type: ignore
+from pandas import DataFrame
+
+
+def float_converter(value: Any) -> float:
+    """Original float_converter, without cache and without printing errors.
+
+    Args:
+        value (int | float | str): The value to convert, which could be an integer, float, or a string.
+    Returns:
+        float: The converted float value.
+    """
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        _match = re.search(r"(?P<with_comma>[\d.,]+)|(?P<without_comma>[\d.]+)", value)
+        if _match:
+            cleaned_value = _match.group("with_comma") or _match.group("without_comma")
+            if "," in cleaned_value:
+                cleaned_value = cleaned_value.replace(".", "")
+                cleaned_value = cleaned_value.replace(
+                    ",", ".", cleaned_value.count(".") - 1
+                )
+            else:
+                cleaned_value = cleaned_value.replace(
+                    ".", "", cleaned_value.count(".") - 1
+                )
+            try:
+                return float(cleaned_value)
+            except ValueError:
+                return 0.0
+            except Exception:
+                return 0.0
+    return 0.0
+
+
+def integer_converter(value: Union[int, float, str]) -> int:
+    """Original integer_converter, without cache.
+
+    Args:
+        value (Union[int, float, str]): The value to convert to an integer.
+
+    Returns:
+        int: The converted integer, or 0 if conversion is not possible.
+    """
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, str):
+        cleaned_value = re.sub(r"\D", "", value)
+        if cleaned_value:
+            try:
+                return int(cleaned_value)
+            except ValueError:
+                pass
+    return 0
+
+
+def format_brl_currency(value: float) -> str:
+    """Original format_brl_currency, without cache.
+
+    Args:
+        value (float): The numeric value to format as currency.
+
+    Returns:
+        str: The formatted currency string representing the value in BRL.
+    """
+    if not isinstance(value, float):
+        return "R$ 0,00"
+    try:
+        decimal_value = Decimal(value)
+    except (TypeError, ValueError):
+        return "R$ 0,00"
+    return format_currency(decimal_value, "BRL", locale="pt_BR")
+
+
+def apply_groupby(df: DataFrame) -> DataFrame:
+    """Original Siafi.apply_groupby, as a function of the sanitized Siafi sheet.
+
+    Args:
+        df (DataFrame): The Siafi sheet, with RECOLHEDOR, DOCUMENTO and VALOR.
+
+    Returns:
+        DataFrame: The documents count and the total VALOR of each RECOLHEDOR, indexed from 1.
+    """
+    recolhedores_group = df.groupby("RECOLHEDOR")
+    data = {
+        "DOCUMENTO": recolhedores_group["DOCUMENTO"].count(),
+        "VALOR": recolhedores_group["VALOR"].sum(),
+    }
+    grouped = pd.DataFrame(data=data).reset_index()
+    grouped["VALOR"] = grouped["VALOR"].round(2)
+    grouped.index = np.arange(1, len(grouped) + 1)
+    return grouped
+
+
+def parse(siafi: DataFrame, efd: DataFrame) -> DataFrame:
+    """Original Parse.parse, as a function of the grouped Siafi sheet and the sanitized Efd sheet.
+
+    Args:
+        siafi (DataFrame): Siafi grouped by RECOLHEDOR.
+        efd (DataFrame): Efd, one row per CNPJ.
+
+    Returns:
+        DataFrame: The outer join by RECOLHEDOR and CNPJ with the DIFERENÇAS, indexed from 1.
+    """
+    df = siafi.merge(
+        right=efd,
+        how="outer",
+        left_on="RECOLHEDOR",
+        right_on="CNPJ",
+        suffixes=("_SIAFI", "_EFD"),
+    )
+    df.fillna(0.00, inplace=True)
+    df["DIFERENÇAS"] = df["VALOR_SIAFI"] - df["VALOR_EFD"]
+    df["DIFERENÇAS"] = df["DIFERENÇAS"].round(2)
+    df.reset_index(drop=True, inplace=True)
+    df.set_index(np.arange(1, df.shape[0] + 1), inplace=True)
+    return df
@@ -0,0 +1,202 @@
+"""
+This module generates synthetic SIAFI and EFD workbooks with Brazilian-formatted values.
+
+Author: Diógenes Dornelles Costa
+Creation Date: May 15, 2024
+Version: 1.0
+"""
+
+import csv
+from io import BytesIO, StringIO
+from typing import Callable, Iterable, NamedTuple
+
+import numpy as np  # type: ignore
+from openpyxl import Workbook  # type: ignore
+
+SIAFI_HEADER = ["RECOLHEDOR", "DOCUMENTO", "VALOR"]
+EFD_HEADER = ["CNPJ", "CNO", "VALOR"]
+
+_BRL_SEPARATORS = str.maketrans(",.", ".,")
+
+
+Writer = Callable[[list[str], Iterable[tuple]], bytes]
+
+
+class Workbooks(NamedTuple):
+    """A pair of generated workbooks, as xlsx (or CSV) bytes."""
+    siafi: bytes
+    efd: bytes
+
+
+def cnpj_check_digits(base: int) -> int:
+    """Appends the two check digits to the first 12 digits of a CNPJ.
+
+    Args:
+        base (int): The first 12 digits (raiz, filial) of the CNPJ.
+
+    Returns:
+        int: The 14-digit CNPJ.
+    """
+    digits = [int(char) for char in f"{base:012d}"]
+    for weights in ([5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2], [6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2]):
+        remainder = sum(d * w for d, w in zip(digits, weights)) % 11
+        digits.append(0 if remainder < 2 else 11 - remainder)
+    return int("".join(map(str, digits)))
+
+
+def format_cnpj(cnpj: int) -> str:
+    """Formats a CNPJ with its mask, e.g. 12.345.678/0001-95.
+
+    Args:
+        cnpj (int): The CNPJ.
+
+    Returns:
+        str: The masked CNPJ.
+    """
+    text = f"{cnpj:014d}"
+    return f"{text[:2]}.{text[2:5]}.{text[5:8]}/{text[8:12]}-{text[12:]}"
+
+
+def format_brl(value: float) -> str:
+    """Formats a value in the Brazilian format, e.g. 1.234,56.
+
+    Args:
+        value (float): The value.
+
+    Returns:
+        str: The formatted value.
+    """
+    return f"{value:,.2f}".translate(_BRL_SEPARATORS)
+
+
+def random_cnpjs(rng: np.random.Generator, count: int) -> np.ndarray:
+    """Draws distinct valid CNPJs.
+
+    Args:
+        rng (np.random.Generator): The random generator.
+        count (int): The number of CNPJs.
+
+    Returns:
+        np.ndarray: The CNPJs.
+    """
+    raizes = rng.choice(10**8, size=count, replace=False)
+    filiais = rng.integers(1, 10, size=count)
+    return np.array([cnpj_check_digits(int(r) * 10**4 + int(f)) for r, f in zip(raizes, filiais)], dtype=np.int64)
+
+
+def to_xlsx(header: list[str], rows: Iterable[tuple]) -> bytes:
+    """Writes rows to an xlsx workbook in write-only mode.
+
+    Args:
+        header (list[str]): The header row.
+        rows (Iterable[tuple]): The data rows.
+
+    Returns:
+        bytes: The workbook.
+    """
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(header)
+    for row in rows:
+        sheet.append(row)
+    buffer = BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def to_csv(header: list[str], rows: Iterable[tuple]) -> bytes:
+    """Writes rows to a semicolon-separated CSV, encoded as Latin-1 like the SIAFI exports.
+
+    Args:
+        header (list[str]): The header row.
+        rows (Iterable[tuple]): The data rows.
+
+    Returns:
+        bytes: The CSV.
+    """
+    buffer = StringIO()
+    table = csv.writer(buffer, delimiter=";", lineterminator="\n")
+    table.writerow(header)
+    table.writerows(rows)
+    return buffer.getvalue().encode("latin-1")
+
+
+def generate(
+    rows: int = 10_000,
+    cnpjs: int = 1_000,
+    overlap: float = 0.9,
+    mismatch: float = 0.1,
+    cnos: int = 1,
+    by_site: bool = False,
+    seed: int = 0,
+    writer: Writer = to_xlsx,
+) -> Workbooks:
+    """Generates a SIAFI workbook and its EFD counterpart.
+
+    SIAFI holds `rows` documents spread over `cnpjs` recolhedores. EFD declares a fraction `overlap` of those
+    CNPJs, plus new ones to keep the same count, and a fraction `mismatch` of the shared CNPJs declares a
+    value different from the SIAFI total. Each EFD CNPJ is split into `cnos` construction sites (CNO), up to
+    999. With `by_site`, each SIAFI document is collected by a site of its CNPJ, the CNO being the RECOLHEDOR,
+    and the shared EFD sites declare the total of their documents (a mismatch goes to the last site).
+
+    Args:
+        rows (int, optional): The number of SIAFI rows. Defaults to 10_000.
+        cnpjs (int, optional): The number of distinct CNPJs on each side. Defaults to 1_000.
+        overlap (float, optional): The fraction of SIAFI CNPJs also in EFD. Defaults to 0.9.
+        mismatch (float, optional): The fraction of shared CNPJs whose values differ. Defaults to 0.1.
+        cnos (int, optional): The number of CNO rows per EFD CNPJ. Defaults to 1.
+        by_site (bool, optional): Whether SIAFI documents are collected by CNO. Defaults to False.
+        seed (int, optional): The random seed. Defaults to 0.
+        writer (Writer, optional): Writes the header and rows to bytes, e.g. to_csv. Defaults to to_xlsx.
+
+    Returns:
+        Workbooks: The SIAFI and EFD workbooks.
+    """
+    rng = np.random.default_rng(seed)
+    keys = random_cnpjs(rng, 2 * cnpjs)
+    siafi_keys = keys[:cnpjs]
+
+    # Every recolhedor gets at least one document, the remaining ones are spread at random
+    owners = np.concatenate([np.arange(min(rows, cnpjs)), rng.integers(0, cnpjs, size=max(0, rows - cnpjs))])
+    rng.shuffle(owners)
+    values = np.round(rng.uniform(10.0, 50_000.0, size=rows), 2)
+    totals = np.bincount(owners, weights=values, minlength=cnpjs)
+
+    shared = int(round(cnpjs * overlap))
+    efd_keys = np.concatenate([siafi_keys[:shared], keys[cnpjs:2 * cnpjs - shared]])
+    efd_values = np.concatenate([totals[:shared], np.round(rng.uniform(10.0, 50_000.0, size=cnpjs - shared), 2)])
+    mismatched = rng.choice(shared, size=int(round(shared * mismatch)), replace=False)
+    signs = rng.choice([-1.0, 1.0], size=mismatched.size)
+    efd_values[mismatched] += signs * np.round(rng.uniform(0.01, 1_000.0, size=mismatched.size), 2)
+    efd_values = np.round(efd_values, 2)
+    sites = rng.integers(1, cnos + 1, size=rows)
+    site_totals = np.bincount(owners * cnos + sites - 1, weights=values, minlength=cnpjs * cnos)
+
+    def cno(key: int, site: int) -> int:
+        return 10**11 + key // 10**6 * 10**3 + site  # 12 digits with the raiz, unique per site
+
+    siafi = writer(
+        SIAFI_HEADER,
+        (
+            (
+                cno(int(siafi_keys[owner]), int(site)) if by_site else format_cnpj(int(siafi_keys[owner])),
+                f"2024NS{number:06d}",
+                format_brl(float(value)),
+            )
+            for number, (owner, site, value) in enumerate(zip(owners, sites, values), start=1)
+        ),
+    )
+
+    def efd_rows():
+        for index, (key, value) in enumerate(zip(efd_keys, efd_values)):
+            if by_site and index < shared:
+                parts = np.round(site_totals[index * cnos:(index + 1) * cnos], 2)
+                parts[-1] = round(parts[-1] + float(value) - float(totals[index]), 2)
+            else:
+                parts = np.full(cnos, round(float(value) / cnos, 2))
+                parts[-1] = round(float(value) - float(parts[:-1].sum()), 2)
+            for site, part in enumerate(parts, start=1):
+                yield format_cnpj(int(key)), cno(int(key), site), format_brl(float(part))
+
+    efd = writer(EFD_HEADER, efd_rows())
+    return Workbooks(siafi=siafi, efd=efd)
@@ -16,12 +16,14 @@ Variables TypedDict:
 - `columns`: List of column names.
 - `describe`: Dictionary representing descriptive statistics.
 - `ready`: Boolean indicating whether the data is ready.
+- `keys`: List of the columns identifying a table row, optional.
 
 Component Class:
 - `__init__`: Constructor method to initialize a Component instance.
 - Properties: Getters and setters for component attributes.
 - `unset_var()`: Method to reset variables to initial state.
 - `render()`: Method to render the component template with provided variables.
+- `stream()`: Method to render the component in chunks of rows, for progressive display of large tables.
 
 Explanation:
 - `Variables` is a TypedDict defining the structure of variables used within components.
@@ -32,11 +34,13 @@ Explanation:
 - Error handling is implemented for template rendering to catch any potential errors.
 """
 
-from typing import Any, Hashable, Literal, TypedDict
+from typing import Any, Hashable, Iterator, Literal, TypedDict
 
 from jinja2 import Environment, FileSystemLoader, Template  # type: ignore
 from js import alert  # type: ignore
 
+from utils.profiler import profiled
+
 env = Environment(loader=FileSystemLoader("./templates"))
 
 
@@ -52,6 +56,7 @@ class Variables(TypedDict, total=False):
     columns: list[Hashable]
     describe: dict[Hashable, Any]
     ready: bool
+    keys: list[str]
 
 
 class Component:
@@ -69,6 +74,7 @@ class Component:
         src: str = "",
         _class: str = "",
         display: Literal["flex", "hidden", "grid", "block"] = "block",
+        rows_template: str = "",
         variables: Variables = {
             "table": {},
             "len": 0,
@@ -89,6 +95,8 @@ class Component:
             src (str, optional): The source of the component. Defaults to "".
             _class (str, optional): The CSS class of the component. Defaults to "".
             display (Literal["flex", "hidden", "grid", "block"], optional): The display property of the component. Defaults to "block".
+            rows_template (str, optional): The template file name of the table rows, included by the template,
+                to render the rows in chunks. Defaults to "", not streamable.
             variables (Variables, optional): The variables used in the component. Defaults to {}.
         """
         self._name = name
@@ -106,6 +114,7 @@ class Component:
         except Exception as e:
             print(e)
             self._template: Template = self._env.get_template("empty.html")
+        self._rows_template: Template | None = self._env.get_template(rows_template) if rows_template else None
 
     @property
     def name(self) -> str:
@@ -297,6 +306,7 @@ class Component:
             table={}, len=0, columns=[""], describe={}, ready=False
         )
 
+    @profiled(label=lambda self: self.name)
     def render(self) -> str:
         """Renders the component template with its variables.
 
@@ -315,3 +325,54 @@ class Component:
         except TypeError as ts:
             alert(ts)
             return ""
+
+    def render_rows(self, positions: Any) -> list[str]:
+        """Renders single rows of the rows template.
+
+        Args:
+            positions (Any): The positions of the rows.
+
+        Returns:
+            list[str]: The HTML of each row.
+        """
+        if self._rows_template is None:
+            return []
+        context = dict(name=self._name, _id=self._id, _class=self._class, src=self._src, **self._variables)
+        return [self._rows_template.render(**context, rows=[position]) for position in positions]
+
+    @property
+    def streamable(self) -> bool:
+        """Checks whether the component can be rendered in chunks of rows.
+
+        Returns:
+            bool: True if the component has a rows template and is ready.
+        """
+        return self._rows_template is not None and bool(self._variables.get("ready"))
+
+    def stream(self, chunk_rows: int) -> Iterator[str]:
+        """Renders the component in pieces: first the template without rows, then chunks of rows.
+
+        The rows come from the generate() stream of the rows template, which renders a row at a time, so the
+        first chunk is ready without rendering the whole table. The rows of a chunk go into the element with ID
+        '<id>-rows' of the first piece.
+
+        Args:
+            chunk_rows (int): The number of rows of a chunk.
+
+        Yields:
+            Iterator[str]: The template without rows, then the HTML of each chunk of rows.
+        """
+        context = dict(name=self._name, _id=self._id, _class=self._class, src=self._src, **self._variables)
+        yield self._template.render(**{**context, "len": 0})
+        if self._rows_template is None:
+            return
+        pieces: list[str] = []
+        rows = 0
+        for piece in self._rows_template.generate(**context):
+            pieces.append(piece)
+            rows += piece.count("</tr>")  # the closing tag is template text, never split across pieces
+            if rows >= chunk_rows:
+                yield "".join(pieces)
+                pieces, rows = [], 0
+        if pieces:
+            yield "".join(pieces)
@@ -27,3 +27,24 @@ parse_info = Component(
     _id="parse-info",
     parent_id="parse-output-info"
 )
+
+cache_info = Component(
+    name="Cache - estatísticas",
+    template="cache_info.html",
+    _id="cache-info",
+    parent_id="debug-output-info"
+)
+
+perf_info = Component(
+    name="Desempenho",
+    template="perf_info.html",
+    _id="perf-info",
+    parent_id="perf-output-info"
+)
+
+progress_info = Component(
+    name="Processamento",
+    template="progress.html",
+    _id="progress-info",
+    parent_id="progress-output-info"
+)
@@ -12,6 +12,7 @@ from .component import Component
 siafi_table = Component(
     name="Siafi",
     template="table.html",
+    rows_template="table_rows.html",
     _id="siafi-table",
     parent_id="siafi-output",
     btn_id="delete-siafi-btn",
@@ -21,6 +22,7 @@ siafi_table = Component(
 efd_table = Component(
     name="Efd",
     template="table.html",
+    rows_template="table_rows.html",
     _id="efd-table",
     parent_id="efd-output",
     btn_id="delete-efd-btn",
@@ -30,8 +32,48 @@ efd_table = Component(
 parse_table = Component(
     name="Siafi-Efd",
     template="table.html",
+    rows_template="table_rows.html",
     _id="parse-table",
     parent_id="parse-output",
     btn_id="siafi-efd-btn",
     value="siafi-efd"
 )
+
+parse_hierarchy = Component(
+    name="Siafi-Efd por raiz",
+    template="hierarchy.html",
+    _id="parse-hierarchy",
+    parent_id="hierarchy-output",
+)
+
+parse_run_diff = Component(
+    name="Alterações desde a análise anterior",
+    template="table.html",
+    rows_template="table_rows.html",
+    _id="parse-run-diff",
+    parent_id="run-diff-output",
+)
+
+siafi_rejects = Component(
+    name="Siafi - chaves inválidas",
+    template="table.html",
+    rows_template="table_rows.html",
+    _id="siafi-rejects",
+    parent_id="siafi-rejects-output",
+)
+
+efd_rejects = Component(
+    name="Efd - chaves inválidas",
+    template="table.html",
+    rows_template="table_rows.html",
+    _id="efd-rejects",
+    parent_id="efd-rejects-output",
+)
+
+periods_table = Component(
+    name="Períodos",
+    template="table.html",
+    rows_template="table_rows.html",
+    _id="periods-table",
+    parent_id="periods-output",
+)
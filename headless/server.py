@@ -0,0 +1,478 @@
+"""
+This module contains a local HTTP service that reconciles Siafi and Efd workbooks headless, so a team can share
+one warm server instead of each booting Pyodide in a browser tab.
+
+Usage: python -m headless.server [--host 127.0.0.1] [--port 8765] [--workers 2]
+
+Endpoints, all answering JSON:
+    POST /uploads                    The body is a workbook. Answers its id, the SHA-256 of its contents.
+    POST /reconciliations            The body is {"siafi": id, "efd": id, "key_mode": "cnpj"}. Answers the id
+                                     of the result, its description and its rows.
+    GET  /reconciliations/<id>       The description and the rows of a result.
+    GET  /reconciliations/<id>/rows  A page of the rows, filtered and sorted by the query string (offset,
+                                     limit, cnpj, recolhedor, sign, order_by, descending; see utils.query).
+
+The pipelines run in a bounded process pool, off the event loop. Uploads and results are kept by the hash of
+what they were made from, so an identical upload or reconciliation is answered from memory, and concurrent
+requests for the same reconciliation share a single run.
+
+Author: Diógenes Dornelles Costa
+Creation Date: May 15, 2024
+Version: 1.0
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Any, TypedDict
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np  # type: ignore
+from pandas import DataFrame
+
+from utils.columnar import dumps, loads
+from utils.query import Query, check_query, query_frame
+
+MAX_BODY = 256 * 1024 * 1024  # the largest upload accepted, in bytes
+MAX_UPLOADS = 32  # uploads kept, least recently used first out
+MAX_RESULTS = 16  # results kept, least recently used first out
+PAGE_ROWS = 100
+MAX_PAGE_ROWS = 1_000
+KEY_MODES = ("cnpj", "cnpj_cno")  # as sheets.parse, which only imports in the workers, under the stand-ins
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+}
+
+
+class HttpError(Exception):
+    """An error answered to the client with its HTTP status."""
+
+    def __init__(self, status: int, message: str) -> None:
+        """Initializes an HttpError instance.
+
+        Args:
+            status (int): The HTTP status.
+            message (str): The message to the client.
+        """
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class Result(TypedDict):
+    """A reconciliation kept by the service.
+
+    Args:
+        TypedDict (_type_): Dictionary with the result frame of Parse, its description and its key mode.
+    """
+    frame: DataFrame
+    describe: dict[str, Any]
+    key_mode: str
+
+
+def start_worker() -> None:
+    """Prepares a worker process: installs the browser stand-ins and imports the sheets once."""
+    from headless.stubs import install_stubs  # pylint: disable=import-outside-toplevel
+
+    install_stubs()
+    import sheets.parse  # noqa: F401  # pylint: disable=import-outside-toplevel,unused-import
+
+
+def reconcile(siafi_data: bytes, efd_data: bytes, key_mode: str) -> bytes:
+    """Runs the Siafi, Efd and Parse pipelines on two workbooks, in a worker process.
+
+    Args:
+        siafi_data (bytes): The Siafi workbook.
+        efd_data (bytes): The Efd workbook.
+        key_mode (str): The key Siafi and Efd are joined by.
+
+    Raises:
+        ValueError: If a workbook cannot be read.
+
+    Returns:
+        bytes: The result and its description, in the columnar format.
+    """
+    start_worker()
+    # pylint: disable=import-outside-toplevel
+    from components.infos import efd_info, parse_info, siafi_info
+    from components.tables import efd_table, parse_table, siafi_table
+    from pub_sub.pub_sub import pub_sub
+    from sheets.efd import Efd
+    from sheets.parse import Parse
+    from sheets.siafi import Siafi
+    from utils.upload import BufferReader
+
+    pub_sub.reset()
+    siafi = Siafi(["RECOLHEDOR", "DOCUMENTO", "VALOR"], siafi_table, siafi_info)
+    efd = Efd(["CNPJ", "CNO", "VALOR"], efd_table, efd_info)
+    parse = Parse(parse_table, parse_info)
+    siafi.file = BufferReader(siafi_data, "siafi")
+    if siafi.df is None:
+        raise ValueError("Não foi possível ler a planilha SIAFI.")
+    efd.file = BufferReader(efd_data, "efd")
+    if efd.df is None:
+        raise ValueError("Não foi possível ler a planilha EFD.")
+    parse.key_mode = key_mode  # No sheet yet: only the last setter runs the analysis
+    parse.siafi = siafi
+    parse.efd = efd
+    return dumps({"parse": parse.df}, {"describe": parse.describe, "key_mode": key_mode})
+
+
+def content_id(*parts: Any) -> str:
+    """Gets the id of some contents, the SHA-256 of their parts.
+
+    Args:
+        *parts (Any): The parts, bytes or str.
+
+    Returns:
+        str: The hexadecimal digest.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part if isinstance(part, (bytes, bytearray, memoryview)) else str(part).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def to_json(value: Any) -> Any:
+    """Converts the values json does not know, e.g. numpy scalars.
+
+    Args:
+        value (Any): The value.
+
+    Returns:
+        Any: A value json can serialize.
+    """
+    return value.item() if isinstance(value, np.generic) else str(value)
+
+
+def records(frame: DataFrame) -> list[dict[str, Any]]:
+    """Gets the rows of a frame as JSON objects, a missing value as null.
+
+    Args:
+        frame (DataFrame): The frame.
+
+    Returns:
+        list[dict[str, Any]]: The rows.
+    """
+    return frame.astype(object).where(frame.notna(), None).to_dict(orient="records")
+
+
+class ReconciliationService:
+    """The uploads, the results and the runs of the HTTP service."""
+
+    def __init__(self, workers: int = 2, executor: Executor | None = None) -> None:
+        """Initializes a ReconciliationService instance.
+
+        Args:
+            workers (int, optional): The processes of the pool. Defaults to 2.
+            executor (Executor | None, optional): Runs the pipelines instead of a new process pool. Defaults to
+                None.
+        """
+        self._executor = executor or ProcessPoolExecutor(
+            max_workers=workers, mp_context=get_context("spawn"), initializer=start_worker
+        )
+        self._uploads: OrderedDict[str, bytes] = OrderedDict()
+        self._results: OrderedDict[str, Result] = OrderedDict()
+        self._running: dict[str, asyncio.Future] = {}
+
+    def close(self) -> None:
+        """Stops the workers."""
+        self._executor.shutdown(cancel_futures=True)
+
+    @staticmethod
+    def _keep(cache: OrderedDict, key: str, value: Any, size: int) -> None:
+        """Keeps a value as the most recently used, dropping the least recently used beyond the size."""
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > size:
+            cache.popitem(last=False)
+
+    def upload(self, data: bytes) -> dict[str, Any]:
+        """Keeps a workbook, once per contents.
+
+        Args:
+            data (bytes): The workbook.
+
+        Raises:
+            HttpError: If the workbook is empty.
+
+        Returns:
+            dict[str, Any]: Its id, its size and whether it was already kept.
+        """
+        if not data:
+            raise HttpError(400, "Arquivo vazio.")
+        upload_id = content_id(data)
+        cached = upload_id in self._uploads
+        self._keep(self._uploads, upload_id, self._uploads.get(upload_id, data), MAX_UPLOADS)
+        return {"id": upload_id, "size": len(data), "cached": cached}
+
+    def _upload(self, upload_id: Any, sheet: str) -> bytes:
+        """Gets a kept workbook, raising HttpError 404 if unknown."""
+        if not isinstance(upload_id, str) or upload_id not in self._uploads:
+            raise HttpError(404, f"Planilha {sheet} não enviada: {upload_id!r}.")
+        self._uploads.move_to_end(upload_id)
+        return self._uploads[upload_id]
+
+    def _result(self, result_id: str) -> Result:
+        """Gets a kept result, raising HttpError 404 if unknown."""
+        if result_id not in self._results:
+            raise HttpError(404, f"Conciliação não encontrada: {result_id!r}.")
+        self._results.move_to_end(result_id)
+        return self._results[result_id]
+
+    async def reconcile(self, siafi_id: Any, efd_id: Any, key_mode: str = KEY_MODES[0]) -> dict[str, Any]:
+        """Reconciles two uploaded workbooks, or answers the kept result of the same reconciliation.
+
+        Args:
+            siafi_id (Any): The id of the Siafi workbook.
+            efd_id (Any): The id of the Efd workbook.
+            key_mode (str, optional): The key Siafi and Efd are joined by. Defaults to 'cnpj'.
+
+        Raises:
+            HttpError: If a workbook is unknown or the key mode is invalid.
+            ValueError: If a workbook cannot be read.
+
+        Returns:
+            dict[str, Any]: The summary of the result and whether it was already kept.
+        """
+        if key_mode not in KEY_MODES:
+            raise HttpError(400, f"Chave inválida: {key_mode!r}. Use {' ou '.join(KEY_MODES)}.")
+        siafi_data, efd_data = self._upload(siafi_id, "SIAFI"), self._upload(efd_id, "EFD")
+        result_id = content_id(siafi_id, efd_id, key_mode)
+        if result_id in self._results:
+            return {**self.summary(result_id), "cached": True}
+        running = self._running.get(result_id)
+        if running is None:
+            loop = asyncio.get_running_loop()
+            running = self._running[result_id] = loop.run_in_executor(
+                self._executor, reconcile, siafi_data, efd_data, key_mode
+            )
+            running.add_done_callback(lambda _: self._running.pop(result_id, None))
+        data = await asyncio.shield(running)  # a client that hangs up does not cancel the others' run
+        if result_id not in self._results:
+            frames, meta = loads(data)
+            result = Result(frame=frames["parse"], describe=meta["describe"], key_mode=meta["key_mode"])
+            self._keep(self._results, result_id, result, MAX_RESULTS)
+        return {**self.summary(result_id), "cached": False}
+
+    def summary(self, result_id: str) -> dict[str, Any]:
+        """Describes a kept result.
+
+        Args:
+            result_id (str): The id of the result.
+
+        Raises:
+            HttpError: If the result is unknown.
+
+        Returns:
+            dict[str, Any]: Its id, key mode, description, rows and columns.
+        """
+        result = self._result(result_id)
+        return {
+            "id": result_id,
+            "key_mode": result["key_mode"],
+            "describe": result["describe"],
+            "rows": result["frame"].shape[0],
+            "columns": list(result["frame"].columns),
+        }
+
+    def rows(self, result_id: str, query: Query) -> dict[str, Any]:
+        """Gets a page of the rows of a kept result.
+
+        Args:
+            result_id (str): The id of the result.
+            query (Query): The filter, sort and page.
+
+        Raises:
+            HttpError: If the result is unknown.
+            ValueError: If the query is not valid.
+
+        Returns:
+            dict[str, Any]: The rows matching the filter, the offset and the rows of the page.
+        """
+        check_query(query)  # the page is taken here, out of query_frame
+        matching = query_frame(
+            self._result(result_id)["frame"],
+            Query(**{field: value for field, value in query.items() if field not in ("limit", "offset")}),
+        )
+        offset = query.get("offset", 0)
+        page = matching.iloc[offset : offset + query.get("limit", PAGE_ROWS)]
+        return {"total": matching.shape[0], "offset": offset, "rows": records(page)}
+
+
+def page_query(parameters: dict[str, list[str]]) -> Query:
+    """Reads the filter, sort and page of a query string.
+
+    Args:
+        parameters (dict[str, list[str]]): The parameters, as parse_qs gives them.
+
+    Raises:
+        ValueError: If a number is not valid, or the page is negative.
+
+    Returns:
+        Query: The query, the page limited to MAX_PAGE_ROWS rows.
+    """
+    values = {name: items[-1] for name, items in parameters.items()}
+    query = Query(
+        offset=int(values.get("offset", 0)), limit=min(int(values.get("limit", PAGE_ROWS)), MAX_PAGE_ROWS)
+    )
+    for field in ("cnpj", "recolhedor", "sign"):
+        if field in values:
+            query[field] = int(values[field])  # type: ignore[literal-required]
+    if "order_by" in values:
+        query["order_by"] = values["order_by"]
+        query["descending"] = values.get("descending", "0").lower() in ("1", "true")
+    return check_query(query)
+
+
+async def read_request(reader: asyncio.StreamReader) -> tuple[str, str, bytes]:
+    """Reads an HTTP/1.1 request.
+
+    Args:
+        reader (asyncio.StreamReader): The connection.
+
+    Raises:
+        HttpError: If the request is malformed or its body exceeds MAX_BODY.
+
+    Returns:
+        tuple[str, str, bytes]: The method, the target and the body.
+    """
+    try:
+        method, target, _ = (await reader.readline()).decode("latin-1").split(" ", 2)
+    except ValueError as error:
+        raise HttpError(400, "Requisição inválida.") from error
+    headers = {}
+    while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", 0) or 0)
+    if length > MAX_BODY:
+        raise HttpError(413, f"Arquivo maior que {MAX_BODY // (1024 * 1024)} MiB.")
+    return method.upper(), target, await reader.readexactly(length) if length else b""
+
+
+class Server:
+    """The HTTP front of a ReconciliationService."""
+
+    def __init__(self, service: ReconciliationService) -> None:
+        """Initializes a Server instance.
+
+        Args:
+            service (ReconciliationService): The service.
+        """
+        self._service = service
+
+    async def route(self, method: str, target: str, body: bytes) -> Any:
+        """Answers a request.
+
+        Args:
+            method (str): The method.
+            target (str): The path and the query string.
+            body (bytes): The body.
+
+        Raises:
+            HttpError: If the path or the method is unknown, or the request is invalid.
+
+        Returns:
+            Any: The answer, serializable to JSON.
+        """
+        url = urlsplit(target)
+        parts = [part for part in url.path.split("/") if part]
+        routes = {
+            ("uploads",): "POST",
+            ("reconciliations",): "POST",
+            ("reconciliations", "*"): "GET",
+            ("reconciliations", "*", "rows"): "GET",
+        }
+        pattern = tuple("*" if position == 1 else part for position, part in enumerate(parts))
+        if pattern not in routes:
+            raise HttpError(404, f"Caminho desconhecido: {url.path}")
+        if method != routes[pattern]:
+            raise HttpError(405, f"Método {method} não permitido em {url.path}")
+        if pattern == ("uploads",):
+            return self._service.upload(body)
+        if pattern == ("reconciliations",):
+            try:
+                request = json.loads(body or b"{}")
+            except json.JSONDecodeError as error:
+                raise HttpError(400, "Corpo JSON inválido.") from error
+            return await self._service.reconcile(
+                request.get("siafi"), request.get("efd"), request.get("key_mode", KEY_MODES[0])
+            )
+        if pattern == ("reconciliations", "*"):
+            return self._service.summary(parts[1])
+        return self._service.rows(parts[1], page_query(parse_qs(url.query)))
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Answers one request per connection.
+
+        Args:
+            reader (asyncio.StreamReader): The connection to read from.
+            writer (asyncio.StreamWriter): The connection to write to.
+        """
+        try:
+            status, answer = 200, await self.route(*await read_request(reader))
+        except HttpError as error:
+            status, answer = error.status, {"erro": error.message}
+        except (ValueError, asyncio.IncompleteReadError) as error:
+            status, answer = 400, {"erro": str(error)}
+        except Exception as error:  # pylint: disable=broad-except
+            status, answer = 500, {"erro": f"{type(error).__name__}: {error}"}
+        payload = json.dumps(answer, ensure_ascii=False, default=to_json).encode()
+        writer.write(
+            f"HTTP/1.1 {status} {REASONS[status]}\r\nContent-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode("latin-1")
+            + payload
+        )
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+
+async def serve(
+    host: str = "127.0.0.1", port: int = 8765, service: ReconciliationService | None = None
+) -> asyncio.Server:
+    """Starts the HTTP service.
+
+    Args:
+        host (str, optional): The interface. Defaults to "127.0.0.1", local only.
+        port (int, optional): The port, 0 for any free one. Defaults to 8765.
+        service (ReconciliationService | None, optional): The service. Defaults to None, a new one with 2
+            workers.
+
+    Returns:
+        asyncio.Server: The listening server.
+    """
+    return await asyncio.start_server(Server(service or ReconciliationService()).handle, host, port)
+
+
+async def main() -> None:
+    """Runs the HTTP service until interrupted."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+    service = ReconciliationService(args.workers)
+    server = await serve(args.host, args.port, service)
+    print(f"Servindo em http://{args.host}:{args.port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,166 @@
+"""
+This module contains a SQLite store of reconciliation results, for the headless batch runs of the pipelines,
+so their results can be queried after the process exits.
+
+Each period is replaced in a single transaction, its rows inserted with executemany. The table keeps indexes on
+CNPJ, RECOLHEDOR, period and the sign of DIFERENÇAS, the filters of utils.query, which builds the statements.
+A large batch drops the indexes and builds them again once its rows are in, which is several times faster
+than updating them row by row.
+
+Author: Diógenes Dornelles Costa
+Creation Date: May 15, 2024
+Version: 1.0
+"""
+
+import sqlite3
+from typing import Any
+
+import numpy as np  # type: ignore
+from pandas import DataFrame
+
+from utils.periods import check_period
+from utils.query import PERIOD_COLUMN, SIGN_COLUMN, Query, quoted, signs, sql_query
+
+TABLE = "resultados"
+INTEGER_COLUMNS = ("RECOLHEDOR", "CNPJ", "CNO")
+FLOAT_COLUMNS = ("VALOR_SIAFI", "VALOR_EFD", "DIFERENÇAS")
+RESULT_COLUMNS = [PERIOD_COLUMN, *INTEGER_COLUMNS, *FLOAT_COLUMNS]
+INDEXED_COLUMNS = ("CNPJ", "RECOLHEDOR", PERIOD_COLUMN, SIGN_COLUMN)
+BULK_ROWS = 100_000  # batches from this size, and as large as the stored rows, rebuild the indexes
+CACHE_KIB = 65_536
+
+
+class ResultStore:
+    """A SQLite database of reconciliation results, one set of rows per period."""
+
+    def __init__(self, path: str = ":memory:") -> None:
+        """Initializes a ResultStore instance, creating the table and its indexes if needed.
+
+        Args:
+            path (str, optional): The database file. Defaults to ":memory:".
+        """
+        self._connection = sqlite3.connect(path)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")  # durable at each checkpoint, enough for batches
+        self._connection.execute(f"PRAGMA cache_size=-{CACHE_KIB}")  # keeps the index pages in memory
+        columns = ", ".join(
+            [f"{quoted(PERIOD_COLUMN)} TEXT NOT NULL"]
+            + [f"{quoted(column)} INTEGER NOT NULL" for column in INTEGER_COLUMNS]
+            + [f"{quoted(column)} REAL NOT NULL" for column in FLOAT_COLUMNS]
+            + [f"{quoted(SIGN_COLUMN)} INTEGER NOT NULL"]
+        )
+        with self._connection:
+            self._connection.execute(f"CREATE TABLE IF NOT EXISTS {quoted(TABLE)} ({columns})")
+            self._create_indexes()
+
+    def _create_indexes(self) -> None:
+        """Creates the missing indexes."""
+        for column in INDEXED_COLUMNS:
+            self._connection.execute(
+                f"CREATE INDEX IF NOT EXISTS {quoted(f'{TABLE}_{column}')} ON {quoted(TABLE)} ({quoted(column)})"
+            )
+
+    def _drop_indexes(self) -> None:
+        """Drops the indexes."""
+        for column in INDEXED_COLUMNS:
+            self._connection.execute(f"DROP INDEX IF EXISTS {quoted(f'{TABLE}_{column}')}")
+
+    def __enter__(self) -> "ResultStore":
+        """Enters a with block.
+
+        Returns:
+            ResultStore: The store.
+        """
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        """Closes the store at the end of a with block."""
+        self.close()
+
+    def close(self) -> None:
+        """Closes the database."""
+        self._connection.close()
+
+    def save(self, period: str, frame: DataFrame) -> int:
+        """Stores the result of a period, replacing the stored one, if any, in a single transaction.
+
+        Args:
+            period (str): The period, as AAAA-MM.
+            frame (DataFrame): The result of Parse. A missing CNO (joined by CNPJ only) or value counts as 0.
+
+        Raises:
+            ValueError: If the period is not valid.
+
+        Returns:
+            int: The rows stored.
+        """
+        check_period(period)
+        size = frame.shape[0]
+        integers = [
+            frame[column].to_numpy(dtype=np.int64, na_value=0)
+            if column in frame.columns
+            else np.zeros(size, dtype=np.int64)
+            for column in INTEGER_COLUMNS
+        ]
+        floats = [frame[column].to_numpy(dtype=np.float64, na_value=0.0) for column in FLOAT_COLUMNS]
+        # tolist() hands sqlite3 native ints and floats, converted in C rather than one numpy scalar at a time
+        rows = zip(
+            [period] * size,
+            *(values.tolist() for values in integers),
+            *(values.tolist() for values in floats),
+            signs(floats[-1]).tolist(),
+        )
+        placeholders = ", ".join("?" * (len(RESULT_COLUMNS) + 1))
+        with self._connection:
+            # sqlite3 opens its implicit transaction only before the DELETE, so DROP INDEX would commit on its own
+            self._connection.execute("BEGIN")
+            (stored,) = self._connection.execute(f"SELECT COUNT(*) FROM {quoted(TABLE)}").fetchone()
+            bulk = size >= max(BULK_ROWS, stored)
+            if bulk:
+                self._drop_indexes()
+            self._connection.execute(f"DELETE FROM {quoted(TABLE)} WHERE {quoted(PERIOD_COLUMN)} = ?", (period,))
+            self._connection.executemany(f"INSERT INTO {quoted(TABLE)} VALUES ({placeholders})", rows)
+            if bulk:
+                self._create_indexes()
+        return size
+
+    def remove(self, period: str) -> None:
+        """Removes the result of a period, if stored.
+
+        Args:
+            period (str): The period, as AAAA-MM.
+        """
+        with self._connection:
+            self._connection.execute(
+                f"DELETE FROM {quoted(TABLE)} WHERE {quoted(PERIOD_COLUMN)} = ?", (check_period(period),)
+            )
+
+    def periods(self) -> list[str]:
+        """Lists the stored periods, in order.
+
+        Returns:
+            list[str]: The periods.
+        """
+        cursor = self._connection.execute(
+            f"SELECT DISTINCT {quoted(PERIOD_COLUMN)} FROM {quoted(TABLE)} ORDER BY {quoted(PERIOD_COLUMN)}"
+        )
+        return [period for (period,) in cursor]
+
+    def query(self, query: Query) -> DataFrame:
+        """Finds the stored rows that match a query, as utils.query.query_frame does in memory.
+
+        Args:
+            query (Query): The query.
+
+        Raises:
+            ValueError: If the query is not valid.
+
+        Returns:
+            DataFrame: The matching rows, sorted and paged.
+        """
+        statement, parameters = sql_query(query, TABLE, RESULT_COLUMNS)
+        rows = self._connection.execute(statement, parameters).fetchall()
+        frame = DataFrame.from_records(rows, columns=RESULT_COLUMNS)
+        return frame.astype(
+            {**{column: np.int64 for column in INTEGER_COLUMNS}, **{column: np.float64 for column in FLOAT_COLUMNS}}
+        )
@@ -0,0 +1,146 @@
+"""
+This module installs stand-ins for the browser-only 'js' and 'pyscript' modules, to run the sheets headless.
+
+Usage: call install_stubs() before importing any module from 'sheets', 'pub_sub' or 'listeners'.
+
+Author: Diógenes Dornelles Costa
+Creation Date: May 15, 2024
+Version: 1.0
+"""
+
+import sys
+from types import ModuleType
+from typing import Any, Callable
+
+
+class Element:
+    """A minimal DOM element, enough for PubSub and the sheets to run."""
+
+    def __init__(self, document: "Document", element_id: str) -> None:
+        """Initializes an Element instance.
+
+        Args:
+            document (Document): The document that owns the element.
+            element_id (str): The ID of the element.
+        """
+        self._document = document
+        self.id = element_id
+        self.innerHTML = ""
+        self.attributes: dict[str, Any] = {}
+
+    def setAttribute(self, name: str, value: Any) -> None:  # pylint: disable=invalid-name
+        """Sets an attribute."""
+        self.attributes[name] = value
+
+    def removeAttribute(self, name: str, *_: Any) -> None:  # pylint: disable=invalid-name
+        """Removes an attribute."""
+        self.attributes.pop(name, None)
+
+    def insertAdjacentHTML(self, _position: str, html: str) -> None:  # pylint: disable=invalid-name
+        """Appends HTML to the element content."""
+        self.innerHTML += html
+
+    def removeChild(self, child: "Element") -> None:  # pylint: disable=invalid-name
+        """Removes a child element."""
+        child.remove()
+
+    def remove(self) -> None:
+        """Removes the element from the document."""
+        self._document.elements.pop(self.id, None)
+
+
+class Document:
+    """A minimal document, whose elements are created on first lookup, as if every ID existed in the page."""
+
+    def __init__(self) -> None:
+        """Initializes a Document instance."""
+        self.elements: dict[str, Element] = {}
+
+    def getElementById(self, element_id: str) -> Element | None:  # pylint: disable=invalid-name
+        """Gets an element by its ID, creating it on first lookup.
+
+        Args:
+            element_id (str): The ID of the element.
+
+        Returns:
+            Element | None: The element, or None for an empty ID.
+        """
+        if not element_id:
+            return None
+        if element_id not in self.elements:
+            self.elements[element_id] = Element(self, element_id)
+        return self.elements[element_id]
+
+
+class Location:
+    """Stand-in for window.location."""
+
+    def reload(self) -> None:
+        """Reloading is meaningless headless; the call is ignored."""
+
+
+class Window:
+    """Stand-in for the browser window."""
+
+    def __init__(self, document: Document) -> None:
+        """Initializes a Window instance.
+
+        Args:
+            document (Document): The page document.
+        """
+        self.document = document
+        self.location = Location()
+
+
+def alert(message: Any) -> None:
+    """Prints what the browser would show in an alert box.
+
+    Args:
+        message (Any): The message.
+    """
+    print(f"alert: {message}", file=sys.stderr)
+
+
+def when(*_: Any, **__: Any) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """Stand-in for pyscript.when, which leaves the handler undecorated."""
+    def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
+        return func
+
+    return decorator
+
+
+def install_stubs(force: bool = False) -> Document:
+    """Registers the 'js' and 'pyscript' stand-ins in sys.modules and selects a non-interactive plot backend.
+
+    Args:
+        force (bool, optional): Replace the modules even if they are already registered. Defaults to False.
+
+    Returns:
+        Document: The document shared by both stand-ins.
+    """
+    if not force and isinstance(sys.modules.get("pyscript"), ModuleType):
+        document = getattr(sys.modules["pyscript"], "document", None)
+        if isinstance(document, Document):
+            return document
+    document = Document()
+    window = Window(document)
+
+    js = ModuleType("js")
+    js.alert = alert  # type: ignore[attr-defined]
+    js.window = window  # type: ignore[attr-defined]
+    js.document = document  # type: ignore[attr-defined]
+    sys.modules["js"] = js
+
+    pyscript = ModuleType("pyscript")
+    pyscript.document = document  # type: ignore[attr-defined]
+    pyscript.window = window  # type: ignore[attr-defined]
+    pyscript.when = when  # type: ignore[attr-defined]
+    sys.modules["pyscript"] = pyscript
+
+    try:
+        import matplotlib  # pylint: disable=import-outside-toplevel
+
+        matplotlib.use("Agg")
+    except ImportError:
+        pass
+    return document
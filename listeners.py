@@ -6,28 +6,110 @@ Creation Date: May 15, 2024
 Version: 1.0
 """
 
-from io import BytesIO
+import gc
+import io
+import os
+import tempfile
+import zlib
+from typing import Any, Awaitable, Callable
 
-from js import alert, window # type: ignore
+from js import Blob, URL, alert, window  # type: ignore
+from pyodide.ffi import to_js  # type: ignore
 from pyscript import when  # type: ignore
 
-from components.infos import efd_info, parse_info, siafi_info
-from components.tables import efd_table, parse_table, siafi_table
+from components.component import Variables
+from components.infos import cache_info, efd_info, parse_info, perf_info, progress_info, siafi_info
+from components.tables import (
+    efd_rejects,
+    efd_table,
+    parse_hierarchy,
+    parse_run_diff,
+    parse_table,
+    periods_table,
+    siafi_rejects,
+    siafi_table,
+)
 from pub_sub.pub_sub import pub_sub
+from sheets import ingestion
 from sheets.efd import Efd
+from sheets.export import export
+from sheets.ingestion import mount_opfs, sync_opfs
 from sheets.parse import Parse
 from sheets.siafi import Siafi
+from sheets.snapshot import SESSION_EXTENSION, SESSION_MIME, restore_session, save_session
+from sheets.table import column_views
+from utils.cache import cache_stats, clear_caches
+from utils.periods import KEY_COLUMN, PeriodStore, cumulative_differences, recurring_mismatches
+from utils.profiler import profiler
+from utils.query import Query
+from utils.progress import Cancelled, CancelToken, Progress, Runs
+from utils.upload import read_upload
 
 # Initialize instances of Siafi, Efd, and Parse
-parse = Parse(parse_table, parse_info)
+parse = Parse(parse_table, parse_info, parse_hierarchy, parse_run_diff)
 siafi = Siafi(
     ["RECOLHEDOR", "DOCUMENTO", "VALOR"],
     siafi_table,
     siafi_info,
+    siafi_rejects,
 )
-efd = Efd(["CNPJ", "CNO", "VALOR"], efd_table, efd_info)
+efd = Efd(["CNPJ", "CNO", "VALOR"], efd_table, efd_info, efd_rejects)
+
+EXT_ALLOWED = ("xlsx", "csv")  # Define the allowed file extensions
+
+runs = Runs()  # The uploads and the analysis in progress, by name
+progress: dict[str, Progress] = {}  # The last progress of each run, shown in the progress panel
+periods: PeriodStore | None = None  # The monthly results, opened on first use
+
+
+def refresh_perf_info() -> None:
+    """Render the recorded stages in the performance panel, when profiling is enabled."""
+    if profiler.enabled:
+        memory = {type(sheet).__name__: sheet.memory_report() for sheet in (siafi, efd, parse)}
+        perf_info.variables = Variables(describe={"records": profiler.records, "memory": memory}, ready=True)
+        if not pub_sub.is_subscribed(perf_info.name):
+            pub_sub.subscribe(perf_info)
+        pub_sub.publish(perf_info.name)
+
+
+def refresh_progress() -> None:
+    """Render the progress of the runs in progress, or remove the panel when there are none."""
+    if not progress:
+        pub_sub.unsubscribe(progress_info.name)
+        return
+    progress_info.variables = Variables(describe=dict(progress), ready=True)
+    if not pub_sub.is_subscribed(progress_info.name):
+        pub_sub.subscribe(progress_info)
+    pub_sub.publish(progress_info.name)
 
-EXT_ALLOWED = "xlsx"  # Define the allowed file extension
+
+async def run_task(name: str, task: Callable[[CancelToken, Callable[[Progress], Any]], Awaitable[None]]) -> bool:
+    """Run a cancellable task, cancelling the stale run of the same name and showing its progress.
+
+    Args:
+        name (str): The name of the run, e.g. 'siafi'.
+        task (Callable[[CancelToken, Callable[[Progress], Any]], Awaitable[None]]): Receives the token and the
+            progress callback of the run.
+
+    Returns:
+        bool: True if the task ended, False if it was cancelled.
+    """
+    token = runs.start(name)
+
+    def report(value: Progress) -> None:
+        progress[name] = value
+        refresh_progress()
+
+    try:
+        await task(token, report)
+        return True
+    except Cancelled:
+        return False
+    finally:
+        runs.finish(name, token)
+        if not runs.running(name):
+            progress.pop(name, None)
+            refresh_progress()
 
 
 # Process file uploaded for Siafi data
@@ -37,16 +119,26 @@ async def process_file_siafi_input(event):
     loaded_file = event.target.files.item(0)  # Get the uploaded file
     if (
         event.target.value.lower().find("siafi") >= 0
-        and event.target.value.split(".")[1] == EXT_ALLOWED
+        and event.target.value.split(".")[-1].lower() in EXT_ALLOWED
     ):
         # Check if the uploaded file is for Siafi data and has the correct extension
-        array_buf = await loaded_file.arrayBuffer()
-        file_bytes = array_buf.to_bytes()
-        siafi.file = BytesIO(file_bytes)  # Set the file for Siafi instance
-        parse.siafi = siafi  # Update Parse instance with Siafi data
-        event.target.value = ""  # Reset the input value
+        with profiler.stage("Siafi.upload") as record:
+            file, record["memory"] = await read_upload(loaded_file)
+        await mount_opfs()  # Spill directory for workbooks over the memory budget
+        event.target.value = ""  # Reset the input value, so the same file can be sent again
+        runs.cancel("parse")  # The analysis in progress is stale
+        if not await run_task("siafi", lambda token, report: siafi.load(file, token, report)):
+            return  # Cancelled, or replaced by a newer upload
+        if siafi.df is None:
+            # The upload failed and Siafi was reset, so the previous analysis is stale
+            parse.reset()
+        else:
+            # Update Parse instance with Siafi data
+            await run_task("parse", lambda token, report: parse.run(token, report, siafi=siafi))
+        gc.collect()  # Free the upload buffer and the intermediate frames right away
+        refresh_perf_info()
     else:
-        alert(f"Arquivo não é SIAFI ou não possui extensão {EXT_ALLOWED}")
+        alert(f"Arquivo não é SIAFI ou não possui extensão {' ou '.join(EXT_ALLOWED)}")
 
 
 # Process file uploaded for EFD data
@@ -56,61 +148,363 @@ async def process_file_efd_input(event):
     loaded_file = event.target.files.item(0)  # Get the uploaded file
     if (
         event.target.value.lower().find("efd") >= 0
-        and event.target.value.split(".")[1] == EXT_ALLOWED
+        and event.target.value.split(".")[-1].lower() in EXT_ALLOWED
     ):
         # Check if the uploaded file is for EFD data and has the correct extension
-        array_buf = await loaded_file.arrayBuffer()
-        file_bytes = array_buf.to_bytes()
-        efd.file = BytesIO(file_bytes)  # Set the file for Efd instance
-        parse.efd = efd  # Update Parse instance with Efd data
-        event.target.value = ""  # Reset the input value
+        with profiler.stage("Efd.upload") as record:
+            file, record["memory"] = await read_upload(loaded_file)
+        await mount_opfs()  # Spill directory for workbooks over the memory budget
+        event.target.value = ""  # Reset the input value, so the same file can be sent again
+        runs.cancel("parse")  # The analysis in progress is stale
+        if not await run_task("efd", lambda token, report: efd.load(file, token, report)):
+            return  # Cancelled, or replaced by a newer upload
+        if efd.df is None:
+            # The upload failed and Efd was reset, so the previous analysis is stale
+            parse.reset()
+        else:
+            # Update Parse instance with Efd data
+            await run_task("parse", lambda token, report: parse.run(token, report, efd=efd))
+        gc.collect()  # Free the upload buffer and the intermediate frames right away
+        refresh_perf_info()
     else:
-        alert(f"Arquivo não é EFD ou não possui extensão {EXT_ALLOWED}")
+        alert(f"Arquivo não é EFD ou não possui extensão {' ou '.join(EXT_ALLOWED)}")
+
+
+def reset_session() -> None:
+    """Reset Siafi, Efd, Parse, every component and the PubSub registry, keeping the interpreter warm."""
+    runs.cancel_all()
+    progress.clear()
+    siafi.reset()
+    efd.reset()
+    parse.reset()
+    pub_sub.reset()
+    clear_caches()
+    gc.collect()
+    window.document.getElementById("select-table").selectedIndex = 0
+    window.document.getElementById("sign-filter").selectedIndex = 0
+    window.document.getElementById("order-by").selectedIndex = 0
+    parse.query = {}
 
 
 # Handle button click to delete Siafi data
 @when("click", "#re-send-btn")
 async def handle_siafi_btn(event):
-    """Handle button click to reload page, cleaning tables."""
-    window.location.reload()
+    """Handle button click to start over, cleaning tables."""
+    reset_session()
+
+
+# Handle clicks on the cancel buttons of the progress panel, delegated from its static container
+@when("click", "#progress-output-info")
+async def cancel_run(event):
+    """Cancel the run of the clicked button, dropping what it had processed."""
+    target = event.target.closest("[data-run]")
+    if target is None:
+        return
+    name = target.getAttribute("data-run")
+    runs.cancel(name)
+    progress.pop(name, None)
+    if name in ("siafi", "efd"):
+        (siafi if name == "siafi" else efd).reset()
+        runs.cancel("parse")
+        progress.pop("parse", None)
+    parse.reset()  # The analysis is stale or incomplete
+    refresh_progress()
+
+
+# Handle button click to toggle the cache statistics panel
+@when("click", "#cache-btn")
+async def handle_cache_btn(event):
+    """Handle button click to show or hide the converters cache statistics."""
+    if pub_sub.is_published(cache_info.name):
+        pub_sub.unsubscribe(cache_info.name)
+        return
+    cache_info.variables = Variables(describe=cache_stats(), ready=True)
+    if not pub_sub.is_subscribed(cache_info.name):
+        pub_sub.subscribe(cache_info)
+    pub_sub.publish(cache_info.name)
+
+
+# Handle button click to toggle the stage profiling and its panel
+@when("click", "#profiling-btn")
+async def handle_profiling_btn(event):
+    """Handle button click to start or stop profiling the pipeline stages."""
+    if profiler.enabled:
+        profiler.disable()
+        if pub_sub.is_published(perf_info.name):
+            pub_sub.unsubscribe(perf_info.name)
+        return
+    profiler.clear()
+    profiler.enable()
+    refresh_perf_info()
+
+
+def download(buffer: io.BytesIO, filename: str, mime: str) -> None:
+    """Hand an in-memory file to the browser as a Blob download, then drop the Python copy."""
+    with buffer.getbuffer() as view:
+        blob = Blob.new([to_js(view)], to_js({"type": mime}, dict_converter=window.Object.fromEntries))
+    buffer.close()
+    url = URL.createObjectURL(blob)
+    link = window.document.createElement("a")
+    link.href = url
+    link.download = filename
+    link.click()
+    URL.revokeObjectURL(url)
+
+
+async def export_parse(file_format: str) -> None:
+    """Export the reconciliation result and its partitions, as a workbook or a zip of CSV files."""
+    if parse.df is None:
+        alert("Nenhuma análise para exportar. Envie as planilhas SIAFI e EFD.")
+        return
+    with profiler.stage(f"Parse.export({file_format})") as record:
+        buffer, mime = export(parse.df, parse.export_views(), file_format)
+        record["memory"] = buffer.getbuffer().nbytes
+    download(buffer, f"conciliacao.{'xlsx' if file_format == 'xlsx' else 'zip'}", mime)
+    refresh_perf_info()
+
+
+# Handle button click to export the analysis as a workbook
+@when("click", "#export-xlsx-btn")
+async def handle_export_xlsx_btn(event):
+    """Handle button click to download the analysis as XLSX."""
+    await export_parse("xlsx")
+
+
+# Handle button click to export the analysis as CSV files
+@when("click", "#export-csv-btn")
+async def handle_export_csv_btn(event):
+    """Handle button click to download the analysis as a zip of CSV files."""
+    await export_parse("csv")
+
+
+# Handle button click to save the session
+@when("click", "#save-session-btn")
+async def handle_save_session_btn(event):
+    """Handle button click to download the sheets and the analysis as a session snapshot."""
+    try:
+        with profiler.stage("Session.save") as record:
+            data = save_session(siafi, efd, parse)
+            record["memory"] = len(data)
+    except ValueError as error:
+        alert(str(error))
+        return
+    download(io.BytesIO(data), f"sessao.{SESSION_EXTENSION}", SESSION_MIME)
+    refresh_perf_info()
+
+
+# Process session file uploaded
+@when("input", "#session-file-input")
+async def process_session_file_input(event):
+    """Restore the sheets and the analysis from a session snapshot, without parsing any workbook."""
+    loaded_file = event.target.files.item(0)  # Get the uploaded file
+    if event.target.value.split(".")[-1].lower() != SESSION_EXTENSION:
+        alert(f"Arquivo não possui extensão {SESSION_EXTENSION}")
+        return
+    with profiler.stage("Session.upload") as record:
+        file, record["memory"] = await read_upload(loaded_file)
+    runs.cancel_all()  # The snapshot replaces whatever is being processed
+    progress.clear()
+    refresh_progress()
+    try:
+        with profiler.stage("Session.restore"):
+            restore_session(file.getbuffer(), siafi, efd, parse)
+        window.document.getElementById("key-mode").value = parse.key_mode
+    except ValueError as error:
+        reset_session()
+        alert(str(error))
+    except (KeyError, TypeError, zlib.error):  # a corrupt frame, found only when decoded
+        reset_session()
+        alert("Arquivo de sessão inválido.")
+    event.target.value = ""  # Reset the input value
+    gc.collect()
+    refresh_perf_info()
+
+
+# Handle button click to toggle the rows with invalid keys
+@when("click", "#rejects-btn")
+async def handle_rejects_btn(event):
+    """Handle button click to show or hide the Siafi and Efd rows whose key is not a valid CNPJ or CPF."""
+    names = [component.name for component in (siafi_rejects, efd_rejects)]
+    published = [name for name in names if pub_sub.is_published(name)]
+    if published:
+        for name in published:
+            pub_sub.unpublish(name)
+        return
+    subscribed = [name for name in names if pub_sub.is_subscribed(name)]
+    if not subscribed:
+        alert("Nenhuma chave inválida nas planilhas enviadas.")
+        return
+    for name in subscribed:
+        pub_sub.publish(name)
+
+
+# Handle button click to toggle the drill-down by raiz
+@when("click", "#hierarchy-btn")
+async def handle_hierarchy_btn(event):
+    """Handle button click to show or hide the totals by raiz, CNPJ and CNO."""
+    if pub_sub.is_published(parse_hierarchy.name):
+        pub_sub.unpublish(parse_hierarchy.name)
+        return
+    if not pub_sub.is_subscribed(parse_hierarchy.name):
+        alert("Nenhuma análise para detalhar. Envie as planilhas SIAFI e EFD.")
+        return
+    pub_sub.publish(parse_hierarchy.name)
+
+
+# Handle button click to toggle the changes since the previous analysis
+@when("click", "#run-diff-btn")
+async def handle_run_diff_btn(event):
+    """Handle button click to show or hide the mismatches that appeared, were resolved or changed since the
+    previous analysis, e.g. after a corrected workbook."""
+    if pub_sub.is_published(parse_run_diff.name):
+        pub_sub.unpublish(parse_run_diff.name)
+        return
+    if not pub_sub.is_subscribed(parse_run_diff.name):
+        alert("Nenhuma análise anterior para comparar. Envie uma planilha SIAFI ou EFD corrigida.")
+        return
+    pub_sub.publish(parse_run_diff.name)
+
+
+# Handle clicks inside the drill-down, delegated from its static container
+@when("click", "#hierarchy-output")
+async def drill_hierarchy(event):
+    """Open the clicked entry of the drill-down, or go back up to the clicked breadcrumb."""
+    target = event.target.closest("[data-depth]")
+    if target is None:
+        return
+    event.preventDefault()
+    index = target.getAttribute("data-index")
+    parse.drill(int(target.getAttribute("data-depth")), None if index is None else int(index))
+    pub_sub.publish(parse_hierarchy.name)
+
+
+# Handle dropdown selection for the reconciliation key
+@when("change", "#key-mode")
+async def select_key_mode(event):
+    """Handle dropdown selection for the key Siafi and Efd are joined by, redoing the analysis."""
+    published = [component.name for component in parse.components() if pub_sub.is_published(component.name)]
+    runs.cancel("parse")  # The analysis in progress uses the previous key
+    progress.pop("parse", None)
+    refresh_progress()
+    parse.key_mode = event.target.value
+    for name in published:
+        pub_sub.publish(name)  # Render the new result in place
+    refresh_perf_info()
+
+
+def apply_view_query() -> None:
+    """Filter and sort the analysis table as the sidebar selects ask, rendering it in place if shown."""
+    query = Query()
+    sign = window.document.getElementById("sign-filter").value
+    if sign:
+        query["sign"] = int(sign)
+    order = window.document.getElementById("order-by").value
+    if order:
+        column, direction = order.split(":")
+        query["order_by"] = column
+        query["descending"] = direction == "desc"
+    parse.query = query
+    if pub_sub.is_published(parse.table.name):
+        pub_sub.publish(parse.table.name)  # Render the filtered rows in place
+
+
+def show_view(value: str) -> None:
+    """Show the components of a table view, e.g. 'siafi-efd', hiding those of the other views."""
+    views = {
+        "siafi": (siafi.table, siafi.info),
+        "efd": (efd.table, efd.info),
+        "siafi&efd": (siafi.table, siafi.info, efd.table, efd.info),
+        "siafi-efd": (parse.table, parse.info),
+    }
+    if value in views:
+        # One batch of DOM mutations: only the components that change are rendered or removed
+        scope = {component.name for view in views.values() for component in view}
+        pub_sub.show({component.name for component in views[value]}, scope)
+
+
+# Handle dropdown selections for the filter and the sort of the analysis
+@when("change", "#sign-filter, #order-by")
+async def select_view_query(event):
+    """Handle dropdown selections for the rows of the analysis shown and their order, without redoing it."""
+    apply_view_query()
+
+
+# Handle clicks on the links of the analysis information, delegated from its static container
+@when("click", "#parse-output-info")
+async def open_filtered_view(event):
+    """Open the analysis table with the rows of the clicked link, e.g. every row where Siafi is greater."""
+    target = event.target.closest("[data-sign]")
+    if target is None:
+        return
+    event.preventDefault()
+    window.document.getElementById("sign-filter").value = target.getAttribute("data-sign")
+    window.document.getElementById("order-by").value = target.getAttribute("data-order")
+    window.document.getElementById("select-table").value = "siafi-efd"
+    apply_view_query()
+    show_view("siafi-efd")
 
 
 # Handle dropdown selection for table type
 @when("change", "#select-table")
 async def select_table(event):
     """Handle dropdown selection for table type."""
-    match event.target.value:
-        case "siafi":
-            # Publish Siafi table and info topics, and unsubscribe others
-            pub_sub.publish(siafi.table.name)
-            pub_sub.publish(siafi.info.name)
-            pub_sub.unpublish(efd.table.name)
-            pub_sub.unpublish(efd.info.name)
-            pub_sub.unpublish(parse.table.name)
-            pub_sub.unpublish(parse.info.name)
-        case "efd":
-            # Publish Efd table and info topics, and unsubscribe others
-            pub_sub.unpublish(siafi.table.name)
-            pub_sub.unpublish(siafi.info.name)
-            pub_sub.publish(efd.table.name)
-            pub_sub.publish(efd.info.name)
-            pub_sub.unpublish(parse.table.name)
-            pub_sub.unpublish(parse.info.name)
-        case "siafi&efd":
-            # Publish both Siafi and Efd table and info topics, and unsubscribe others
-            pub_sub.publish(siafi.table.name)
-            pub_sub.publish(siafi.info.name)
-            pub_sub.publish(efd.table.name)
-            pub_sub.publish(efd.info.name)
-            pub_sub.unpublish(parse.table.name)
-            pub_sub.unpublish(parse.info.name)
-        case "siafi-efd":
-            # Publish Parse table and info topics, and unsubscribe others
-            pub_sub.unpublish(siafi.table.name)
-            pub_sub.unpublish(siafi.info.name)
-            pub_sub.unpublish(efd.table.name)
-            pub_sub.unpublish(efd.info.name)
-            pub_sub.publish(parse.table.name)
-            pub_sub.publish(parse.info.name)
-        case _:
-            pass
+    show_view(event.target.value)
+
+
+async def period_store() -> PeriodStore:
+    """Open the store of monthly results, in the OPFS mount when available so that it outlives the page."""
+    global periods
+    if periods is None:
+        await mount_opfs()
+        periods = PeriodStore(os.path.join(ingestion.spill_directory or tempfile.gettempdir(), "periodos"))
+    return periods
+
+
+# Handle button click to store the analysis as the result of a period
+@when("click", "#store-period-btn")
+async def handle_store_period_btn(event):
+    """Handle button click to store the analysis as the result of the chosen month, replacing a stored one."""
+    frame = parse.period_frame()
+    if frame is None:
+        alert("Nenhuma análise para guardar. Envie as planilhas SIAFI e EFD.")
+        return
+    period = window.document.getElementById("period-input").value
+    try:
+        store = await period_store()
+        with profiler.stage("Periods.save"):
+            store.save(period, frame, {"key_mode": parse.key_mode})
+        await sync_opfs()
+    except ValueError as error:
+        alert(str(error))
+        return
+    refresh_perf_info()
+
+
+# Handle dropdown selection for the queries across periods
+@when("change", "#period-query")
+async def select_period_query(event):
+    """Handle dropdown selection for a query across the stored periods, rendered in the periods table."""
+    queries = {"recurring": recurring_mismatches, "cumulative": cumulative_differences}
+    query = queries.get(event.target.value)
+    if query is None:
+        pub_sub.unsubscribe(periods_table.name)
+        return
+    store = await period_store()
+    if not store.periods():
+        alert("Nenhum período guardado.")
+        event.target.value = ""
+        return
+    with profiler.stage(f"Periods.{event.target.value}"):
+        result = query(store)
+    as_dict = column_views(result)
+    periods_table.variables = Variables(
+        table=as_dict,
+        len=result.shape[0],
+        columns=list(as_dict.keys()),
+        keys=[KEY_COLUMN],
+        ready=True,
+    )
+    if not pub_sub.is_subscribed(periods_table.name):
+        pub_sub.subscribe(periods_table)
+    pub_sub.publish(periods_table.name)
+    refresh_perf_info()
@@ -6,9 +6,27 @@ Creation Date: May 15, 2024
 Version: 1.0
 """
 
+from typing import Any
+
 from pyscript import document as docpy  # type: ignore
 
 
+def toggle_disabled(element: Any, disabled: bool) -> None:
+    """Disables or enables an HTML element already looked up.
+
+    Args:
+        element (Any): The HTML element.
+        disabled (bool): True to disable the element, False to enable it.
+    """
+    try:
+        if disabled:
+            element.setAttribute("disabled", True)
+        else:
+            element.removeAttribute("disabled", False)
+    except Exception as er:
+        print(er)
+
+
 def set_enabled(element_id: str) -> None:
     """Enables the HTML element with the specified ID.
 
@@ -6,13 +6,36 @@ Creation Date: May 15, 2024
 Version: 1.0
 """
 
+import asyncio
 from collections import OrderedDict
+from typing import Any, Iterable
 
 from pyscript import document as docpy  # type: ignore
+from pyscript import window  # type: ignore
 
-from components.component import Component
+from components.component import Component, Variables
+from utils.profiler import profiled
+from utils.rowdiff import diff_rows, key_label, row_keys
 
-from .change_disabled import set_disabled, set_enabled
+from .change_disabled import set_disabled, set_enabled, toggle_disabled
+
+try:
+    from pyodide.ffi import create_once_callable  # type: ignore
+except ImportError:  # headless, mutations are applied right away
+    create_once_callable = None
+
+PROGRESSIVE_ROWS = 2000  # tables with more rows than this are rendered in chunks
+ROW_CHUNK = 500  # rows inserted at once by a progressive render
+PATCH_RATIO = 0.25  # tables are patched row by row up to this share of rows changed, and rendered again beyond
+PATCH_ROWS = create_once_callable is not None  # row patches need a real DOM, the headless one has no tree
+
+
+def _event_loop() -> asyncio.AbstractEventLoop | None:
+    """Gets the event loop to stream renders on: the running one, or the browser one under Pyodide."""
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None if create_once_callable is None else asyncio.get_event_loop()
 
 
 class PubSub:
@@ -44,6 +67,11 @@ class PubSub:
         """Initializes the PubSub instance."""
         self._components: OrderedDict[str, Component] = OrderedDict()
         self._root = docpy.getElementById("body")
+        self._elements: dict[str, Any] = {}  # parents and buttons, which live for the whole page
+        self._shown: dict[str, Variables] = {}  # the variables each shown component was rendered with
+        self._pending: list[tuple[Any, str, Any]] = []  # (parent, its new html, its button), in order
+        self._frame_requested = False
+        self._streams: dict[str, object] = {}  # the token of the progressive render of each component
 
     def subscribe(self, component: Component) -> None:
         """Subscribes a component to receive notifications.
@@ -68,13 +96,231 @@ class PubSub:
         Args:
             name (str): The name of the component to unsubscribe.
         """
-        self.unpublish(name)  # Remove the component instance from the screen
+        if self.is_published(name):
+            self.unpublish(name)  # Remove the component instance from the screen
         if name in self._components:
             del self._components[name]
+        self._shown.pop(name, None)
+
+    def reset(self) -> None:
+        """Removes every component from the screen, resets its variables and unsubscribes it."""
+        for name, component in list(self._components.items()):
+            self.unsubscribe(name)
+            component.unset_var()
+
+    def is_subscribed(self, name: str) -> bool:
+        """Checks whether a component is subscribed.
+
+        Args:
+            name (str): The name of the component.
+
+        Returns:
+            bool: True if the component is subscribed.
+        """
+        return name in self._components
+
+    def is_published(self, name: str) -> bool:
+        """Checks whether a component is currently on the screen.
+
+        Args:
+            name (str): The name of the component.
+
+        Returns:
+            bool: True if the component is subscribed and its element is in the document.
+        """
+        if name in self._streams:
+            return True  # its progressive render is in progress
+        if name in self._components:
+            self.flush()
+            return bool(docpy.getElementById(f"{self._components[name].id_}"))
+        return False
+
+    def _element(self, element_id: str) -> Any:
+        """Gets a parent or button element, looking it up in the document only once.
+
+        Args:
+            element_id (str): The ID of the element.
+
+        Returns:
+            Any: The element, or None if there is no such element.
+        """
+        if element_id not in self._elements:
+            element = docpy.getElementById(f"{element_id}") if element_id else None
+            if not element:
+                return None  # not cached, the element may be created later
+            self._elements[element_id] = element
+        return self._elements[element_id]
+
+    def _patch(self, name: str) -> bool:
+        """Updates a table on the screen by patching only its removed, inserted and changed rows.
+
+        The rows are matched by the 'keys' columns of the variables. The table is not patched if it is not on
+        the screen, its columns changed, the kept rows changed their order or too many rows changed.
+
+        Args:
+            name (str): The name of the component.
+
+        Returns:
+            bool: True if the table was patched, False if it must be rendered again.
+        """
+        component = self._components[name]
+        old, new = self._shown.get(name), component.variables
+        columns = new.get("keys")
+        if (
+            not PATCH_ROWS
+            or not old
+            or not columns
+            or old.get("keys") != columns
+            or not old.get("ready")
+            or not new.get("ready")
+            or name in self._streams
+        ):
+            return False
+        rows = docpy.getElementById(f"{component.id_}-rows")
+        if not rows:
+            return False
+        diff = diff_rows(
+            row_keys(old["table"], columns), row_keys(new["table"], columns), old["table"], new["table"]
+        )
+        if diff is None:
+            return False
+        if diff["removed"].size + diff["inserted"].size + diff["changed"].size > PATCH_RATIO * new["len"]:
+            return False
+
+        def row(table: dict, position: int) -> Any:
+            return docpy.getElementById(f"{component.id_}-{key_label(table, columns, position)}")
+
+        try:
+            for position in diff["removed"]:
+                row(old["table"], position).remove()
+            for position, html in zip(diff["changed"], component.render_rows(diff["changed"])):
+                row(new["table"], position).outerHTML = html
+            for anchor, html in zip(diff["anchors"], component.render_rows(diff["inserted"])):
+                if anchor < 0:
+                    rows.insertAdjacentHTML("beforeend", html)
+                else:
+                    row(new["table"], anchor).insertAdjacentHTML("beforebegin", html)
+        except AttributeError:  # a row is missing from the screen, the full render replaces the table
+            return False
+        return True
+
+    def _progressive(self, component: Component) -> asyncio.AbstractEventLoop | None:
+        """Gets the event loop to render a component in chunks on, or None to render it at once.
+
+        Args:
+            component (Component): The component.
+
+        Returns:
+            asyncio.AbstractEventLoop | None: The event loop, if the component is a large streamable table.
+        """
+        if component.streamable and component.variables.get("len", 0) > PROGRESSIVE_ROWS:
+            return _event_loop()
+        return None
+
+    async def _stream(self, name: str, token: object) -> None:
+        """Renders a component in chunks of rows, yielding to the event loop between chunks.
+
+        The render stops if another render or the removal of the component supersedes it.
+
+        Args:
+            name (str): The name of the component.
+            token (object): The token of this render.
+        """
+        self.flush()
+        if self._streams.get(name) is not token or name not in self._components:
+            return  # superseded, unpublished or unsubscribed before its first chunk
+        try:
+            component = self._components[name]
+            pieces = component.stream(ROW_CHUNK)
+            self._element(component.parent_id).innerHTML = next(pieces)
+            rows = docpy.getElementById(f"{component.id_}-rows")
+            set_enabled(component.btn_id)
+            for chunk in pieces:
+                rows.insertAdjacentHTML("beforeend", chunk)
+                await asyncio.sleep(0)  # let the browser paint and handle events
+                if self._streams.get(name) is not token:
+                    return
+        finally:
+            if self._streams.get(name) is token:
+                del self._streams[name]
 
+    def _start_stream(self, name: str, loop: asyncio.AbstractEventLoop) -> None:
+        """Starts the progressive render of a component, superseding any render of it in progress.
+
+        Args:
+            name (str): The name of the component.
+            loop (asyncio.AbstractEventLoop): The event loop to render on.
+        """
+        token = self._streams[name] = object()
+        loop.create_task(self._stream(name, token))
+        self._shown[name] = self._components[name].variables
+
+    def show(self, targets: Iterable[str], scope: Iterable[str] | None = None) -> None:
+        """Makes the targets the visible components of a view, in a single batch of DOM mutations.
+
+        Only the difference to what is on the screen is applied: components of the scope out of the targets are
+        removed, and targets are rendered if they are not on the screen or their variables changed since they
+        were. Every template is rendered before the DOM is touched, and the mutations run together in the next
+        animation frame, so the browser lays the page out once per view switch.
+
+        Args:
+            targets (Iterable[str]): The names of the components to show. Unsubscribed names are ignored.
+            scope (Iterable[str] | None, optional): The names of the components the view switch manages, or
+                None for every subscribed component. Defaults to None.
+        """
+        targets = {name for name in targets if name in self._components}
+        scope = set(self._components) if scope is None else set(scope) | targets
+        for name in scope - targets:
+            if name in self._shown and name in self._components:
+                component = self._components[name]
+                self._streams.pop(name, None)
+                self._pending.append((self._element(component.parent_id), "", self._element(component.btn_id)))
+                del self._shown[name]
+        for name in targets:
+            component = self._components[name]
+            if self._shown.get(name) is component.variables:
+                continue  # already on the screen and up to date
+            if self._patch(name):
+                self._shown[name] = component.variables
+                continue
+            loop = self._progressive(component)
+            if loop is not None:
+                self._start_stream(name, loop)  # the render flushes the batch before its first chunk
+                continue
+            html = component.render()
+            self._pending.append((self._element(component.parent_id), html, self._element(component.btn_id)))
+            self._shown[name] = component.variables
+        self._request_frame()
+
+    def _request_frame(self) -> None:
+        """Schedules the pending mutations for the next animation frame, or applies them if there are no frames."""
+        if not self._pending or self._frame_requested:
+            return
+        request = getattr(window, "requestAnimationFrame", None)
+        if create_once_callable is None or request is None:
+            self.flush()
+            return
+        self._frame_requested = True
+        request(create_once_callable(lambda *_: self.flush()))
+
+    def flush(self) -> None:
+        """Applies the pending DOM mutations, in the order they were queued."""
+        pending, self._pending = self._pending, []
+        self._frame_requested = False
+        for parent, html, button in pending:
+            if parent is not None:
+                parent.innerHTML = html
+            if button is not None:
+                toggle_disabled(button, not html)  # the button acts on the component, so only while it is shown
+
+    @profiled(label=lambda self, name: name)
     def publish(self, name: str) -> bool:
         """Publishes a component on the screen.
 
+        A table already on the screen whose variables name its key columns is patched row by row when few rows
+        changed. Large tables are rendered in chunks when there is an event loop to yield to, and the call
+        returns before the render ends.
+
         Args:
             name (str): The name of the component to publish.
 
@@ -84,19 +330,29 @@ class PubSub:
         Returns:
             bool: True if publishing is successful, False otherwise.
         """
+        self.flush()
         if name in self._components:
             component = self._components[name]
-            parent = docpy.getElementById(f"{component.parent_id}")
+            parent = self._element(component.parent_id)
+            if parent and self._patch(name):
+                self._shown[name] = component.variables
+                return True
+            self._streams.pop(name, None)
+            loop = self._progressive(component)
+            if parent and loop is not None:
+                self._start_stream(name, loop)
+                return True
             if parent:
                 parent.innerHTML = ""
                 parent.innerHTML = component.render()
                 set_enabled(component.btn_id)
+                self._shown[name] = component.variables
                 return True
         # If the component is not found or rendering fails
         raise ValueError(f"Component '{name}' not found or rendering failed.")
 
     def unpublish(self, name: str) -> bool:
-        """Removes a component from the screen.
+        """Removes a component from the screen, or stops its progressive render if it has not started yet.
 
         Args:
             name (str): The name of the component to remove.
@@ -107,10 +363,13 @@ class PubSub:
         Returns:
             bool: True if unpublishing is successful, False otherwise.
         """
+        self.flush()
         if name in self._components:
             component = self._components[name]
-            parent = docpy.getElementById(f"{component.parent_id}")
+            parent = self._element(component.parent_id)
             child = docpy.getElementById(f"{component.id_}")
+            self._shown.pop(name, None)
+            streaming = self._streams.pop(name, None) is not None
             if parent and child:
                 parent.removeChild(child)
                 set_disabled(component.btn_id)
@@ -119,6 +378,8 @@ class PubSub:
                 child.remove()
                 set_disabled(component.btn_id)
                 return True
+            if streaming:
+                return True  # its render had not started, and stops before its first chunk
         # If the component is not found or cannot be removed
         raise ValueError(f"Failed to remove component '{name}'.")
 
@@ -6,55 +6,115 @@ Creation Date: May 15, 2024
 Version: 1.0
 """
 
+from typing import Any, Callable, Hashable
+
 import numpy as np  # type: ignore
 from pandas import DataFrame
 
 from components.component import Component, Variables
 from pub_sub.pub_sub import pub_sub
-from utils.float_converter import float_converter
-from utils.integer_converter import integer_converter
+from utils.keys import group_sums
+from utils.profiler import deep_size, profiled
 
-from .table import Table
-from js import alert, window  # type: ignore
+from .table import Table, float_column, integer_column
+from js import alert  # type: ignore
 
 
 class Efd(Table):
     """Class representing Efd sheets."""
 
-    def __init__(self, names: list[str], component: Component, info: Component) -> None:
+    def __init__(
+        self, names: list[str], component: Component, info: Component, rejects: Component | None = None
+    ) -> None:
         """Initialize Efd instance.
 
         Args:
             names (list[str]): Column names for the Efd sheet.
             component (Component): Component.
             info (Component): Information component.
+            rejects (Component | None, optional): Component for the rows with invalid keys. Defaults to None.
+        """
+        super().__init__(names, component, info, rejects)
+        self._rollup: DataFrame | None = None
+
+    @property
+    def rollup(self) -> DataFrame | None:
+        """Get the Efd sheet rolled up from CNO to CNPJ level.
+
+        Returns:
+            DataFrame | None: CNPJ, number of CNO rows (OBRAS) and their total VALOR, one row per CNPJ.
         """
-        super().__init__(names, component, info)
+        return self._rollup
 
-    def pipeline(self) -> None:
-        """Execute the pipeline for Efd sheets. Returns None"""
-        self.sanitize_columns()
-        self.set_dict()
-        self.set_describe()
-        self.set_view()
+    def stages(self) -> list[Callable[[], None]]:
+        """List the stages of the pipeline for Efd sheets.
 
+        Returns:
+            list[Callable[[], None]]: The stages, in order.
+        """
+        return [
+            self.sanitize_columns,
+            self.validate_keys,
+            self.set_rollup,
+            self.set_dict,
+            self.set_describe,
+            self.set_view,
+        ]
+
+    @profiled
     def sanitize_columns(self):
         """Sanitize columns of the Efd sheet. Returns None"""
         if isinstance(self._df, DataFrame):
             try:
-                self._df["CNPJ"] = self._df["CNPJ"].apply(integer_converter)
-                self._df["VALOR"] = self._df["VALOR"].apply(float_converter)
+                self._df["CNPJ"] = integer_column(self._df["CNPJ"])
+                self._df["VALOR"] = float_column(self._df["VALOR"])
                 self._df["VALOR"] = self._df["VALOR"].round(2)
-                self._df["CNO"].fillna(0.00, inplace=True)
-                self._df.drop_duplicates(subset="CNPJ", keep="last", inplace=True)
-                self._df.sort_values(by="CNPJ", inplace=True)
+                self._df["CNO"] = integer_column(self._df["CNO"].fillna(0))  # 0 stands for no CNO
+                # A later row for the same CNPJ and CNO replaces the earlier one
+                self._df.drop_duplicates(subset=["CNPJ", "CNO"], keep="last", inplace=True)
+                self._df.sort_values(by=["CNPJ", "CNO"], inplace=True)
                 self._df.reset_index(drop=True, inplace=True)
                 self._df.set_index(np.arange(1, self._df.shape[0] + 1), inplace=True)
                 self._df.fillna(0.00, inplace=True)
             except Exception as er:
                 alert(f"Erro: {er}")
-                window.location.reload()
+                self.reset()
+
+    @profiled
+    def set_rollup(self) -> None:
+        """Sum the CNO rows of each CNPJ in one pass over the rows, sorted by CNPJ. Returns None"""
+        if isinstance(self._df, DataFrame):
+            cnpj, valor, obras = group_sums(
+                self._df["CNPJ"].to_numpy(dtype=np.int64),
+                self._df["VALOR"].to_numpy(dtype=np.float64),
+            )
+            self._rollup = DataFrame(
+                {"CNPJ": cnpj, "OBRAS": obras, "VALOR": valor.round(2)},
+                index=np.arange(1, cnpj.size + 1),
+            )
+
+    def restore(
+        self, df: DataFrame, describe: dict[Hashable, Any], rejects: DataFrame | None = None
+    ) -> None:
+        """Replace the table with an already sanitized DataFrame, its description and its rejected rows,
+        rolling it up again. Returns None"""
+        super().restore(df, describe, rejects)
+        self.set_rollup()
+
+    def memory_report(self) -> dict[str, int]:
+        """Get the memory held by the file, the data, the rollup and the views of the table.
+
+        Returns:
+            dict[str, int]: The bytes held by each attribute.
+        """
+        return {**super().memory_report(), "rollup": deep_size(self._rollup)}
+
+    def reset(self) -> None:
+        """Drop the file, the data, the rollup and the views, unsubscribing the components. Returns None"""
+        super().reset()
+        self._rollup = None
 
+    @profiled
     def set_view(self) -> None:
         """Set the view for Efd sheets. Returns None"""
         if isinstance(self._df, DataFrame):
@@ -63,9 +123,12 @@ class Efd(Table):
                 len=self._df.shape[0],
                 columns=list(self._as_dict.keys()),
                 ready=True,
+                keys=["CNPJ", "CNO"],
             )
             self._info.variables = Variables(describe=self._describe, ready=True)
-            pub_sub.subscribe(self._table)
-            pub_sub.subscribe(self._info)
+            for component in (self._table, self._info):
+                if not pub_sub.is_subscribed(component.name):
+                    pub_sub.subscribe(component)
             pub_sub.publish(self._table.name)
             pub_sub.publish(self._info.name)
+            self.set_rejects_view()
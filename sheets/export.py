@@ -0,0 +1,143 @@
+"""
+This module contains the export of the reconciliation results to XLSX and CSV.
+
+Rows are produced chunk by chunk from the column arrays of the frame, and partitions are boolean masks
+over those rows, so an export holds at most one chunk of Python values besides the frame itself.
+
+Author: Diógenes Dornelles Costa
+Creation Date: May 15, 2024
+Version: 1.0
+"""
+
+import codecs
+import io
+import zipfile
+from typing import Any, Iterator
+
+import numpy as np  # type: ignore
+from openpyxl import Workbook  # type: ignore
+from pandas import DataFrame
+
+from .table import column_views
+
+CHUNK_ROWS = 10_000
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+ZIP_MIME = "application/zip"
+
+# The rows of each exported view, as a mask over the frame rows, or None for all of them
+Views = dict[str, np.ndarray | None]
+
+
+def iter_chunks(frame: DataFrame, mask: np.ndarray | None = None, chunk_rows: int = CHUNK_ROWS) -> Iterator[Any]:
+    """Iterates over the row positions of a frame in chunks, keeping only the masked ones.
+
+    Args:
+        frame (DataFrame): The frame.
+        mask (np.ndarray | None, optional): The rows to keep, or None for all. Defaults to None.
+        chunk_rows (int, optional): The rows per chunk, before masking. Defaults to CHUNK_ROWS.
+
+    Yields:
+        Any: A slice, or an array of positions when masked, for each non-empty chunk.
+    """
+    for start in range(0, frame.shape[0], chunk_rows):
+        end = min(start + chunk_rows, frame.shape[0])
+        if mask is None:
+            yield slice(start, end)
+            continue
+        positions = start + np.flatnonzero(mask[start:end])
+        if positions.size:
+            yield positions
+
+
+def iter_rows(frame: DataFrame, mask: np.ndarray | None = None, chunk_rows: int = CHUNK_ROWS) -> Iterator[tuple]:
+    """Iterates over the rows of a frame as tuples of Python values, built from the column arrays.
+
+    Args:
+        frame (DataFrame): The frame.
+        mask (np.ndarray | None, optional): The rows to keep, or None for all. Defaults to None.
+        chunk_rows (int, optional): The rows converted at a time. Defaults to CHUNK_ROWS.
+
+    Yields:
+        tuple: The values of each row, in column order.
+    """
+    columns = list(column_views(frame).values())
+    for chunk in iter_chunks(frame, mask, chunk_rows):
+        yield from zip(*(column[chunk].tolist() for column in columns))
+
+
+def write_xlsx(frame: DataFrame, views: Views, target: Any) -> None:
+    """Writes each view of a frame to a sheet of a workbook, in openpyxl write-only mode.
+
+    Args:
+        frame (DataFrame): The frame.
+        views (Views): The rows of each sheet, by sheet title.
+        target (Any): The binary file to write to.
+    """
+    workbook = Workbook(write_only=True)
+    header = [str(name) for name in frame.columns]
+    for title, mask in views.items():
+        sheet = workbook.create_sheet(title=title)
+        sheet.append(header)
+        for row in iter_rows(frame, mask):
+            sheet.append(row)
+    workbook.save(target)
+
+
+def write_csv(frame: DataFrame, mask: np.ndarray | None, target: Any) -> None:
+    """Writes the rows of a frame to a CSV in chunks, in the Brazilian format read back by the CSV reader.
+
+    Args:
+        frame (DataFrame): The frame.
+        mask (np.ndarray | None): The rows to write, or None for all.
+        target (Any): The binary file to write to.
+    """
+    target.write(codecs.BOM_UTF8)  # lets spreadsheet applications detect UTF-8
+    text = io.TextIOWrapper(target, encoding="utf-8", newline="", write_through=True)
+    header = True
+    for chunk in iter_chunks(frame, mask):
+        frame.iloc[chunk].to_csv(text, sep=";", decimal=",", index=False, header=header)
+        header = False
+    if header:
+        frame.iloc[:0].to_csv(text, sep=";", decimal=",", index=False)
+    text.detach()
+
+
+def write_csv_zip(frame: DataFrame, views: Views, target: Any) -> None:
+    """Writes each view of a frame to its own CSV in a zip archive, streamed into the archive entries.
+
+    Args:
+        frame (DataFrame): The frame.
+        views (Views): The rows of each CSV, by file name without extension.
+        target (Any): The binary file to write to.
+    """
+    with zipfile.ZipFile(target, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for title, mask in views.items():
+            with archive.open(f"{title}.csv", "w") as entry:
+                write_csv(frame, mask, entry)
+
+
+def export(frame: DataFrame, views: Views, file_format: str) -> tuple[io.BytesIO, str]:
+    """Exports the views of a frame to an in-memory file.
+
+    Args:
+        frame (DataFrame): The frame.
+        views (Views): The rows of each view, by name.
+        file_format (str): 'xlsx' for a workbook with a sheet per view, 'csv' for a zip with a CSV per view.
+
+    Raises:
+        ValueError: If the format is unknown.
+
+    Returns:
+        tuple[io.BytesIO, str]: The file, positioned at the start, and its MIME type.
+    """
+    buffer = io.BytesIO()
+    if file_format == "xlsx":
+        write_xlsx(frame, views, buffer)
+        mime = XLSX_MIME
+    elif file_format == "csv":
+        write_csv_zip(frame, views, buffer)
+        mime = ZIP_MIME
+    else:
+        raise ValueError(f"Unknown export format: {file_format}")
+    buffer.seek(0)
+    return buffer, mime
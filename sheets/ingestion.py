@@ -0,0 +1,352 @@
+"""
+This module contains the ingestion strategies of uploaded workbooks and the choice between them.
+
+The estimated rows of the pre-flight and the size of the workbook give the peak memory of each strategy,
+and the first one that fits the memory budget is used:
+
+- eager: pandas.read_excel, the reference path, which holds every cell as an openpyxl object before the frame;
+- streaming: the rows are parsed in chunks (the worksheet XML row by row, or CSV chunks through the C
+  engine of pandas) and kept as compact column chunks;
+- spill: as streaming, but the chunks go to disk and the workbook is released before they are assembled.
+
+Author: Diógenes Dornelles Costa
+Creation Date: May 15, 2024
+Version: 1.0
+"""
+
+import os
+import shutil
+import tempfile
+import zipfile
+from typing import Any, Generator, Iterable, Iterator, TypedDict
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from utils.progress import drain
+
+from .preflight import Preflight, SharedStrings, iter_rows, sheet_paths
+
+DEFAULT_MEMORY_BUDGET = 1024 * 2**20
+CHUNK_ROWS = 20_000
+# peak bytes per cell read, measured with tracemalloc on synthetic workbooks
+EAGER_BYTES_PER_CELL = 130
+STREAMING_BYTES_PER_CELL = 100
+FRAME_BYTES_PER_CELL = 70
+OPFS_PATH = "/opfs"
+
+spill_directory: str | None = None
+opfs_mounted: bool | None = None
+_native_fs: Any = None  # the handle of the OPFS mount, to write its files back to the browser storage
+
+
+class Plan(TypedDict):
+    """The ingestion strategy chosen for a workbook.
+
+    Args:
+        TypedDict (_type_): Dictionary with the strategy ('eager', 'streaming' or 'spill'), the reason
+        for the choice, and the estimated peak memory and the budget, in bytes.
+    """
+    strategy: str
+    reason: str
+    estimate: int
+    budget: int
+
+
+def mebibytes(size: int) -> str:
+    """Formats a size in bytes as MiB, e.g. '12.5 MiB'.
+
+    Args:
+        size (int): The size, in bytes.
+
+    Returns:
+        str: The formatted size.
+    """
+    return f"{size / 2**20:.1f} MiB"
+
+
+def plan_ingestion(file_size: int, rows: int, columns: int, budget: int = DEFAULT_MEMORY_BUDGET) -> Plan:
+    """Chooses the ingestion strategy of a workbook from its size and estimated rows.
+
+    Args:
+        file_size (int): The workbook size, in bytes.
+        rows (int): The estimated data rows.
+        columns (int): The columns read.
+        budget (int, optional): The memory budget, in bytes. Defaults to DEFAULT_MEMORY_BUDGET.
+
+    Raises:
+        ValueError: If not even the spill strategy fits the budget.
+
+    Returns:
+        Plan: The strategy, with the reason for the choice.
+    """
+    cells = rows * columns
+    chunk_cells = min(rows, CHUNK_ROWS) * columns
+    frame = cells * FRAME_BYTES_PER_CELL
+    estimates = {
+        "eager": file_size + cells * EAGER_BYTES_PER_CELL,
+        "streaming": file_size + cells * STREAMING_BYTES_PER_CELL,
+        # the workbook and the frame never coexist, and the frame is assembled one column at a time
+        "spill": max(file_size + chunk_cells * STREAMING_BYTES_PER_CELL, frame + frame // columns),
+    }
+    for strategy, estimate in estimates.items():
+        if estimate <= budget:
+            if strategy == "eager":
+                reason = f"{rows} linhas, pico estimado de {mebibytes(estimate)} dentro do limite"
+            else:
+                reason = (
+                    f"{rows} linhas, leitura completa estimada em {mebibytes(estimates['eager'])} "
+                    f"excede o limite; {strategy} estimado em {mebibytes(estimate)}"
+                )
+            return Plan(strategy=strategy, reason=reason, estimate=estimate, budget=budget)
+    raise ValueError(
+        f"A planilha ({rows} linhas) exige cerca de {mebibytes(estimates['spill'])}, "
+        f"acima do limite de memória de {mebibytes(budget)}."
+    )
+
+
+def iter_chunks(
+    file: Any,
+    preflight: Preflight,
+    chunk_rows: int = CHUNK_ROWS,
+) -> Iterator[list[np.ndarray]]:
+    """Iterates over the data rows of a workbook or CSV in column chunks, skipping blank rows.
+
+    Args:
+        file (Any): The seekable file. Its position is restored to the start.
+        preflight (Preflight): The format and layout to read.
+        chunk_rows (int, optional): The rows per chunk. Defaults to CHUNK_ROWS.
+
+    Returns:
+        Iterator[list[np.ndarray]]: One array per column of 'usecols', for each chunk.
+    """
+    if preflight["format"] == "csv":
+        return iter_csv_chunks(file, preflight, chunk_rows)
+    return iter_xlsx_chunks(file, preflight, chunk_rows)
+
+
+def iter_csv_chunks(
+    file: Any,
+    preflight: Preflight,
+    chunk_rows: int = CHUNK_ROWS,
+) -> Iterator[list[np.ndarray]]:
+    """Iterates over the data rows of a CSV in column chunks, parsed by the C engine of pandas.
+
+    Args:
+        file (Any): The seekable CSV file. Its position is restored to the start.
+        preflight (Preflight): The delimiter, encoding, header row and columns to read.
+        chunk_rows (int, optional): The rows per chunk. Defaults to CHUNK_ROWS.
+
+    Yields:
+        list[np.ndarray]: One array per column of 'usecols', typed as pandas infers it for the chunk.
+    """
+    usecols = preflight["usecols"]
+    try:
+        with read_csv(file, preflight, chunksize=chunk_rows) as reader:
+            for chunk in reader:
+                yield [chunk[position].to_numpy() for position in usecols]
+    finally:
+        file.seek(0)
+
+
+def read_csv(file: Any, preflight: Preflight, **kwargs: Any) -> Any:
+    """Reads a CSV with the C engine of pandas, numbers in the Brazilian format, e.g. 1.234,56.
+
+    Args:
+        file (Any): The CSV file.
+        preflight (Preflight): The delimiter, encoding, header row and columns to read.
+        **kwargs (Any): Other arguments of pandas.read_csv, e.g. chunksize.
+
+    Returns:
+        Any: The DataFrame, with the columns named by position, or a reader of chunks.
+    """
+    return pd.read_csv(
+        file,
+        sep=preflight["delimiter"],
+        encoding=preflight["encoding"],
+        engine="c",
+        decimal=",",
+        thousands=".",
+        header=None,
+        skiprows=preflight["header_row"] + 1,
+        usecols=sorted(preflight["usecols"]),
+        skip_blank_lines=True,
+        **kwargs,
+    )
+
+
+def iter_xlsx_chunks(
+    file: Any,
+    preflight: Preflight,
+    chunk_rows: int = CHUNK_ROWS,
+) -> Iterator[list[np.ndarray]]:
+    """Iterates over the data rows of the pre-flight sheet in column chunks, skipping blank rows.
+
+    Args:
+        file (Any): The seekable workbook file. Its position is restored to the start.
+        preflight (Preflight): The sheet, header row and columns to read.
+        chunk_rows (int, optional): The rows per chunk. Defaults to CHUNK_ROWS.
+
+    Yields:
+        list[np.ndarray]: One array per column of 'usecols', typed as pandas infers it for the chunk.
+    """
+    usecols = preflight["usecols"]
+    archive = zipfile.ZipFile(file)
+    try:
+        path = dict(sheet_paths(archive))[preflight["sheet"]]
+        strings = SharedStrings(archive)
+        columns: list[list[Any]] = [[] for _ in usecols]
+        for number, values in iter_rows(archive, path, strings):
+            if number <= preflight["header_row"] + 1:
+                continue
+            row = [values[i] if i < len(values) else None for i in usecols]
+            if all(value is None for value in row):
+                continue
+            for column, value in zip(columns, row):
+                column.append(value)
+            if len(columns[0]) >= chunk_rows:
+                yield [pd.Series(column).to_numpy() for column in columns]
+                columns = [[] for _ in usecols]
+        if columns[0]:
+            yield [pd.Series(column).to_numpy() for column in columns]
+    finally:
+        archive.close()
+        file.seek(0)
+
+
+def assemble(names: list[str], parts: Iterable[list[np.ndarray]]) -> DataFrame:
+    """Builds a frame from column chunks, one column at a time, dropping the chunks as it goes.
+
+    Args:
+        names (list[str]): The column names.
+        parts (Iterable[list[np.ndarray]]): The chunks of each column, possibly loaded lazily. The lists
+            are emptied.
+
+    Returns:
+        DataFrame: The frame, with a RangeIndex.
+    """
+    data = {}
+    for name, chunks in zip(names, parts):
+        data[name] = np.concatenate(chunks) if chunks else np.array([], dtype=object)
+        chunks.clear()
+    return DataFrame(data, copy=False)
+
+
+def iter_streaming(file: Any, preflight: Preflight, names: list[str]) -> Generator[int, None, DataFrame]:
+    """Reads a workbook row by row, keeping only compact column chunks in memory.
+
+    Args:
+        file (Any): The seekable workbook file.
+        preflight (Preflight): The sheet, header row and columns to read.
+        names (list[str]): The column names, in the order of 'usecols'.
+
+    Yields:
+        Generator[int, None, DataFrame]: The rows read after each chunk; the frame is the return value.
+    """
+    parts: list[list[np.ndarray]] = [[] for _ in names]
+    rows = 0
+    for chunk in iter_chunks(file, preflight):
+        for column, array in zip(parts, chunk):
+            column.append(array)
+        rows += len(chunk[0]) if chunk else 0
+        yield rows
+    return assemble(names, parts)
+
+
+def read_streaming(file: Any, preflight: Preflight, names: list[str]) -> DataFrame:
+    """Reads a workbook row by row, keeping only compact column chunks in memory, see iter_streaming.
+
+    Args:
+        file (Any): The workbook file.
+        preflight (Preflight): The sheet, header row and columns to read.
+        names (list[str]): The column names, in the order of 'usecols'.
+
+    Returns:
+        DataFrame: The frame.
+    """
+    return drain(iter_streaming(file, preflight, names))
+
+
+def iter_spill(file: Any, preflight: Preflight, names: list[str]) -> Generator[int, None, DataFrame]:
+    """Reads a workbook row by row, spilling the column chunks to disk, and assembles them after closing it.
+
+    The chunks go to a temporary directory under 'spill_directory' (an OPFS mount in the browser, when
+    available, see mount_opfs), removed once the frame is built.
+
+    Args:
+        file (Any): The workbook file. It is closed before the frame is assembled.
+        preflight (Preflight): The sheet, header row and columns to read.
+        names (list[str]): The column names, in the order of 'usecols'.
+
+    Yields:
+        Generator[int, None, DataFrame]: The rows read after each chunk; the frame is the return value.
+    """
+    directory = tempfile.mkdtemp(prefix="spill-", dir=spill_directory)
+    try:
+        count = 0
+        rows = 0
+        for count, chunk in enumerate(iter_chunks(file, preflight), start=1):
+            for position, array in enumerate(chunk):
+                np.save(os.path.join(directory, f"{position}-{count}.npy"), array, allow_pickle=True)
+            rows += len(chunk[0]) if chunk else 0
+            yield rows
+        file.close()
+        parts = (
+            [np.load(os.path.join(directory, f"{position}-{index}.npy"), allow_pickle=True)
+             for index in range(1, count + 1)]
+            for position in range(len(names))
+        )
+        return assemble(names, parts)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def read_spill(file: Any, preflight: Preflight, names: list[str]) -> DataFrame:
+    """Reads a workbook row by row, spilling the column chunks to disk, see iter_spill.
+
+    Args:
+        file (Any): The workbook file.
+        preflight (Preflight): The sheet, header row and columns to read.
+        names (list[str]): The column names, in the order of 'usecols'.
+
+    Returns:
+        DataFrame: The frame.
+    """
+    return drain(iter_spill(file, preflight, names))
+
+
+async def mount_opfs(path: str = OPFS_PATH) -> bool:
+    """Mounts the origin private file system of the browser, once, and makes it the spill directory.
+
+    Pyodide keeps the files of a native mount in its own file system until synced, so the gain of spilling
+    in the browser is mostly releasing the workbook before the frame is assembled.
+
+    Args:
+        path (str, optional): The mount point. Defaults to OPFS_PATH.
+
+    Returns:
+        bool: True if mounted, False where OPFS or Pyodide are unavailable.
+    """
+    global spill_directory, opfs_mounted, _native_fs
+    if opfs_mounted is not None:
+        return opfs_mounted
+    try:
+        import pyodide_js  # type: ignore
+        from js import navigator  # type: ignore
+
+        handle = await navigator.storage.getDirectory()
+        _native_fs = await pyodide_js.mountNativeFS(path, handle)
+    except Exception as er:
+        print(f"OPFS indisponível, usando o diretório temporário: {er}")
+        opfs_mounted = False
+        return False
+    spill_directory = path
+    opfs_mounted = True
+    return True
+
+
+async def sync_opfs() -> None:
+    """Writes the files of the OPFS mount back to the browser storage, so they outlive the page. Returns None"""
+    if _native_fs is not None:
+        await _native_fs.syncfs()
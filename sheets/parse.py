@@ -6,7 +6,7 @@ Creation Date: May 15, 2024
 Version: 1.0
 """
 
-from typing import Any, Hashable
+from typing import Any, Callable, Hashable
 
 import matplotlib.pyplot as plt
 import numpy as np  # type: ignore
@@ -18,18 +18,43 @@ from components.component import Component, Variables
 from pub_sub.pub_sub import pub_sub
 from sheets.efd import Efd
 from sheets.siafi import Siafi
+from sheets.table import column_views, views_size
 from utils.format_brl_currency import format_brl_currency
+from utils.hierarchy import Hierarchy, build_hierarchy, children
+from utils.keys import cno_codebook, lookup, pack_keys
+from utils.periods import key_differences
+from utils.profiler import deep_size, profiled
+from utils.progress import CancelToken, Progress, Steps, drain, drive, stage_steps
+from utils.query import Query, check_query, query_frame
+from utils.ranking import OUTLIER_SCORE, robust_scores, top_n
+from utils.rundiff import diff_runs
+
+# Reconcile Siafi against Efd rolled up by CNPJ, or against each CNO row of Efd by CNPJ and CNO
+KEY_MODES = ("cnpj", "cnpj_cno")
+FLOAT_COLUMNS = ("VALOR_SIAFI", "VALOR_EFD", "DIFERENÇAS")
+TOP_ITEMS = 10  # the largest differences of each side listed in the information and plotted
+OUTLIER_ITEMS = 10  # the atypical differences of each side listed besides the largest ones
 
 
 class Parse:
     """Class representing Parse sheets."""
 
-    def __init__(self, table: Component, info: Component) -> None:
+    def __init__(
+        self,
+        table: Component,
+        info: Component,
+        hierarchy: Component | None = None,
+        run_diff: Component | None = None,
+    ) -> None:
         """Initialize Parse instance.
 
         Args:
             table (Component): Component for table.
             info (Component): Information component.
+            hierarchy (Component | None, optional): Component for the raiz, CNPJ and CNO drill-down.
+                Defaults to None.
+            run_diff (Component | None, optional): Component for the changes since the previous run.
+                Defaults to None.
         Returns None
         """
         self._df: DataFrame | None = None
@@ -43,6 +68,15 @@ class Parse:
         self._df_efd_only = None
         self._df_siafi_greater = None
         self._df_efd_greater = None
+        self._key_mode = KEY_MODES[0]
+        self._hierarchy_component = hierarchy
+        self._hierarchy: Hierarchy | None = None
+        self._drill: list[int] = []
+        self._run_diff_component = run_diff
+        self._previous_run: tuple[np.ndarray, np.ndarray] | None = None
+        self._pending_run: tuple[np.ndarray, np.ndarray] | None = None  # kept until the run completes
+        self._run_diff: DataFrame | None = None
+        self._query: Query = {}
 
     @property
     def df(self) -> DataFrame | None:
@@ -91,17 +125,235 @@ class Parse:
         self._efd = value
         self.pipeline()
 
-    def pipeline(self) -> None:
-        """Execute the pipeline for Parse sheets.
-        Returns: None"""
-        self.parse()
-        self.sanitize_columns()
+    @property
+    def key_mode(self) -> str:
+        """Get the key Siafi and Efd are joined by.
+
+        Returns:
+            str: 'cnpj' or 'cnpj_cno'.
+        """
+        return self._key_mode
+
+    @key_mode.setter
+    def key_mode(self, value: str) -> None:
+        """Set the key Siafi and Efd are joined by, running the analysis again.
+
+        Args:
+            value (str): 'cnpj' or 'cnpj_cno'.
+
+        Raises:
+            ValueError: If the key mode is unknown.
+        """
+        if value not in KEY_MODES:
+            raise ValueError(f"Unknown key mode: {value}")
+        self._key_mode = value
+        self.pipeline()
+
+    @property
+    def query(self) -> Query:
+        """Get the filter and sort of the table view.
+
+        Returns:
+            Query: The query, empty for every row in order.
+        """
+        return self._query
+
+    @query.setter
+    def query(self, value: Query) -> None:
+        """Set the filter and sort of the table view, updating the view without running the analysis again.
+
+        Args:
+            value (Query): The query, empty for every row in order.
+
+        Raises:
+            ValueError: If the query is not valid.
+        """
+        self._query = check_query(value)
+        self.set_view()
+
+    def restore(
+        self,
+        siafi: Siafi,
+        efd: Efd,
+        df: DataFrame,
+        describe: dict[Hashable, Any],
+        key_mode: str = KEY_MODES[0],
+    ) -> None:
+        """Replace the analysis with an already computed result and its description, e.g. from a session
+        snapshot, redrawing the plot and the view.
+
+        Args:
+            siafi (Siafi): Siafi instance.
+            efd (Efd): Efd instance.
+            df (DataFrame): The result of a previous analysis.
+            describe (dict[Hashable, Any]): Its description.
+            key_mode (str, optional): The key of that analysis. Defaults to 'cnpj'.
+        Returns: None
+        """
+        self.reset()
+        self._key_mode = key_mode
+        self._siafi = siafi
+        self._efd = efd
+        self._df = df
+        self._describe = describe
+        self.set_hierarchy()
         self.set_siafi_greater()
         self.set_efd_greater()
         self.set_dict()
-        self.set_describe()
+        self.set_run_diff()  # The restored result is the run the next one is compared with
         self.plot()
+        self.release_partitions()
         self.set_view()
+        self.commit_run()
+
+    def release_partitions(self) -> None:
+        """Drop the partitions, once consumed by the description and the plot. Returns: None"""
+        self._df_siafi_only = None
+        self._df_efd_only = None
+        self._df_siafi_greater = None
+        self._df_efd_greater = None
+
+    def export_views(self) -> dict[str, np.ndarray | None]:
+        """Get the rows of the result and of its partitions, as masks over the result rows.
+
+        Returns:
+            dict[str, np.ndarray | None]: The mask of each view by title (None for all rows), or an empty
+                dict when there is no result.
+        """
+        if not isinstance(self._df, DataFrame):
+            return {}
+        siafi, efd = self._df["VALOR_SIAFI"], self._df["VALOR_EFD"]
+        return {
+            "Conciliação": None,
+            "SIAFI maior": (siafi > efd).to_numpy(dtype=bool, na_value=False),
+            "EFD maior": (efd > siafi).to_numpy(dtype=bool, na_value=False),
+        }
+
+    def period_frame(self) -> DataFrame | None:
+        """Get the result keyed as the period store expects: CHAVE is the CNPJ of each row or, for the rows
+        only in Siafi, its RECOLHEDOR.
+
+        Returns:
+            DataFrame | None: The result with the CHAVE column, or None when there is no result.
+        """
+        if not isinstance(self._df, DataFrame):
+            return None
+        return self._df.assign(CHAVE=self.result_keys())
+
+    def result_keys(self) -> np.ndarray:
+        """Get the key of each row of the result: its CNPJ or, for the rows only in Siafi, its RECOLHEDOR.
+
+        Returns:
+            np.ndarray: The keys, as int64.
+        """
+        cnpj = self._df["CNPJ"].to_numpy(dtype=np.int64, na_value=0)
+        recolhedor = self._df["RECOLHEDOR"].to_numpy(dtype=np.int64, na_value=0)
+        return np.where(cnpj != 0, cnpj, recolhedor)
+
+    def differences_by_key(self) -> tuple[np.ndarray, np.ndarray] | None:
+        """Get the difference of each key of the result, summed over its rows.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray] | None: The keys, sorted, and their differences, or None when there
+                is no result.
+        """
+        if not isinstance(self._df, DataFrame):
+            return None
+        return key_differences(DataFrame({"CHAVE": self.result_keys(), "DIFERENÇAS": self._df["DIFERENÇAS"]}))
+
+    def memory_report(self) -> dict[str, int]:
+        """Get the memory held by the result, its partitions and views.
+
+        Returns:
+            dict[str, int]: The bytes held by each attribute.
+        """
+        return {
+            "df": deep_size(self._df),
+            "as_dict": views_size(self._as_dict, self._df),
+            "describe": deep_size(self._describe),
+            "hierarchy": deep_size(self._hierarchy),
+            "df_siafi_greater": deep_size(self._df_siafi_greater),
+            "df_efd_greater": deep_size(self._df_efd_greater),
+        }
+
+    def reset(self) -> None:
+        """Drop the result, its partitions and views, unsubscribing the components and closing the plot.
+        Returns: None"""
+        self._df = None
+        self._as_dict = {}
+        self._describe = {}
+        self._hierarchy = None
+        self._drill = []
+        self._previous_run = None
+        self._pending_run = None
+        self._run_diff = None
+        self.release_partitions()
+        for component in self.components():
+            pub_sub.unsubscribe(component.name)
+            component.unset_var()
+        plt.close("all")
+
+    def stages(self) -> list[Callable[[], None]]:
+        """List the stages of the pipeline for Parse sheets.
+
+        Returns:
+            list[Callable[[], None]]: The stages, in order.
+        """
+        return [
+            self.parse,
+            self.sanitize_columns,
+            self.set_hierarchy,
+            self.set_siafi_greater,
+            self.set_efd_greater,
+            self.set_dict,
+            self.set_describe,
+            self.set_run_diff,
+            self.plot,
+            self.release_partitions,
+            self.set_view,
+            self.commit_run,
+        ]
+
+    def pipeline(self) -> None:
+        """Execute the pipeline for Parse sheets.
+        Returns: None"""
+        drain(self.pipeline_steps())
+
+    def pipeline_steps(self) -> Steps[None]:
+        """Execute the pipeline for Parse sheets, yielding the progress before each stage.
+
+        Yields:
+            Steps[None]: The stage about to run and the rows of the result.
+        """
+        return stage_steps("Parse", self.stages(), lambda: 0 if self._df is None else int(self._df.shape[0]))
+
+    async def run(
+        self,
+        token: CancelToken,
+        report: Callable[[Progress], Any] | None = None,
+        *,
+        siafi: Siafi | None = None,
+        efd: Efd | None = None,
+    ) -> None:
+        """Set the Siafi and the Efd instances, as the setters do, running the pipeline as a task that yields
+        between stages, reports its progress and stops when the token is cancelled.
+
+        Args:
+            token (CancelToken): The token of the run.
+            report (Callable[[Progress], Any] | None, optional): Receives the progress before each stage.
+                Defaults to None.
+            siafi (Siafi | None, optional): Siafi instance, or None to keep the current one. Defaults to None.
+            efd (Efd | None, optional): Efd instance, or None to keep the current one. Defaults to None.
+
+        Raises:
+            Cancelled: If the token is cancelled.
+        Returns: None
+        """
+        if siafi is not None:
+            self._siafi = siafi
+        if efd is not None:
+            self._efd = efd
+        await drive(self.pipeline_steps(), token, report)
 
     @property
     def as_dict(self) -> dict[Hashable, Any] | None:
@@ -130,6 +382,39 @@ class Parse:
         """
         return self._info
 
+    @property
+    def hierarchy(self) -> Hierarchy | None:
+        """Get the raiz, CNPJ and CNO aggregates of the Parse sheet.
+
+        Returns:
+            Hierarchy | None: The aggregate hierarchy.
+        """
+        return self._hierarchy
+
+    def components(self) -> list[Component]:
+        """Get the components showing the Parse sheet.
+
+        Returns:
+            list[Component]: The table, the information and, when given, the hierarchy and the run diff
+                components.
+        """
+        components = [self._table, self._info]
+        if self._hierarchy_component is not None:
+            components.append(self._hierarchy_component)
+        if self._run_diff_component is not None:
+            components.append(self._run_diff_component)
+        return components
+
+    @property
+    def run_diff(self) -> DataFrame | None:
+        """Get the changes since the previous run of the analysis.
+
+        Returns:
+            DataFrame | None: The keys whose difference appeared, vanished or changed, or None before a second
+                run.
+        """
+        return self._run_diff
+
     @property
     def describe(self) -> dict[Hashable, Any]:
         """Get descriptive statistics of the Parse sheet.
@@ -139,61 +424,209 @@ class Parse:
         """
         return self._describe
 
+    @profiled
+    def set_run_diff(self) -> None:
+        """Compare the result with the previous complete run, e.g. before a corrected workbook, and set its
+        view. The result becomes the run the next one is compared with only once commit_run completes the run,
+        so a cancelled run keeps the baseline. Returns: None"""
+        current = self._pending_run = self.differences_by_key()
+        previous = self._previous_run
+        if current is None or previous is None:
+            self._run_diff = None
+            if self._run_diff_component is not None:
+                pub_sub.unsubscribe(self._run_diff_component.name)
+                self._run_diff_component.unset_var()
+            return
+        self._run_diff = diff_runs(previous, current)
+        if self._run_diff_component is not None:
+            as_dict = column_views(self._run_diff)
+            self._run_diff_component.variables = Variables(
+                table=as_dict,
+                len=self._run_diff.shape[0],
+                columns=list(as_dict.keys()),
+                keys=["CHAVE"],
+                ready=True,
+            )
+
+    def commit_run(self) -> None:
+        """Keep the result of the completed run as the run the next one is compared with. Returns: None"""
+        self._previous_run, self._pending_run = self._pending_run, None
+
+    @profiled
     def parse(self) -> None:
         """Parse the data from Siafi and Efd sheets
         Returns: None"""
         if (isinstance(self._siafi, Siafi)) and (
             isinstance(self._efd, Efd)
             and (isinstance(self._efd.df, DataFrame))
+            and (isinstance(self._efd.rollup, DataFrame))
             and (isinstance(self._siafi.df, DataFrame))
         ):
-            self._df = self._siafi.df.merge(
-                right=self._efd.df,
-                how="outer",
-                left_on="RECOLHEDOR",
-                right_on="CNPJ",
-                suffixes=("_SIAFI", "_EFD"),
-            )
+            siafi = self._siafi.declared_sites(self._efd.df)
+            if self._key_mode == "cnpj_cno":
+                self._df = self.merge_cnpj_cno(siafi, self._efd.df)
+            else:
+                self._df = self.siafi_by_cnpj(siafi, self._efd.df).merge(
+                    right=self._efd.rollup,
+                    how="outer",
+                    left_on="RECOLHEDOR",
+                    right_on="CNPJ",
+                    suffixes=("_SIAFI", "_EFD"),
+                )
             self._df.fillna(0.00, inplace=True)
             self._df["DIFERENÇAS"] = self._df["VALOR_SIAFI"] - self._df["VALOR_EFD"]
             self._df["DIFERENÇAS"] = self._df["DIFERENÇAS"].round(2)
             self._df.reset_index(drop=True, inplace=True)
             self._df.set_index(np.arange(1, self._df.shape[0] + 1), inplace=True)
 
+    @staticmethod
+    def site_owners(recolhedor: np.ndarray, efd: DataFrame) -> tuple[np.ndarray, np.ndarray]:
+        """Find the CNPJ and CNO of each Siafi RECOLHEDOR.
+
+        Siafi has no CNO column: a RECOLHEDOR equal to a CNO declared in Efd is that construction site, of
+        the CNPJ that declared it, and any other RECOLHEDOR is a CNPJ without CNO (0).
+
+        Args:
+            recolhedor (np.ndarray): The Siafi RECOLHEDOR column.
+            efd (DataFrame): Efd by CNPJ and CNO.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: The CNPJ and the CNO of each RECOLHEDOR.
+        """
+        efd_cno = efd["CNO"].to_numpy(dtype=np.int64)
+        order = np.argsort(efd_cno, kind="stable")
+        sites = efd_cno[order] != 0
+        site_cno, site_cnpj = efd_cno[order][sites], efd["CNPJ"].to_numpy(dtype=np.int64)[order][sites]
+        cnpj = lookup(recolhedor, site_cno, site_cnpj, recolhedor)
+        cno = lookup(recolhedor, site_cno, site_cno, np.zeros_like(recolhedor))
+        return cnpj, cno
+
+    @staticmethod
+    def siafi_by_cnpj(siafi: DataFrame, efd: DataFrame) -> DataFrame:
+        """Attribute the Siafi rows collected by a construction site to its CNPJ.
+
+        Args:
+            siafi (DataFrame): Siafi grouped by RECOLHEDOR.
+            efd (DataFrame): Efd by CNPJ and CNO.
+
+        Returns:
+            DataFrame: Siafi grouped by the CNPJ of each RECOLHEDOR, or the same frame when none is a CNO.
+        """
+        recolhedor = siafi["RECOLHEDOR"].to_numpy(dtype=np.int64)
+        cnpj, _ = Parse.site_owners(recolhedor, efd)
+        if np.array_equal(cnpj, recolhedor):
+            return siafi
+        grouped = siafi.assign(RECOLHEDOR=cnpj).groupby("RECOLHEDOR")[["DOCUMENTO", "VALOR"]].sum()
+        grouped["VALOR"] = grouped["VALOR"].round(2)
+        return grouped.reset_index()
+
+    @staticmethod
+    def merge_cnpj_cno(siafi: DataFrame, efd: DataFrame) -> DataFrame:
+        """Join Siafi and the CNO rows of Efd by CNPJ and CNO, packed into a single int64 key when possible.
+
+        Args:
+            siafi (DataFrame): Siafi grouped by RECOLHEDOR.
+            efd (DataFrame): Efd by CNPJ and CNO.
+
+        Returns:
+            DataFrame: The outer join, with the Siafi columns followed by the Efd ones.
+        """
+        cnpj, cno = Parse.site_owners(siafi["RECOLHEDOR"].to_numpy(dtype=np.int64), efd)
+        efd_cnpj = efd["CNPJ"].to_numpy(dtype=np.int64)
+        efd_cno = efd["CNO"].to_numpy(dtype=np.int64)
+        codebook = cno_codebook(efd_cno)
+        siafi_key = pack_keys(cnpj, cno, codebook)
+        if siafi_key is None:
+            # Too many CNOs to pack, join on both columns
+            left, right = {"CHAVE_CNPJ": cnpj, "CHAVE_CNO": cno}, {"CHAVE_CNPJ": efd_cnpj, "CHAVE_CNO": efd_cno}
+        else:
+            left, right = {"CHAVE": siafi_key}, {"CHAVE": pack_keys(efd_cnpj, efd_cno, codebook)}
+        merged = siafi.assign(**left).merge(
+            right=efd.assign(**right),
+            how="outer",
+            on=list(left),
+            suffixes=("_SIAFI", "_EFD"),
+        )
+        return merged.drop(columns=list(left))
+
+    @profiled
     def sanitize_columns(self) -> None:
         """Sanitize columns of the Parse sheet
         Returns: None"""
         if isinstance(self._df, DataFrame):
-            self._df["RECOLHEDOR"] = self._df["RECOLHEDOR"].astype(
-                "Int64",
-                copy=False,
-            )
-            self._df["VALOR_SIAFI"] = self._df["VALOR_SIAFI"].astype(
-                "Float64",
-                copy=False,
-            )
-            self._df["CNPJ"] = self._df["CNPJ"].astype(
-                "Int64",
-                copy=False,
-            )
-            self._df["VALOR_EFD"] = self._df["VALOR_EFD"].astype(
-                "Float64",
-                copy=False,
-            )
-            self._df["DOCUMENTO"] = self._df["DOCUMENTO"].astype(
-                "Int64",
-                copy=False,
-            )
-            self._df["CNO"] = self._df["CNO"].astype(
-                "Int64",
-                copy=False,
-            )
-            self._df["DIFERENÇAS"] = self._df["DIFERENÇAS"].astype(
-                "Float64",
-                copy=False,
-            )
+            for column in self._df.columns:
+                self._df[column] = self._df[column].astype(
+                    "Float64" if column in FLOAT_COLUMNS else "Int64",
+                    copy=False,
+                )
             self._df.reset_index(drop=True, inplace=True)
 
+    @profiled
+    def set_hierarchy(self) -> None:
+        """Aggregate the result by raiz, CNPJ and, when joined by CNO, CNO, once per run. A row without CNPJ
+        (only in Siafi) is keyed by its RECOLHEDOR.
+        Returns: None"""
+        if isinstance(self._df, DataFrame):
+            cnpj = self._df["CNPJ"].to_numpy(dtype=np.int64, na_value=0)
+            recolhedor = self._df["RECOLHEDOR"].to_numpy(dtype=np.int64, na_value=0)
+            cno = self._df["CNO"].to_numpy(dtype=np.int64, na_value=0) if "CNO" in self._df.columns else None
+            self._hierarchy = build_hierarchy(
+                np.where(cnpj != 0, cnpj, recolhedor),
+                {column: self._df[column].to_numpy(dtype=np.float64, na_value=0.0) for column in FLOAT_COLUMNS},
+                cno,
+            )
+            self._drill = []
+
+    def drill(self, depth: int, index: int | None = None) -> None:
+        """Open an entry of the hierarchy, or go back up to a level, and update the hierarchy view.
+
+        Args:
+            depth (int): The level of the entry, 0 being the raiz.
+            index (int | None, optional): The position of the entry in its level, or None to show the whole
+                level. Defaults to None.
+        Returns: None
+        """
+        if self._hierarchy is None:
+            return
+        self._drill = self._drill[:depth] + ([] if index is None else [index])
+        self.set_hierarchy_view()
+
+    @profiled
+    def set_hierarchy_view(self) -> None:
+        """Set the hierarchy view to the children of the open entry, sliced from the precomputed levels.
+        Returns: None"""
+        if self._hierarchy_component is None or self._hierarchy is None:
+            return
+        levels = self._hierarchy["levels"]
+        depth = len(self._drill)
+        span = children(self._hierarchy, depth - 1, self._drill[-1]) if depth else slice(0, levels[0]["key"].size)
+        if depth < len(levels):
+            level = levels[depth]
+            table: dict[Hashable, Any] = {level["name"].upper(): level["key"][span], "LINHAS": level["rows"][span]}
+            for column in FLOAT_COLUMNS:
+                table[column] = level["sums"][column][span]
+                table[f"QTD {column}"] = level["counts"][column][span]
+        else:
+            positions = self._hierarchy["order"][span]
+            table = {column: values[positions] for column, values in self._as_dict.items()}
+        breadcrumbs = [{"label": "Raízes", "depth": 0}] + [
+            {"label": f"{levels[level]['name'].upper()} {levels[level]['key'][index]}", "depth": level + 1}
+            for level, index in enumerate(self._drill)
+        ]
+        self._hierarchy_component.variables = Variables(
+            table=table,
+            len=span.stop - span.start,
+            columns=list(table.keys()),
+            describe={
+                "breadcrumbs": breadcrumbs,
+                "depth": depth,
+                "start": span.start,
+                "leaf": depth == len(levels),
+            },
+            ready=True,
+        )
+
+    @profiled
     def set_siafi_greater(self) -> None:
         """Set rows where the Siafi value is greater than the Efd value
         Returns None"""
@@ -203,6 +636,7 @@ class Parse:
             ]
             self._df_siafi_greater = self._df_siafi_greater.reset_index()
 
+    @profiled
     def set_efd_greater(self) -> None:
         """Set rows where the Efd value is greater than the Siafi value
         Returns: None"""
@@ -212,11 +646,13 @@ class Parse:
             ]
             self._df_efd_greater = self._df_efd_greater.reset_index()
 
+    @profiled
     def set_dict(self) -> None:
-        """Set table as dict. Returns: None"""
+        """Set table as a dict of column arrays, sharing the DataFrame memory. Returns: None"""
         if isinstance(self._df, DataFrame):
-            self._as_dict = self._df.to_dict(orient="list")
+            self._as_dict = column_views(self._df)
 
+    @profiled
     def set_describe(self) -> None:
         """Set table describe
         Returns: None"""
@@ -233,30 +669,81 @@ class Parse:
             )
             self._describe["greater_siafi_count"] = int(self._df_siafi_greater.shape[0])
             self._describe["greater_efd_count"] = int(self._df_efd_greater.shape[0])
-            self._describe["greater_siafi_recolhedor"] = self._df_siafi_greater[
-                "RECOLHEDOR"
-            ].values.tolist()
-            self._describe["greater_efd_cnpj"] = self._df_efd_greater[
-                "CNPJ"
-            ].values.tolist()
+            for side, greater in (("siafi", self._df_siafi_greater), ("efd", self._df_efd_greater)):
+                scores = robust_scores(greater["DIFERENÇAS"].to_numpy(dtype=np.float64, na_value=0.0))
+                flagged = scores > OUTLIER_SCORE
+                top = self.top_rows(greater)
+                # the outliers out of the largest differences, e.g. the smallest ones, the most atypical first
+                others = flagged.copy()
+                others[top.index.to_numpy()] = False
+                positions = np.flatnonzero(others)
+                positions = positions[top_n(scores[positions], OUTLIER_ITEMS)]
+                self._describe[f"greater_{side}_outliers"] = int(flagged.sum())
+                self._describe[f"greater_{side}_top"] = self.summary_items(top, flagged)
+                self._describe[f"greater_{side}_atypical"] = self.summary_items(greater.iloc[positions], flagged)
+                self._describe[f"greater_{side}_atypical_more"] = int(others.sum()) - positions.size
             self._describe["sum"] = format_brl_currency(
                 round(self._df["VALOR_SIAFI"].sum() - self._df["VALOR_EFD"].sum(), 2)
             )
 
+    @staticmethod
+    def summary_items(rows: DataFrame, flagged: np.ndarray) -> list[dict[str, Any]]:
+        """List rows of a partition as the information shows them.
+
+        Args:
+            rows (DataFrame): The rows, keeping their positions in the partition as index.
+            flagged (np.ndarray): The outlier mask of the partition.
+
+        Returns:
+            list[dict[str, Any]]: The recolhedor, CNPJ, formatted difference and outlier flag of each row.
+        """
+        return [
+            {
+                "recolhedor": recolhedor,
+                "cnpj": cnpj,
+                "difference": format_brl_currency(abs(difference)),
+                "outlier": bool(flagged[position]),
+            }
+            for position, recolhedor, cnpj, difference in zip(
+                rows.index.tolist(),
+                rows["RECOLHEDOR"].to_numpy(dtype=np.int64, na_value=0).tolist(),
+                rows["CNPJ"].to_numpy(dtype=np.int64, na_value=0).tolist(),
+                rows["DIFERENÇAS"].to_numpy(dtype=np.float64, na_value=0.0).tolist(),
+            )
+        ]
+
+    @staticmethod
+    def top_rows(greater: DataFrame) -> DataFrame:
+        """Select the rows of largest difference of a partition, without sorting it.
+
+        Args:
+            greater (DataFrame): The rows where Siafi or Efd is greater, with a default index.
+
+        Returns:
+            DataFrame: Up to TOP_ITEMS rows, the largest difference first, keeping their positions as index.
+        """
+        return greater.iloc[top_n(greater["DIFERENÇAS"].to_numpy(dtype=np.float64, na_value=0.0), TOP_ITEMS)]
+
+    @profiled
     def plot(self) -> None:
-        """Plot differences
+        """Plot the largest differences of each side
         Returns: None"""
-        if isinstance(self._df, DataFrame):
+        if (
+            isinstance(self._df, DataFrame)
+            and isinstance(self._df_siafi_greater, DataFrame)
+            and isinstance(self._df_efd_greater, DataFrame)
+        ):
             concatenated_df = pd.concat(
                 [
-                    self._df_efd_greater,
-                    self._df_siafi_greater,
+                    self.top_rows(self._df_efd_greater),
+                    self.top_rows(self._df_siafi_greater),
                 ],
                 axis=0,
             )
             concatenated_df.set_index(
                 np.arange(1, concatenated_df.shape[0] + 1), inplace=True
             )
+            plt.close("all")  # the figures of previous runs are never shown again
             plt.figure(figsize=(10, 6))
             data = [
                 f"Rec-{rec}\nCNPJ-{cnpj}"
@@ -292,16 +779,23 @@ class Parse:
             plt.tight_layout()
             plt.show()
 
+    @profiled
     def set_view(self) -> None:
-        """Set table view
+        """Set table view, filtered and sorted by the query, if any
         Returns: None"""
         if isinstance(self._df, DataFrame):
+            # The hierarchy indexes the rows of as_dict, so a query gets views of its own
+            frame = query_frame(self._df, self._query) if self._query else self._df
+            table = column_views(frame) if self._query else self._as_dict
             self._table.variables = Variables(
-                table=self._as_dict,
-                len=self._df.shape[0],
-                columns=list(self._as_dict.keys()),
+                table=table,
+                len=frame.shape[0],
+                columns=list(table.keys()),
                 ready=True,
+                keys=[column for column in ("RECOLHEDOR", "CNPJ", "CNO") if column in table],
             )
             self._info.variables = Variables(describe=self._describe, ready=True)
-            pub_sub.subscribe(self._table)
-            pub_sub.subscribe(self._info)
+            self.set_hierarchy_view()
+            for component in self.components():
+                if component.variables.get("ready") and not pub_sub.is_subscribed(component.name):
+                    pub_sub.subscribe(component)
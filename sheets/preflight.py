@@ -0,0 +1,507 @@
+"""
+This module contains the pre-flight validation of uploaded workbooks, run before the full parse.
+
+Only the workbook index, the first rows of each sheet (to find the header) and a small sample of data rows
+are read, straight from the xlsx archive, with the shared strings parsed lazily up to the last one used.
+A wrong file is rejected, or a shifted layout corrected, in milliseconds, whatever the workbook size.
+
+Author: Diógenes Dornelles Costa
+Creation Date: May 15, 2024
+Version: 1.0
+"""
+
+import csv
+import io
+import posixpath
+import re
+import unicodedata
+import zipfile
+from typing import Any, Callable, Iterator, TypedDict
+from xml.etree.ElementTree import iterparse
+
+LAYOUTS: dict[str, list[str]] = {
+    "SIAFI": ["RECOLHEDOR", "DOCUMENTO", "VALOR"],
+    "EFD": ["CNPJ", "CNO", "VALOR"],
+}
+HEADER_SCAN_ROWS = 10
+SAMPLE_ROWS = 20
+ROW_SIZE_PROBE = 64 * 1024
+CSV_PROBE = 64 * 1024
+CSV_DELIMITERS = ";,\t|"
+ZIP_MAGIC = b"PK\x03\x04"
+
+_MAIN = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_RELATIONSHIP = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"
+_PACKAGE_RELATIONSHIP = "{http://schemas.openxmlformats.org/package/2006/relationships}Relationship"
+_CELL_REFERENCE = re.compile(r"([A-Z]+)(\d+)")
+
+
+class Preflight(TypedDict):
+    """The layout found by the pre-flight, to be passed on to the reader.
+
+    Args:
+        TypedDict (_type_): Dictionary with the file format ('xlsx' or 'csv'), the sheet (xlsx), delimiter
+        and encoding (csv), header row (0-based), column positions of each name, estimated data rows and
+        notes on the corrections made.
+    """
+    format: str
+    sheet: str
+    delimiter: str
+    encoding: str
+    header_row: int
+    usecols: list[int]
+    rows: int
+    notes: list[str]
+
+
+class SharedStrings:
+    """The shared strings of a workbook, parsed only up to the highest index requested."""
+
+    def __init__(self, archive: zipfile.ZipFile) -> None:
+        """Initializes a SharedStrings instance.
+
+        Args:
+            archive (zipfile.ZipFile): The xlsx archive.
+        """
+        self._strings: list[str] = []
+        self._items: Iterator[str] = iter(())
+        if "xl/sharedStrings.xml" in archive.namelist():
+            self._items = self._parse(archive.open("xl/sharedStrings.xml"))
+
+    @staticmethod
+    def _parse(stream: Any) -> Iterator[str]:
+        """Yields the text of each shared string, rich text runs joined."""
+        for _, element in iterparse(stream):
+            if element.tag == f"{_MAIN}si":
+                yield "".join(text.text or "" for text in element.iter(f"{_MAIN}t"))
+                element.clear()
+
+    def __getitem__(self, index: int) -> str:
+        """Gets a shared string, parsing the table up to it."""
+        while len(self._strings) <= index:
+            self._strings.append(next(self._items, ""))
+        return self._strings[index]
+
+
+def column_index(letters: str) -> int:
+    """Converts column letters to a 0-based index, e.g. 'A' to 0 and 'AA' to 26.
+
+    Args:
+        letters (str): The column letters.
+
+    Returns:
+        int: The column index.
+    """
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - 64
+    return index - 1
+
+
+def sheet_paths(archive: zipfile.ZipFile) -> list[tuple[str, str]]:
+    """Lists the worksheets of a workbook, in order.
+
+    Args:
+        archive (zipfile.ZipFile): The xlsx archive.
+
+    Returns:
+        list[tuple[str, str]]: The title and archive path of each worksheet.
+    """
+    targets = {}
+    for _, element in iterparse(archive.open("xl/_rels/workbook.xml.rels")):
+        if element.tag == _PACKAGE_RELATIONSHIP:
+            target = element.get("Target", "")
+            path = target.lstrip("/") if target.startswith("/") else posixpath.join("xl", target)
+            targets[element.get("Id")] = posixpath.normpath(path)
+    return [
+        (element.get("name", ""), targets[element.get(_RELATIONSHIP)])
+        for _, element in iterparse(archive.open("xl/workbook.xml"))
+        if element.tag == f"{_MAIN}sheet" and element.get(_RELATIONSHIP) in targets
+    ]
+
+
+def cell_value(cell: Any, strings: SharedStrings) -> Any:
+    """Reads the value of a cell element.
+
+    Args:
+        cell (Any): The 'c' element.
+        strings (SharedStrings): The shared strings.
+
+    Returns:
+        Any: The text or number, or None for an empty cell.
+    """
+    kind = cell.get("t", "n")
+    if kind == "inlineStr":
+        return "".join(text.text or "" for text in cell.iter(f"{_MAIN}t"))
+    value = cell.findtext(f"{_MAIN}v")
+    if value is None:
+        return None
+    if kind == "s":
+        return strings[int(value)]
+    if kind in ("str", "e"):
+        return value
+    if kind == "b":
+        return value == "1"
+    number = float(value)
+    return int(number) if number.is_integer() and "." not in value and "E" not in value.upper() else number
+
+
+def iter_rows(archive: zipfile.ZipFile, path: str, strings: SharedStrings) -> Iterator[tuple[int, tuple]]:
+    """Iterates over the rows of a worksheet, parsing and releasing one row element at a time.
+
+    Args:
+        archive (zipfile.ZipFile): The xlsx archive.
+        path (str): The worksheet path in the archive.
+        strings (SharedStrings): The shared strings.
+
+    Yields:
+        tuple[int, tuple]: The 1-based row number and the row values, with None for empty cells. The row
+            number is 0 for the 'dimension' element, whose value is the last row, or None if undeclared.
+    """
+    count = 0
+    sheet_data = None
+    with archive.open(path) as stream:
+        for event, element in iterparse(stream, events=("start", "end")):
+            if event == "start":
+                if element.tag == f"{_MAIN}sheetData":
+                    sheet_data = element
+            elif element.tag == f"{_MAIN}dimension":
+                match = _CELL_REFERENCE.fullmatch(element.get("ref", "").split(":")[-1])
+                yield 0, (int(match.group(2)) if match else None,)
+            elif element.tag == f"{_MAIN}row":
+                count = int(element.get("r", count + 1))
+                values: dict[int, Any] = {}
+                for position, cell in enumerate(element.iter(f"{_MAIN}c")):
+                    match = _CELL_REFERENCE.fullmatch(cell.get("r", ""))
+                    values[column_index(match.group(1)) if match else position] = cell_value(cell, strings)
+                yield count, tuple(values.get(i) for i in range(max(values, default=-1) + 1))
+                # also detach the parsed rows from the sheet, or a million empty elements pile up there
+                if sheet_data is not None:
+                    sheet_data.clear()
+
+
+def read_rows(
+    archive: zipfile.ZipFile,
+    path: str,
+    strings: SharedStrings,
+    max_rows: int,
+) -> tuple[list[tuple], int | None]:
+    """Reads the first rows of a worksheet and its declared last row, stopping as soon as they are read.
+
+    Args:
+        archive (zipfile.ZipFile): The xlsx archive.
+        path (str): The worksheet path in the archive.
+        strings (SharedStrings): The shared strings.
+        max_rows (int): The number of rows to read, counted from the first row of the sheet.
+
+    Returns:
+        tuple[list[tuple], int | None]: The rows (empty ones included, as empty tuples), and the last row
+            of the 'dimension' element, if declared.
+    """
+    rows: list[tuple] = []
+    last_row = None
+    for number, values in iter_rows(archive, path, strings):
+        if number == 0:
+            last_row = values[0]
+            continue
+        if number > max_rows:
+            break
+        rows.extend(() for _ in range(number - 1 - len(rows)))
+        rows.append(values)
+    return rows, last_row
+
+
+def estimate_rows(archive: zipfile.ZipFile, path: str) -> int:
+    """Estimates the rows of a worksheet that does not declare its dimension, from the size of its first rows.
+
+    Args:
+        archive (zipfile.ZipFile): The xlsx archive.
+        path (str): The worksheet path in the archive.
+
+    Returns:
+        int: The estimated number of rows.
+    """
+    with archive.open(path) as stream:
+        probe = stream.read(ROW_SIZE_PROBE)
+    rows = probe.count(b"<row") or 1
+    return round(archive.getinfo(path).file_size * rows / max(len(probe), 1))
+
+
+def normalize(cell: Any) -> str:
+    """Normalizes a header cell: upper case, no accents and no surrounding spaces.
+
+    Args:
+        cell (Any): The cell value.
+
+    Returns:
+        str: The normalized text.
+    """
+    text = unicodedata.normalize("NFKD", str(cell if cell is not None else "")).strip().upper()
+    return "".join(char for char in text if not unicodedata.combining(char))
+
+
+def find_columns(row: tuple, names: list[str]) -> list[int] | None:
+    """Finds the position of each name in a row, accepting cells that start with the name (e.g. 'CNPJ/CPF').
+
+    Args:
+        row (tuple): The row values.
+        names (list[str]): The expected column names.
+
+    Returns:
+        list[int] | None: The position of each name, or None if any name is missing.
+    """
+    cells = [normalize(cell) for cell in row]
+    positions: list[int] = []
+    for name in names:
+        position = next(
+            (i for i, cell in enumerate(cells) if cell.startswith(name) and i not in positions),
+            None,
+        )
+        if position is None:
+            return None
+        positions.append(position)
+    return positions
+
+
+def has_digits(value: Any) -> bool:
+    """Checks whether a cell holds a number or text with digits.
+
+    Args:
+        value (Any): The cell value.
+
+    Returns:
+        bool: True if the value can be converted by the sheets converters.
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return True
+    return isinstance(value, str) and any(char.isdigit() for char in value)
+
+
+def layout_name(names: list[str]) -> str:
+    """Gets the name of the layout with the given columns.
+
+    Args:
+        names (list[str]): The expected column names.
+
+    Returns:
+        str: The layout name, e.g. 'SIAFI', or an empty string if the columns match no layout.
+    """
+    return next((kind for kind, layout in LAYOUTS.items() if layout == names), "")
+
+
+def check_sample(sample: list[tuple], names: list[str], usecols: list[int]) -> None:
+    """Checks that the sample rows have the columns to read, and numbers in the key and value columns.
+
+    Args:
+        sample (list[tuple]): The first data rows, blank ones excluded.
+        names (list[str]): The expected column names.
+        usecols (list[int]): The position of each name.
+
+    Raises:
+        ValueError: If there are no rows, too few columns, or a key or value column without numbers.
+    """
+    if not sample:
+        raise ValueError("A planilha não possui linhas de dados.")
+    if max(len(row) for row in sample) <= max(usecols):
+        raise ValueError(f"A planilha possui menos de {max(usecols) + 1} colunas.")
+    for name, position in ((names[0], usecols[0]), (names[-1], usecols[-1])):
+        valid = sum(has_digits(row[position]) for row in sample if position < len(row))
+        if valid * 2 < len(sample):
+            raise ValueError(f"A coluna {name} não contém números nas primeiras linhas.")
+
+
+def detect_format(file: Any, name: str = "") -> str:
+    """Detects the format of an upload from its content, falling back to its extension.
+
+    Args:
+        file (Any): The seekable file. Its position is restored to the start.
+        name (str, optional): The file name. Defaults to "".
+
+    Raises:
+        ValueError: If the file is neither a workbook nor text.
+
+    Returns:
+        str: 'xlsx' or 'csv'.
+    """
+    probe = file.read(CSV_PROBE)
+    file.seek(0)
+    if probe.startswith(ZIP_MAGIC):
+        return "xlsx"
+    extension = name.rpartition(".")[2].lower()
+    if extension == "xlsx":
+        raise ValueError("O arquivo não é uma planilha XLSX válida.")
+    if b"\x00" in probe:
+        raise ValueError("O arquivo não é uma planilha XLSX nem um CSV.")
+    return "csv"
+
+
+def sniff_encoding(probe: bytes) -> str:
+    """Guesses the encoding of a CSV from its first bytes: UTF-8 when they decode as such, else Latin-1.
+
+    Args:
+        probe (bytes): The first bytes of the file.
+
+    Returns:
+        str: The encoding name.
+    """
+    try:
+        # a probe may cut a multi-byte character in half
+        probe.decode("utf-8")
+    except UnicodeDecodeError as er:
+        if er.start < len(probe) - 3:
+            return "latin-1"
+    return "utf-8-sig" if probe.startswith(b"\xef\xbb\xbf") else "utf-8"
+
+
+def preflight_csv(file: Any, names: list[str]) -> Preflight:
+    """Validates an uploaded CSV against the expected columns, from its first lines.
+
+    The delimiter is the first of CSV_DELIMITERS whose rows hold the expected header.
+
+    Args:
+        file (Any): The seekable CSV file. Its position is restored to the start.
+        names (list[str]): The expected column names, the first being the key (RECOLHEDOR or CNPJ).
+
+    Raises:
+        ValueError: If the file belongs to another layout, has too few columns, no data, or a sample whose
+            key or value columns do not hold numbers.
+
+    Returns:
+        Preflight: The delimiter, encoding, header row, column positions and estimated rows to read.
+    """
+    notes: list[str] = []
+    kind = layout_name(names)
+    probe = file.read(CSV_PROBE)
+    file.seek(0)
+    encoding = sniff_encoding(probe)
+    lines = probe.decode(encoding, errors="ignore").splitlines()
+    if len(probe) == CSV_PROBE and len(lines) > 1:
+        lines.pop()  # the last line may be cut by the probe
+    found = None
+    for delimiter in CSV_DELIMITERS:
+        rows = [tuple(row) for row in csv.reader(lines[:HEADER_SCAN_ROWS], delimiter=delimiter)]
+        for index, row in enumerate(rows):
+            usecols = find_columns(row, names)
+            if usecols is not None:
+                found = (delimiter, index, usecols)
+                break
+            for other, layout in LAYOUTS.items():
+                if other != kind and find_columns(row, layout) is not None:
+                    raise ValueError(f"A planilha parece ser {other}, não {kind or 'a esperada'}.")
+        if found:
+            break
+
+    if found is None:
+        try:
+            delimiter = csv.Sniffer().sniff("\n".join(lines[:HEADER_SCAN_ROWS]), CSV_DELIMITERS).delimiter
+        except csv.Error:
+            delimiter = CSV_DELIMITERS[0]
+        header_row, usecols = 0, list(range(len(names)))
+        notes.append("Cabeçalho não encontrado; usando as primeiras colunas.")
+    else:
+        delimiter, header_row, usecols = found
+        if header_row:
+            notes.append(f"Cabeçalho encontrado na linha {header_row + 1}.")
+        if usecols != list(range(len(names))):
+            notes.append(f"Colunas reordenadas: {', '.join(map(str, usecols))}.")
+
+    data = [
+        tuple(cell if cell.strip() else None for cell in row)
+        for row in csv.reader(lines[header_row + 1:], delimiter=delimiter)
+    ]
+    data = [row for row in data if any(cell is not None for cell in row)]
+    check_sample(data[:SAMPLE_ROWS], names, usecols)
+
+    size = file.seek(0, io.SEEK_END)
+    file.seek(0)
+    rows = len(data) if len(probe) < CSV_PROBE else round(size * len(data) / max(len(probe), 1))
+    return Preflight(
+        format="csv",
+        sheet="",
+        delimiter=delimiter,
+        encoding=encoding,
+        header_row=header_row,
+        usecols=usecols,
+        rows=max(rows, len(data[:SAMPLE_ROWS])),
+        notes=notes,
+    )
+
+
+def preflight(file: Any, names: list[str]) -> Preflight:
+    """Validates an uploaded workbook against the expected columns, without parsing it in full.
+
+    Args:
+        file (Any): The seekable workbook file. Its position is restored to the start.
+        names (list[str]): The expected column names, the first being the key (RECOLHEDOR or CNPJ).
+
+    Raises:
+        ValueError: If the file is not a workbook, belongs to another layout, has too few columns, no data,
+            or a sample whose key or value columns do not hold numbers.
+
+    Returns:
+        Preflight: The sheet, header row, column positions and estimated rows to read.
+    """
+    notes: list[str] = []
+    kind = layout_name(names)
+    try:
+        archive = zipfile.ZipFile(file)
+    except zipfile.BadZipFile as er:
+        file.seek(0)
+        raise ValueError("O arquivo não é uma planilha XLSX válida.") from er
+    try:
+        strings = SharedStrings(archive)
+        sheets = sheet_paths(archive)
+        if not sheets:
+            raise ValueError("A planilha não possui abas.")
+        found = None
+        for title, path in sheets:
+            rows, last_row = read_rows(archive, path, strings, HEADER_SCAN_ROWS)
+            for index, row in enumerate(rows):
+                usecols = find_columns(row, names)
+                if usecols is not None:
+                    found = (title, path, index, usecols, last_row)
+                    break
+                for other, layout in LAYOUTS.items():
+                    if other != kind and find_columns(row, layout) is not None:
+                        raise ValueError(f"A planilha parece ser {other}, não {kind or 'a esperada'}.")
+            if found:
+                break
+
+        if found is None:
+            title, path = sheets[0]
+            header_row, usecols = 0, list(range(len(names)))
+            last_row = read_rows(archive, path, strings, 0)[1]
+            notes.append("Cabeçalho não encontrado; usando as primeiras colunas da primeira aba.")
+        else:
+            title, path, header_row, usecols, last_row = found
+            if path != sheets[0][1]:
+                notes.append(f"Dados lidos da aba '{title}'.")
+            if header_row:
+                notes.append(f"Cabeçalho encontrado na linha {header_row + 1}.")
+            if usecols != list(range(len(names))):
+                notes.append(f"Colunas reordenadas: {', '.join(map(str, usecols))}.")
+
+        rows, _ = read_rows(archive, path, strings, header_row + 1 + SAMPLE_ROWS)
+        sample = [row for row in rows[header_row + 1:] if any(cell is not None for cell in row)]
+        check_sample(sample, names, usecols)
+
+        total_rows = last_row if last_row is not None else estimate_rows(archive, path)
+        return Preflight(
+            format="xlsx",
+            sheet=title,
+            delimiter="",
+            encoding="",
+            header_row=header_row,
+            usecols=usecols,
+            rows=max(total_rows - header_row - 1, len(sample)),
+            notes=notes,
+        )
+    finally:
+        archive.close()
+        file.seek(0)
+
+
+PREFLIGHTS: dict[str, Callable[[Any, list[str]], Preflight]] = {
+    "xlsx": preflight,
+    "csv": preflight_csv,
+}
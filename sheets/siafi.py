@@ -6,6 +6,8 @@ Creation Date: May 15, 2024
 Version: 1.0
 """
 
+from typing import Callable
+
 import numpy as np  # type: ignore
 import pandas as pd
 from pandas import DataFrame, Series
@@ -13,47 +15,100 @@ from pandas.core.groupby import DataFrameGroupBy
 
 from components.component import Component, Variables
 from pub_sub.pub_sub import pub_sub
-from utils.float_converter import float_converter
-from utils.integer_converter import integer_converter
+from utils.cnpj import REASON_SITE, site_candidates
+from utils.profiler import profiled
 
-from .table import Table
-from js import alert, window  # type: ignore
+from .table import Table, float_column, integer_column
+from js import alert  # type: ignore
 
 
 class Siafi(Table):
     """Class representing Siafi sheets."""
 
-    def __init__(self, names: list[str], component: Component, info: Component) -> None:
+    def __init__(
+        self, names: list[str], component: Component, info: Component, rejects: Component | None = None
+    ) -> None:
         """Initialize Siafi instance.
 
         Args:
             names (list[str]): Column names for the Siafi sheet.
             component (Component): Component.
             info (Component): Information component.
+            rejects (Component | None, optional): Component for the rows with invalid keys. Defaults to None.
         """
-        super().__init__(names, component, info)
+        super().__init__(names, component, info, rejects)
+
+    def stages(self) -> list[Callable[[], None]]:
+        """List the stages of the pipeline for Siafi sheets.
 
-    def pipeline(self) -> None:
-        """Execute the pipeline for Siafi sheets. Returns None"""
-        self.sanitize_columns()
-        self.apply_groupby()
-        self.set_dict()
-        self.set_describe()
-        self.set_view()
+        Returns:
+            list[Callable[[], None]]: The stages, in order.
+        """
+        return [
+            self.sanitize_columns,
+            self.validate_keys,
+            self.apply_groupby,
+            self.set_dict,
+            self.set_describe,
+            self.set_view,
+        ]
 
+    @profiled
     def sanitize_columns(self):
         """Sanitize columns of the Siafi sheet. Returns None"""
         if isinstance(self._df, DataFrame):
             try:
-                self._df["RECOLHEDOR"] = self._df["RECOLHEDOR"].apply(integer_converter)
-                self._df["VALOR"] = self._df["VALOR"].apply(float_converter)
+                self._df["RECOLHEDOR"] = integer_column(self._df["RECOLHEDOR"])
+                self._df["VALOR"] = float_column(self._df["VALOR"])
                 self._df.sort_values(by="RECOLHEDOR", inplace=True)
                 self._df.reset_index(drop=True, inplace=True)
                 self._df.fillna(0.00, inplace=True)
             except Exception as er:
                 alert(f"Erro: {er}")
-                window.location.reload()
+                self.reset()
+
+    def valid_keys(self, keys: np.ndarray) -> np.ndarray:
+        """Check the RECOLHEDOR keys. A 12-digit RECOLHEDOR that is not a valid CNPJ is kept as a construction
+        site (CNO) until the join checks that Efd declares it, see declared_sites.
+
+        Args:
+            keys (np.ndarray): Distinct keys.
+
+        Returns:
+            np.ndarray: Whether each key is a valid CNPJ or CPF, or has the 12 digits of a CNO.
+        """
+        return super().valid_keys(keys) | site_candidates(keys)
+
+    def declared_sites(self, efd: DataFrame) -> DataFrame:
+        """Get the rows to join with Efd, moving to the rejects those whose RECOLHEDOR has the 12 digits of a
+        CNO that Efd does not declare. They stay in the table, so a later Efd may declare them.
+
+        Args:
+            efd (DataFrame): Efd by CNPJ and CNO.
+
+        Returns:
+            DataFrame: The rows whose RECOLHEDOR is a CNPJ, a CPF or a CNO declared in Efd.
+        """
+        recolhedor = self._df["RECOLHEDOR"].to_numpy(dtype=np.int64)
+        efd_cno = efd["CNO"].to_numpy(dtype=np.int64)
+        undeclared = site_candidates(recolhedor) & ~np.isin(recolhedor, efd_cno[efd_cno != 0])
+        if self._rejects is not None:
+            # the rows rejected by a previous Efd are checked again
+            kept = self._rejects[self._rejects["MOTIVO"] != REASON_SITE]
+            if undeclared.any() or kept.shape[0] < self._rejects.shape[0]:
+                self._rejects = pd.concat([kept, self._df[undeclared].assign(MOTIVO=REASON_SITE)])
+        elif undeclared.any():
+            self._rejects = self._df[undeclared].assign(MOTIVO=REASON_SITE)
+        if self._rejects is not None:
+            self._rejects.index = np.arange(1, self._rejects.shape[0] + 1)
+            if self._describe:
+                self._describe["rejects"] = int(self._rejects.shape[0])
+                if pub_sub.is_published(self._info.name):
+                    pub_sub.publish(self._info.name)
+            self.set_rejects_view()
+        return self._df[~undeclared] if undeclared.any() else self._df
 
+    @profiled
     def apply_groupby(self) -> None:
         """Apply groupby operation on the Siafi sheet. Returns None"""
         if isinstance(self.df, DataFrame):
@@ -70,8 +125,9 @@ class Siafi(Table):
                 self._df.index = np.arange(1, len(self._df) + 1)
             except Exception as er:
                 alert(f"Erro: {er}")
-                window.location.reload()
+                self.reset()
 
+    @profiled
     def set_view(self) -> None:
         """Set the view for Siafi sheets. Returns None"""
         if isinstance(self._df, DataFrame):
@@ -80,9 +136,12 @@ class Siafi(Table):
                 len=self._df.shape[0],
                 columns=list(self._as_dict.keys()),
                 ready=True,
+                keys=self._names[:1],
             )
             self._info.variables = Variables(describe=self._describe, ready=True)
-            pub_sub.subscribe(self._table)
-            pub_sub.subscribe(self._info)
+            for component in (self._table, self._info):
+                if not pub_sub.is_subscribed(component.name):
+                    pub_sub.subscribe(component)
             pub_sub.publish(self._table.name)
             pub_sub.publish(self._info.name)
+            self.set_rejects_view()
@@ -0,0 +1,85 @@
+"""
+This module contains the save and restore of a whole reconciliation session.
+
+A session snapshot is a columnar file (see utils.columnar) with the sanitized Siafi and Efd frames and their
+rejected rows, the Parse result, and their descriptions in the metadata. Restoring it rebuilds the three views without
+reading any workbook nor running the sanitize, group by and merge stages.
+
+Author: Diógenes Dornelles Costa
+Creation Date: May 15, 2024
+Version: 1.0
+"""
+
+from datetime import datetime
+from typing import Any
+
+from utils.columnar import ColumnarFile, dumps
+
+from .efd import Efd
+from .parse import Parse
+from .siafi import Siafi
+
+SESSION_EXTENSION = "siafiefd"
+SESSION_MIME = "application/octet-stream"
+
+
+def save_session(siafi: Siafi, efd: Efd, parse: Parse) -> bytes:
+    """Serializes the frames and descriptions of a session.
+
+    Args:
+        siafi (Siafi): The Siafi sheet.
+        efd (Efd): The Efd sheet.
+        parse (Parse): The analysis.
+
+    Raises:
+        ValueError: If no sheet has been read.
+
+    Returns:
+        bytes: The snapshot.
+    """
+    sheets = {"siafi": siafi, "efd": efd, "parse": parse}
+    frames = {name: sheet.df for name, sheet in sheets.items() if sheet.df is not None}
+    if not frames:
+        raise ValueError("Nenhuma planilha carregada para salvar.")
+    describe = {name: sheets[name].describe for name in frames}
+    for name, sheet in (("siafi", siafi), ("efd", efd)):
+        if sheet.df is not None and sheet.rejects is not None:
+            frames[f"{name}_rejects"] = sheet.rejects
+    meta = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "describe": describe,
+        "key_mode": parse.key_mode,
+    }
+    return dumps(frames, meta)
+
+
+def restore_session(data: Any, siafi: Siafi, efd: Efd, parse: Parse) -> str:
+    """Restores a session snapshot into the sheets, replacing their contents.
+
+    Args:
+        data (Any): The snapshot, as any object supporting the buffer protocol.
+        siafi (Siafi): The Siafi sheet.
+        efd (Efd): The Efd sheet.
+        parse (Parse): The analysis.
+
+    Raises:
+        ValueError: If the data is not a session snapshot or has an unsupported version.
+
+    Returns:
+        str: The creation date of the snapshot.
+    """
+    file = ColumnarFile(data)
+    describe = file.meta.get("describe", {})
+    for name, sheet in (("siafi", siafi), ("efd", efd)):
+        if name in file.frames:
+            rejects = file.read(f"{name}_rejects") if f"{name}_rejects" in file.frames else None
+            sheet.restore(file.read(name), describe.get(name, {}), rejects)
+        else:
+            sheet.reset()
+    if "parse" in file.frames:
+        parse.restore(
+            siafi, efd, file.read("parse"), describe.get("parse", {}), file.meta.get("key_mode", "cnpj")
+        )
+    else:
+        parse.reset()
+    return str(file.meta.get("created", ""))
@@ -6,36 +6,197 @@ Creation Date: May 15, 2024
 Version: 1.0
 """
 
+import io
 from abc import ABC, abstractmethod
-from typing import Any, Hashable
+from importlib.util import find_spec
+from typing import Any, Callable, Hashable
 
+import numpy as np  # type: ignore
 import pandas as pd
-from pandas import DataFrame
+from pandas import DataFrame, Series
+from pandas.api.types import is_bool_dtype, is_numeric_dtype, is_signed_integer_dtype
 
-from components.component import Component
+from components.component import Component, Variables
+from pub_sub.pub_sub import pub_sub
+from utils.cnpj import key_valid, reject_reasons
+from utils.float_converter import float_converter
 from utils.format_brl_currency import format_brl_currency
-from js import alert, window  # type: ignore
+from utils.integer_converter import integer_converter
+from utils.profiler import deep_size, profiled, profiler
+from utils.progress import CancelToken, Cancelled, Progress, Steps, drain, drive, stage_steps
+
+from .ingestion import DEFAULT_MEMORY_BUDGET, Plan, iter_spill, iter_streaming, plan_ingestion, read_csv
+from .preflight import PREFLIGHTS, Preflight, detect_format
+from js import alert  # type: ignore
+
+
+# Fastest first, openpyxl being the fallback; calamine is an optional dependency
+XLSX_ENGINES = ["calamine", "openpyxl"] if find_spec("python_calamine") else ["openpyxl"]
+
+
+def read_xlsx(file: Any, layout: Preflight, names: list[str], engines: list[str] | None = None) -> DataFrame:
+    """Read a workbook at once with read_excel, through the first engine that succeeds. A failing engine
+    is noted in the layout notes.
+
+    Args:
+        file (Any): The seekable workbook file.
+        layout (Preflight): The sheet, header row and columns to read.
+        names (list[str]): The column names, in the order of 'usecols'.
+        engines (list[str] | None, optional): The engines to try, in order. Defaults to XLSX_ENGINES.
+
+    Returns:
+        DataFrame: The columns of the sheet, named and ordered as 'names'.
+    """
+    # read_excel returns the columns in sheet order, whatever the order of usecols
+    usecols = layout["usecols"]
+    order = sorted(range(len(usecols)), key=usecols.__getitem__)
+    engines = engines or XLSX_ENGINES
+    for engine in engines:
+        file.seek(0)
+        try:
+            return pd.read_excel(
+                file,
+                sheet_name=layout["sheet"],
+                header=layout["header_row"],
+                names=[names[i] for i in order],
+                engine=engine,
+                usecols=sorted(usecols),
+            )[names]
+        except Exception as er:  # pylint: disable=broad-except
+            if engine == engines[-1]:
+                raise
+            layout["notes"].append(f"Leitor {engine} falhou ({er}); lido com o próximo.")
+    raise ImportError("No xlsx engine is installed")
+
+
+def read_csv_file(file: Any, layout: Preflight, names: list[str]) -> DataFrame:
+    """Read a CSV at once with the C engine of pandas, numbers in the Brazilian format.
+
+    Args:
+        file (Any): The seekable CSV file.
+        layout (Preflight): The delimiter, encoding, header row and columns to read.
+        names (list[str]): The column names, in the order of 'usecols'.
+
+    Returns:
+        DataFrame: The columns of the file, named and ordered as 'names'.
+    """
+    frame = read_csv(file, layout)
+    return frame.rename(columns=dict(zip(layout["usecols"], names)))[names]
+
+
+# Readers of a whole file by format, used when it fits the memory budget
+READERS: dict[str, Callable[[Any, Preflight, list[str]], DataFrame]] = {
+    "xlsx": read_xlsx,
+    "csv": read_csv_file,
+}
+
+
+def float_column(column: Series) -> Series:
+    """Convert a column to float, skipping float_converter when the reader already parsed the numbers.
+
+    Args:
+        column (Series): The column.
+
+    Returns:
+        Series: The float column.
+    """
+    if is_numeric_dtype(column.dtype) and not is_bool_dtype(column.dtype):
+        return column.astype("float64")
+    return column.apply(float_converter)
+
+
+def integer_column(column: Series) -> Series:
+    """Convert a column to integer, skipping integer_converter when it already holds integers.
+
+    Only numpy signed integers are taken as they are: integer_converter turns unsigned and nullable
+    integers into int64, and raises on a missing one.
+
+    Args:
+        column (Series): The column.
+
+    Returns:
+        Series: The integer column.
+    """
+    if isinstance(column.dtype, np.dtype) and is_signed_integer_dtype(column.dtype):
+        return column.astype(np.int64, copy=False)
+    return column.apply(integer_converter)
+
+
+def column_view(column: Series) -> np.ndarray:
+    """Get the values of a column as a numpy array, without copying them whenever the dtype allows it.
+
+    Nullable integer and float columns without missing values are viewed as their numpy dtype.
+
+    Args:
+        column (Series): The column.
+
+    Returns:
+        np.ndarray: The values.
+    """
+    numpy_dtype = getattr(column.dtype, "numpy_dtype", None)
+    if isinstance(column.dtype, np.dtype):
+        return column.to_numpy(copy=False)
+    if numpy_dtype is not None and not column.hasnans:
+        return column.to_numpy(dtype=numpy_dtype, copy=False)
+    return column.to_numpy()
+
+
+def column_views(frame: DataFrame) -> dict[Hashable, np.ndarray]:
+    """Get the columns of a frame as numpy arrays, a lighter stand-in for to_dict(orient="list").
+
+    Args:
+        frame (DataFrame): The frame.
+
+    Returns:
+        dict[Hashable, np.ndarray]: The values of each column, by name.
+    """
+    return {name: column_view(frame[name]) for name in frame.columns}
+
+
+def views_size(views: dict[Hashable, Any], frame: DataFrame | None) -> int:
+    """Get the memory held by column arrays beyond the frame they were taken from.
+
+    Args:
+        views (dict[Hashable, Any]): The column arrays, by name.
+        frame (DataFrame | None): The frame.
+
+    Returns:
+        int: The bytes of the arrays that do not share memory with their column.
+    """
+    return sum(
+        deep_size(values)
+        for name, values in views.items()
+        if frame is None or name not in frame or not np.may_share_memory(values, column_view(frame[name]))
+    )
 
 
 class Table(ABC):
     """Abstract base class for tables."""
 
-    def __init__(self, names: list[str], table: Component, info: Component) -> None:
+    def __init__(
+        self, names: list[str], table: Component, info: Component, rejects: Component | None = None
+    ) -> None:
         """Initialize Table instance.
 
         Args:
-            names (list[str]): Column names for the table.
+            names (list[str]): Column names for the table, the key column first.
             table (Component): Table component.
             info (Component): Information component.
+            rejects (Component | None, optional): Component for the rows with invalid keys. Defaults to None.
         """
         self._df: DataFrame | None = None
         self._file = None
+        self._preflight: Preflight | None = None
+        self._plan: Plan | None = None
+        self._memory_budget = DEFAULT_MEMORY_BUDGET
         self._names = names
         self._as_dict = {}
         self._table = table
         self._info = info
         self._describe = {}
         self._plot = None
+        self._rejects: DataFrame | None = None
+        self._rejects_component = rejects
 
     @property
     def df(self) -> DataFrame | None:
@@ -63,15 +224,139 @@ class Table(ABC):
             file (Any): File to be associated with the table.
         Returns: None
         """
+        self.reset()
+        self._file = file
+        self.read()
+        self.pipeline()
+        self.release_file()
+
+    async def load(
+        self, file: Any, token: CancelToken, report: Callable[[Progress], Any] | None = None
+    ) -> None:
+        """Set the associated file, as the file setter does, running the read and the pipeline as a task that
+        yields between chunks and stages, reports its progress and stops when the token is cancelled.
+
+        Args:
+            file (Any): File to be associated with the table.
+            token (CancelToken): The token of the run.
+            report (Callable[[Progress], Any] | None, optional): Receives the progress before each chunk and
+                stage. Defaults to None.
+
+        Raises:
+            Cancelled: If the token is cancelled. The table is left to the run that replaced this one.
+        Returns: None
+        """
+        self.reset()
         self._file = file
         try:
-            self._df = pd.read_excel(
-                file, names=self._names, engine="openpyxl", usecols=[0, 1, 2]
-            )
+            with profiler.stage(f"{type(self).__name__}.read"):
+                await drive(self.read_steps(), token, report)
+        except Cancelled:
+            raise
         except Exception as er:
+            token.check()  # a failure after the file was replaced is not this run's to report
             alert(f"Erro: {er}")
-            window.location.reload()
-        self.pipeline()
+            self.reset()
+        await drive(self.pipeline_steps(), token, report)
+        self.release_file()
+
+    @property
+    def preflight(self) -> Preflight | None:
+        """Get the layout found by the pre-flight validation of the file.
+
+        Returns:
+            Preflight | None: The sheet, header row, columns and estimated rows, or None before reading.
+        """
+        return self._preflight
+
+    @property
+    def plan(self) -> Plan | None:
+        """Get the ingestion strategy chosen for the file.
+
+        Returns:
+            Plan | None: The strategy and the reason for it, or None before reading.
+        """
+        return self._plan
+
+    @property
+    def memory_budget(self) -> int:
+        """Get the memory budget of the ingestion.
+
+        Returns:
+            int: The budget, in bytes.
+        """
+        return self._memory_budget
+
+    @memory_budget.setter
+    def memory_budget(self, budget: int) -> None:
+        """Set the memory budget of the ingestion.
+
+        Args:
+            budget (int): The budget, in bytes.
+        Returns: None
+        """
+        if budget <= 0:
+            raise ValueError(f"Memory budget must be positive, got {budget}")
+        self._memory_budget = budget
+
+    def file_size(self) -> int:
+        """Get the size of the associated file, restoring its position to the start.
+
+        Returns:
+            int: The size, in bytes.
+        """
+        size = getattr(self._file, "size", None)
+        if size is None:
+            size = self._file.seek(0, io.SEEK_END)
+            self._file.seek(0)
+        return int(size)
+
+    @profiled(label=lambda self: self._plan["strategy"] if self._plan else "")
+    def read(self) -> None:
+        """Validate the associated file and read it into the DataFrame, with the strategy that fits the
+        memory budget. Returns None"""
+        try:
+            drain(self.read_steps())
+        except Exception as er:
+            alert(f"Erro: {er}")
+            self.reset()
+
+    def read_steps(self) -> Steps[None]:
+        """Validate the associated file and read it into the DataFrame, yielding the progress after each chunk
+        of the streaming strategies.
+
+        Yields:
+            Steps[None]: The rows read so far, out of the rows estimated by the pre-flight validation.
+        """
+        file_format = detect_format(self._file, getattr(self._file, "name", ""))
+        self._preflight = PREFLIGHTS[file_format](self._file, self._names)
+        self._plan = plan_ingestion(
+            self.file_size(), self._preflight["rows"], len(self._names), self._memory_budget
+        )
+        if self._plan["strategy"] == "streaming":
+            reader = iter_streaming(self._file, self._preflight, self._names)
+        elif self._plan["strategy"] == "spill":
+            reader = iter_spill(self._file, self._preflight, self._names)
+        else:
+            self._df = READERS[file_format](self._file, self._preflight, self._names)
+            return
+        try:
+            while True:
+                try:
+                    rows = next(reader)
+                except StopIteration as stop:
+                    self._df = stop.value
+                    return
+                yield Progress(
+                    label=type(self).__name__,
+                    stage="read",
+                    step=0,
+                    steps=len(self.stages()),
+                    rows=rows,
+                    total=self._preflight["rows"],
+                )
+        finally:
+            reader.close()
 
     @property
     def table(self) -> Component:
@@ -109,9 +394,93 @@ class Table(ABC):
         """
         return self._as_dict
 
+    @property
+    def rejects(self) -> DataFrame | None:
+        """Get the rows whose key is not a valid CNPJ or CPF, with the reason (MOTIVO).
+
+        Returns:
+            DataFrame | None: The rejected rows.
+        """
+        return self._rejects
+
+    def components(self) -> list[Component]:
+        """Get the components showing the table.
+
+        Returns:
+            list[Component]: The table, the information and, when given, the rejects components.
+        """
+        components = [self._table, self._info]
+        if self._rejects_component is not None:
+            components.append(self._rejects_component)
+        return components
+
+    def restore(
+        self, df: DataFrame, describe: dict[Hashable, Any], rejects: DataFrame | None = None
+    ) -> None:
+        """Replace the table with an already sanitized DataFrame, its description and its rejected rows, e.g.
+        from a session snapshot, and show it. Returns None"""
+        self.reset()
+        self._df = df
+        self._describe = describe
+        self._rejects = rejects
+        self.set_dict()
+        self.set_view()
+
+    def release_file(self) -> None:
+        """Close and drop the associated file, whose contents are no longer needed once parsed. Returns None"""
+        if hasattr(self._file, "close"):
+            self._file.close()
+        self._file = None
+
+    def memory_report(self) -> dict[str, int]:
+        """Get the memory held by the file, the data and the views of the table.
+
+        Returns:
+            dict[str, int]: The bytes held by each attribute.
+        """
+        return {
+            "file": deep_size(self._file),
+            "df": deep_size(self._df),
+            "as_dict": views_size(self._as_dict, self._df),
+            "describe": deep_size(self._describe),
+            "rejects": deep_size(self._rejects),
+        }
+
+    def reset(self) -> None:
+        """Drop the file, the data and the views, unsubscribing the components. Returns None"""
+        self.release_file()
+        self._preflight = None
+        self._plan = None
+        self._df = None
+        self._as_dict = {}
+        self._describe = {}
+        self._plot = None
+        self._rejects = None
+        for component in self.components():
+            pub_sub.unsubscribe(component.name)
+            component.unset_var()
+
     @abstractmethod
+    def stages(self) -> list[Callable[[], None]]:
+        """Abstract method listing the stages of the pipeline for processing the table, in order.
+
+        Returns:
+            list[Callable[[], None]]: The stages.
+        """
+
     def pipeline(self) -> None:
-        """Abstract method representing the pipeline for processing the table. Returns None"""
+        """Execute the pipeline for processing the table. Returns None"""
+        drain(self.pipeline_steps())
+
+    def pipeline_steps(self) -> Steps[None]:
+        """Execute the pipeline for processing the table, yielding the progress before each stage.
+
+        Yields:
+            Steps[None]: The stage about to run and the rows of the table.
+        """
+        return stage_steps(
+            type(self).__name__, self.stages(), lambda: 0 if self._df is None else int(self._df.shape[0])
+        )
 
     @abstractmethod
     def sanitize_columns(self) -> None:
@@ -121,11 +490,56 @@ class Table(ABC):
     def set_view(self) -> None:
         """Abstract method for setting the table view. Returns None"""
 
+    def valid_keys(self, keys: np.ndarray) -> np.ndarray:
+        """Check the keys of the table.
+
+        Args:
+            keys (np.ndarray): Distinct keys.
+
+        Returns:
+            np.ndarray: Whether each key is a valid CNPJ or CPF.
+        """
+        return key_valid(keys)
+
+    @profiled
+    def validate_keys(self) -> None:
+        """Move the rows whose key is not valid to the rejects, checking each distinct key once.
+        Returns None"""
+        if isinstance(self._df, DataFrame):
+            codes, keys = pd.factorize(self._df[self._names[0]].to_numpy(dtype=np.int64))
+            valid = self.valid_keys(keys)[codes]
+            self._rejects = self._df[~valid]
+            self._rejects = self._rejects.assign(MOTIVO=reject_reasons(self._rejects[self._names[0]].to_numpy()))
+            self._rejects.index = np.arange(1, self._rejects.shape[0] + 1)
+            if not valid.all():
+                self._df = self._df[valid]
+                self._df.index = np.arange(1, self._df.shape[0] + 1)
+
+    def set_rejects_view(self) -> None:
+        """Set the rejects view, subscribing it when there are rejected rows. Returns None"""
+        if self._rejects_component is None or not isinstance(self._rejects, DataFrame):
+            return
+        if self._rejects.empty:
+            pub_sub.unsubscribe(self._rejects_component.name)
+            self._rejects_component.unset_var()
+            return
+        as_dict = column_views(self._rejects)
+        self._rejects_component.variables = Variables(
+            table=as_dict,
+            len=self._rejects.shape[0],
+            columns=list(as_dict.keys()),
+            ready=True,
+        )
+        if not pub_sub.is_subscribed(self._rejects_component.name):
+            pub_sub.subscribe(self._rejects_component)
+
+    @profiled
     def set_dict(self) -> None:
-        """Convert the table to a dictionary. Returns None"""
+        """Convert the table to a dictionary of column arrays, sharing the DataFrame memory. Returns None"""
         if isinstance(self._df, DataFrame):
-            self._as_dict = self._df.to_dict(orient="list")
+            self._as_dict = column_views(self._df)
 
+    @profiled
     def set_describe(self) -> None:
         """Generate descriptive statistics of the table. Returns None"""
         if isinstance(self._df, DataFrame):
@@ -139,3 +553,10 @@ class Table(ABC):
             self._describe["max"] = format_brl_currency(round(self._describe["max"], 2))
             self._describe["min"] = format_brl_currency(round(self._describe["min"], 2))
             self._describe["count"] = int(self._describe["count"])
+            self._describe["rejects"] = 0 if self._rejects is None else int(self._rejects.shape[0])
+            # the corrections made by the pre-flight, shown so the user knows how the file was read
+            self._describe["notes"] = list(self._preflight["notes"]) if self._preflight else []
+            if self._plan is not None and self._preflight is not None:
+                self._describe["reading"] = (
+                    f"{self._preflight['format'].upper()} {self._plan['strategy']}: {self._plan['reason']}."
+                )
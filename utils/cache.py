@@ -0,0 +1,168 @@
+"""
+This module contains a bounded, instrumented memoization layer for the converters.
+
+Author: Diógenes Dornelles Costa
+Creation Date: May 15, 2024
+Version: 1.0
+"""
+
+from functools import lru_cache, update_wrapper
+from typing import Any, Callable, TypedDict
+
+
+class CacheStats(TypedDict):
+    """Counters exposed by a memoized function.
+
+    Args:
+        TypedDict (_type_): Dictionary with hits, misses, evictions, bypasses, size and maxsize.
+    """
+    hits: int
+    misses: int
+    evictions: int
+    bypasses: int
+    size: int
+    maxsize: int | None
+
+
+class MemoizedFunction:
+    """A callable that memoizes a function in a bounded LRU cache and counts its activity."""
+
+    def __init__(
+        self,
+        func: Callable[..., Any],
+        maxsize: int | None = 128,
+        bypass: Callable[..., bool] | None = None,
+        typed: bool = False,
+    ) -> None:
+        """Initializes a MemoizedFunction instance.
+
+        Args:
+            func (Callable[..., Any]): The function to memoize.
+            maxsize (int | None, optional): Maximum number of cached entries. Defaults to 128.
+            bypass (Callable[..., bool] | None, optional): Predicate that receives the call arguments and
+                returns True when the call should skip the cache (high-cardinality inputs). Defaults to None.
+            typed (bool, optional): Whether arguments of different types are cached separately. Defaults to False.
+        """
+        self._func = func
+        self._bypass = bypass
+        self._typed = typed
+        self._bypasses = 0
+        self._cached = lru_cache(maxsize=maxsize, typed=typed)(func)
+        update_wrapper(self, func)
+
+    def __call__(self, *args: Any) -> Any:
+        """Calls the memoized function, skipping the cache when the bypass predicate matches."""
+        if self._bypass is not None and self._bypass(*args):
+            self._bypasses += 1
+            return self._func(*args)
+        return self._cached(*args)
+
+    @property
+    def maxsize(self) -> int | None:
+        """Gets the maximum number of cached entries.
+
+        Returns:
+            int | None: The maximum size, or None if unbounded.
+        """
+        return self._cached.cache_info().maxsize
+
+    def resize(self, maxsize: int | None) -> None:
+        """Replaces the cache with a new one of the given size. Cached entries and counters are dropped.
+
+        Args:
+            maxsize (int | None): The new maximum number of cached entries.
+        """
+        self._cached = lru_cache(maxsize=maxsize, typed=self._typed)(self._func)
+        self._bypasses = 0
+
+    def cache_clear(self) -> None:
+        """Clears cached entries and resets the counters."""
+        self._cached.cache_clear()
+        self._bypasses = 0
+
+    def cache_stats(self) -> CacheStats:
+        """Gets the cache counters.
+
+        Every miss inserts one entry and entries only leave the cache by eviction (or a clear, which
+        also resets the counters), so evictions are the misses that are no longer cached.
+
+        Returns:
+            CacheStats: The hit, miss, eviction and bypass counters, with the current and maximum size.
+        """
+        info = self._cached.cache_info()
+        return CacheStats(
+            hits=info.hits,
+            misses=info.misses,
+            evictions=max(0, info.misses - info.currsize),
+            bypasses=self._bypasses,
+            size=info.currsize,
+            maxsize=info.maxsize,
+        )
+
+
+_registry: dict[str, MemoizedFunction] = {}
+
+
+def bounded_cache(
+    maxsize: int | None = 128,
+    bypass: Callable[..., bool] | None = None,
+    typed: bool = False,
+) -> Callable[[Callable[..., Any]], MemoizedFunction]:
+    """Decorator that memoizes a function in a bounded, instrumented cache and registers it by name.
+
+    Args:
+        maxsize (int | None, optional): Maximum number of cached entries. Defaults to 128.
+        bypass (Callable[..., bool] | None, optional): Predicate selecting calls that skip the cache. Defaults to None.
+        typed (bool, optional): Whether arguments of different types are cached separately. Defaults to False.
+
+    Returns:
+        Callable[[Callable[..., Any]], MemoizedFunction]: The decorator.
+    """
+    def decorator(func: Callable[..., Any]) -> MemoizedFunction:
+        memoized = MemoizedFunction(func, maxsize=maxsize, bypass=bypass, typed=typed)
+        _registry[func.__name__] = memoized
+        return memoized
+
+    return decorator
+
+
+def configure_cache(name: str, maxsize: int | None) -> None:
+    """Changes the size of a registered cache.
+
+    Args:
+        name (str): The name of the memoized function.
+        maxsize (int | None): The new maximum number of cached entries.
+
+    Raises:
+        ValueError: If no cache is registered with that name.
+    """
+    if name not in _registry:
+        raise ValueError(f"Cache '{name}' not found.")
+    _registry[name].resize(maxsize)
+
+
+def cache_stats() -> dict[str, CacheStats]:
+    """Gets the counters of every registered cache.
+
+    Returns:
+        dict[str, CacheStats]: The counters keyed by function name.
+    """
+    return {name: memoized.cache_stats() for name, memoized in _registry.items()}
+
+
+def clear_caches() -> None:
+    """Clears every registered cache."""
+    for memoized in _registry.values():
+        memoized.cache_clear()
+
+
+def is_number(value: Any) -> bool:
+    """Bypass predicate for numeric inputs, which are cheap to convert and rarely repeat.
+
+    Args:
+        value (Any): The converter input.
+
+    Returns:
+        bool: True if the value is an int or a float.
+    """
+    return isinstance(value, (int, float))
@@ -0,0 +1,278 @@
+"""
+This module contains a compact columnar file format for DataFrames.
+
+Layout: an 8-byte magic, the format version (uint16) and the header size (uint32), a JSON header, then
+one zlib-compressed buffer per column (two for nullable columns: values and mask). The header holds the
+offset and size of every buffer, so a reader can decode only the frames and columns it needs.
+
+Author: Diógenes Dornelles Costa
+Creation Date: May 15, 2024
+Version: 1.0
+"""
+
+import json
+import struct
+import zlib
+from typing import Any, Iterable, TypedDict
+
+import numpy as np  # type: ignore
+import pandas as pd
+from pandas import DataFrame
+
+MAGIC = b"SIEFCOL\x00"
+VERSION = 1
+COMPRESSION_LEVEL = 6
+
+_PREAMBLE = struct.Struct("<8sHI")
+
+
+class BufferSpec(TypedDict):
+    """The position of a compressed buffer in the file.
+
+    Args:
+        TypedDict (_type_): Dictionary with offset and size, in bytes from the start of the data section.
+    """
+    offset: int
+    size: int
+
+
+class ColumnSpec(TypedDict, total=False):
+    """How a column is stored.
+
+    Args:
+        TypedDict (_type_): Dictionary with the column name, kind ('numpy', 'masked', 'strings', 'objects'
+        or 'range'), dtype, buffers, and start/stop/step for a RangeIndex.
+        total (bool, optional): Only 'range' columns have start, stop and step. Defaults to False.
+    """
+    name: Any
+    kind: str
+    dtype: str
+    buffers: list[BufferSpec]
+    start: int
+    stop: int
+    step: int
+
+
+class FrameSpec(TypedDict):
+    """How a frame is stored.
+
+    Args:
+        TypedDict (_type_): Dictionary with the rows, the index and the columns of the frame.
+    """
+    rows: int
+    index: ColumnSpec
+    columns: list[ColumnSpec]
+
+
+class _Writer:
+    """Accumulates the compressed buffers of the data section."""
+
+    def __init__(self) -> None:
+        """Initializes an empty _Writer instance."""
+        self.chunks: list[bytes] = []
+        self.size = 0
+
+    def add(self, data: Any) -> BufferSpec:
+        """Compresses a buffer and appends it to the data section.
+
+        Args:
+            data (Any): Any object supporting the buffer protocol.
+
+        Returns:
+            BufferSpec: The position of the compressed buffer.
+        """
+        compressed = zlib.compress(memoryview(data), COMPRESSION_LEVEL)
+        spec = BufferSpec(offset=self.size, size=len(compressed))
+        self.chunks.append(compressed)
+        self.size += len(compressed)
+        return spec
+
+
+def _encode_column(name: Any, column: Any, writer: _Writer) -> ColumnSpec:
+    """Stores a column or an index.
+
+    Args:
+        name (Any): The column name.
+        column (Any): The Series or Index.
+        writer (_Writer): The data section.
+
+    Returns:
+        ColumnSpec: How the column is stored.
+    """
+    if isinstance(column, pd.RangeIndex):
+        return ColumnSpec(name=name, kind="range", start=column.start, stop=column.stop, step=column.step)
+    dtype = column.dtype
+    if isinstance(dtype, np.dtype) and dtype != object:
+        values = np.ascontiguousarray(column.to_numpy())
+        return ColumnSpec(name=name, kind="numpy", dtype=dtype.str, buffers=[writer.add(values)])
+    numpy_dtype = getattr(dtype, "numpy_dtype", None)
+    if numpy_dtype is not None:
+        mask = np.ascontiguousarray(column.isna().to_numpy(dtype=bool))
+        values = np.ascontiguousarray(column.to_numpy(dtype=numpy_dtype, na_value=numpy_dtype.type(0)))
+        return ColumnSpec(
+            name=name,
+            kind="masked",
+            dtype=str(dtype),
+            buffers=[writer.add(values), writer.add(mask)],
+        )
+    values = column.to_numpy(dtype=object)
+    if all(type(value) is str for value in values):  # pylint: disable=unidiomatic-typecheck
+        encoded = [value.encode("utf-8") for value in values]
+        offsets = np.cumsum([0] + [len(value) for value in encoded], dtype=np.int64)
+        return ColumnSpec(
+            name=name,
+            kind="strings",
+            dtype=str(dtype),
+            buffers=[writer.add(b"".join(encoded)), writer.add(offsets)],
+        )
+    payload = json.dumps([value.item() if isinstance(value, np.generic) else value for value in values])
+    return ColumnSpec(name=name, kind="objects", dtype=str(dtype), buffers=[writer.add(payload.encode("utf-8"))])
+
+
+def dumps(frames: dict[str, DataFrame], meta: dict[str, Any] | None = None) -> bytes:
+    """Serializes frames and JSON metadata to the columnar format.
+
+    Args:
+        frames (dict[str, DataFrame]): The frames, by name.
+        meta (dict[str, Any] | None, optional): Metadata serializable to JSON, numpy scalars included.
+            Defaults to None.
+
+    Returns:
+        bytes: The file contents.
+    """
+    writer = _Writer()
+    specs: dict[str, FrameSpec] = {}
+    for frame_name, frame in frames.items():
+        specs[frame_name] = FrameSpec(
+            rows=int(frame.shape[0]),
+            index=_encode_column(None, frame.index, writer),
+            columns=[_encode_column(name, frame[name], writer) for name in frame.columns],
+        )
+    header = json.dumps({"frames": specs, "meta": meta or {}}, default=_json_default).encode("utf-8")
+    return b"".join([_PREAMBLE.pack(MAGIC, VERSION, len(header)), header, *writer.chunks])
+
+
+def _json_default(value: Any) -> Any:
+    """Converts numpy scalars and arrays for json.dumps."""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class ColumnarFile:
+    """A columnar file, whose frames are decoded on demand."""
+
+    def __init__(self, data: Any) -> None:
+        """Initializes a ColumnarFile instance, reading only its header.
+
+        Args:
+            data (Any): The file contents, as any object supporting the buffer protocol, or a binary file
+                open for reading, from which only the header and the buffers decoded are read.
+
+        Raises:
+            ValueError: If the data is not a columnar file or has an unsupported version.
+        """
+        if hasattr(data, "read") and hasattr(data, "seek"):
+            self._file, self._data = data, None
+        else:
+            self._file, self._data = None, memoryview(data).cast("B")
+        preamble = self._slice(0, _PREAMBLE.size)
+        if len(preamble) < _PREAMBLE.size:
+            raise ValueError("Arquivo de sessão inválido.")
+        magic, version, header_size = _PREAMBLE.unpack_from(preamble)
+        if magic != MAGIC:
+            raise ValueError("Arquivo de sessão inválido.")
+        if version != VERSION:
+            raise ValueError(f"Versão de arquivo de sessão não suportada: {version}.")
+        try:
+            header = json.loads(bytes(self._slice(_PREAMBLE.size, header_size)))
+            self._frames: dict[str, FrameSpec] = dict(header["frames"])
+            self.meta: dict[str, Any] = dict(header["meta"])
+        except (ValueError, KeyError, TypeError) as error:  # a truncated or corrupt header
+            raise ValueError("Arquivo de sessão inválido.") from error
+        self._start = _PREAMBLE.size + header_size
+
+    def _slice(self, start: int, size: int) -> Any:
+        """Gets size bytes from start, from the memory or the file."""
+        if self._file is None:
+            return self._data[start : start + size]
+        self._file.seek(start)
+        return self._file.read(size)
+
+    @property
+    def frames(self) -> list[str]:
+        """Gets the names of the stored frames.
+
+        Returns:
+            list[str]: The frame names.
+        """
+        return list(self._frames)
+
+    def _buffer(self, spec: BufferSpec) -> bytearray:
+        """Decompresses a buffer into writable memory."""
+        try:
+            return bytearray(zlib.decompress(self._slice(self._start + spec["offset"], spec["size"])))
+        except zlib.error as error:
+            raise ValueError("Arquivo de sessão inválido.") from error
+
+    def _decode_column(self, spec: ColumnSpec, rows: int) -> Any:
+        """Rebuilds a column or index from its spec."""
+        kind = spec["kind"]
+        if kind == "range":
+            return pd.RangeIndex(spec["start"], spec["stop"], spec["step"])
+        if kind == "numpy":
+            return np.frombuffer(self._buffer(spec["buffers"][0]), dtype=np.dtype(spec["dtype"]))
+        if kind == "masked":
+            dtype = pd.api.types.pandas_dtype(spec["dtype"])
+            values = np.frombuffer(self._buffer(spec["buffers"][0]), dtype=dtype.numpy_dtype)
+            mask = np.frombuffer(self._buffer(spec["buffers"][1]), dtype=bool)
+            return dtype.construct_array_type()(values, mask)
+        if kind == "strings":
+            text = bytes(self._buffer(spec["buffers"][0]))
+            offsets = np.frombuffer(self._buffer(spec["buffers"][1]), dtype=np.int64)
+            values = np.empty(rows, dtype=object)
+            values[:] = [text[start:end].decode("utf-8") for start, end in zip(offsets[:-1], offsets[1:])]
+            return pd.array(values, dtype=spec["dtype"]) if spec["dtype"] != "object" else values
+        values = np.empty(rows, dtype=object)
+        values[:] = json.loads(bytes(self._buffer(spec["buffers"][0])))
+        return values
+
+    def read(self, name: str, columns: Iterable[Any] | None = None) -> DataFrame:
+        """Decodes a frame.
+
+        Args:
+            name (str): The frame name.
+            columns (Iterable[Any] | None, optional): The columns to decode, or None for all.
+                Defaults to None.
+
+        Raises:
+            KeyError: If there is no such frame.
+
+        Returns:
+            DataFrame: The frame.
+        """
+        spec = self._frames[name]
+        wanted = None if columns is None else list(columns)
+        data = {
+            column["name"]: self._decode_column(column, spec["rows"])
+            for column in spec["columns"]
+            if wanted is None or column["name"] in wanted
+        }
+        index = self._decode_column(spec["index"], spec["rows"])
+        frame = DataFrame(data, index=index, copy=False)
+        return frame if wanted is None else frame[wanted]
+
+
+def loads(data: Any) -> tuple[dict[str, DataFrame], dict[str, Any]]:
+    """Deserializes every frame and the metadata of a columnar file.
+
+    Args:
+        data (Any): The file contents.
+
+    Returns:
+        tuple[dict[str, DataFrame], dict[str, Any]]: The frames, by name, and the metadata.
+    """
+    file = ColumnarFile(data)
+    return {name: file.read(name) for name in file.frames}, file.meta
@@ -7,11 +7,17 @@ Version: 1.0
 """
 
 import re
-from functools import lru_cache
 from typing import Any
 
+from utils.cache import bounded_cache, is_number
 
-@lru_cache
+FLOAT_CACHE_SIZE = 4096
+
+# First run of digits, dots and commas, e.g. "1.234,56" in "R$ 1.234,56"
+_NUMBER = re.compile(r"[\d.,]+")
+
+
+@bounded_cache(maxsize=FLOAT_CACHE_SIZE, bypass=is_number)
 def float_converter(value: Any) -> float:
     """Converts a string containing a float value into a float.
 
@@ -23,24 +29,21 @@ def float_converter(value: Any) -> float:
     if isinstance(value, (int, float)):
         return float(value)
     if isinstance(value, str):
-        _match = re.search(r"(?P<with_comma>[\d.,]+)|(?P<without_comma>[\d.]+)", value)
+        if value.replace(".", "", 1).isdecimal():
+            # Fast path: digits with at most one dot, e.g. "1234.56", are read by float() as is
+            return float(value)
+        _match = _NUMBER.search(value)
         if _match:
-            cleaned_value = _match.group("with_comma") or _match.group("without_comma")
+            cleaned_value = _match.group()
             if "," in cleaned_value:
-                cleaned_value = cleaned_value.replace(".", "")
-                cleaned_value = cleaned_value.replace(
-                    ",", ".", cleaned_value.count(".") - 1
-                )
-            else:
-                cleaned_value = cleaned_value.replace(
-                    ".", "", cleaned_value.count(".") - 1
-                )
+                # Brazilian format: dots are thousands separators and the comma is the decimal one
+                cleaned_value = cleaned_value.replace(".", "").replace(",", ".")
+            elif cleaned_value.count(".") > 1:
+                integer_part, _, decimal_part = cleaned_value.rpartition(".")
+                cleaned_value = f"{integer_part.replace('.', '')}.{decimal_part}"
             try:
                 return float(cleaned_value)
             except ValueError as verror:
                 print(verror)
                 return 0.0
-            except Exception as error:
-                print(error)
-                return 0.0
     return 0.0
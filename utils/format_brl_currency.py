@@ -7,12 +7,16 @@ Version: 1.0
 """
 
 from decimal import Decimal
-from functools import lru_cache
 
 from babel.numbers import format_currency  # type: ignore
 
+from utils.cache import bounded_cache
 
-@lru_cache(maxsize=None)
+CURRENCY_CACHE_SIZE = 256
+
+
+# 0.0 and -0.0 are equal keys of the cache but format differently, so zeros are formatted every time
+@bounded_cache(maxsize=CURRENCY_CACHE_SIZE, bypass=lambda value: value == 0, typed=True)
 def format_brl_currency(value: float) -> str:
     """Format a numeric value as Brazilian Real (BRL) currency.
 
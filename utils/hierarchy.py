@@ -0,0 +1,142 @@
+"""
+This module contains a precomputed aggregate hierarchy over CNPJ keys: raiz, CNPJ and, optionally, CNO.
+
+The rows are sorted once by their keys. The finest level sums the rows and each coarser level sums the level
+below it, and every entry keeps the offsets of its children, so drilling down is slicing arrays.
+
+Author: Diógenes Dornelles Costa
+Creation Date: May 15, 2024
+Version: 1.0
+"""
+
+from typing import TypedDict
+
+import numpy as np  # type: ignore
+
+RAIZ_DIVISOR = 10**6  # the raiz is the first 8 of the 14 CNPJ digits
+
+
+class Level(TypedDict):
+    """A level of the hierarchy.
+
+    Args:
+        TypedDict (_type_): Dictionary with the level name, the key of each entry, the offsets of the children
+        of each entry (entry i has children offsets[i]:offsets[i + 1] in the level below, or in the row order
+        for the finest level), the rows of each entry, and the sum and the count of nonzero values of each
+        value column.
+    """
+    name: str
+    key: np.ndarray
+    offsets: np.ndarray
+    rows: np.ndarray
+    sums: dict[str, np.ndarray]
+    counts: dict[str, np.ndarray]
+
+
+class Hierarchy(TypedDict):
+    """The levels, coarsest first, and the row positions sorted by key.
+
+    Args:
+        TypedDict (_type_): Dictionary with the levels and the row order.
+    """
+    levels: list[Level]
+    order: np.ndarray
+
+
+def _reduce(values: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """Sums the runs of values beginning at each start, an empty array for no starts."""
+    return np.add.reduceat(values, starts) if starts.size else values[:0]
+
+
+def build_hierarchy(cnpj: np.ndarray, values: dict[str, np.ndarray], cno: np.ndarray | None = None) -> Hierarchy:
+    """Builds the raiz, CNPJ and CNO levels of the rows.
+
+    Args:
+        cnpj (np.ndarray): The CNPJ of each row.
+        values (dict[str, np.ndarray]): The value columns to sum and count, by name.
+        cno (np.ndarray | None, optional): The CNO of each row, or None for no CNO level. Defaults to None.
+
+    Returns:
+        Hierarchy: The hierarchy.
+    """
+    cnpj = np.asarray(cnpj, dtype=np.int64)
+    if cno is None:
+        order = np.argsort(cnpj, kind="stable")
+    else:
+        order = np.lexsort((np.asarray(cno, dtype=np.int64), cnpj))
+    keys = [("raiz", cnpj[order] // RAIZ_DIVISOR), ("cnpj", cnpj[order])]
+    if cno is not None:
+        keys.append(("cno", np.asarray(cno, dtype=np.int64)[order]))
+
+    # An entry starts where its key or the key of any of its parents changes
+    changed = np.zeros(order.size, dtype=bool)
+    changed[:1] = True
+    starts = []
+    for _, key in keys:
+        changed = changed.copy()
+        changed[1:] |= key[1:] != key[:-1]
+        starts.append(np.flatnonzero(changed))
+
+    name, key = keys[-1]
+    sorted_values = {column: np.asarray(array, dtype=np.float64)[order] for column, array in values.items()}
+    finest = Level(
+        name=name,
+        key=key[starts[-1]],
+        offsets=np.append(starts[-1], order.size),
+        rows=np.diff(np.append(starts[-1], order.size)),
+        sums={column: np.round(_reduce(array, starts[-1]), 2) for column, array in sorted_values.items()},
+        counts={
+            column: _reduce((array != 0).astype(np.int64), starts[-1]) for column, array in sorted_values.items()
+        },
+    )
+    levels = [finest]
+    for depth in range(len(keys) - 2, -1, -1):
+        child = levels[0]
+        # The starts of a level are a subset of those of the level below, so they map to child positions
+        child_starts = np.searchsorted(starts[depth + 1], starts[depth])
+        name, key = keys[depth]
+        levels.insert(
+            0,
+            Level(
+                name=name,
+                key=key[starts[depth]],
+                offsets=np.append(child_starts, child["key"].size),
+                rows=_reduce(child["rows"], child_starts),
+                sums={column: np.round(_reduce(array, child_starts), 2) for column, array in child["sums"].items()},
+                counts={column: _reduce(array, child_starts) for column, array in child["counts"].items()},
+            ),
+        )
+    return Hierarchy(levels=levels, order=order)
+
+
+def children(hierarchy: Hierarchy, depth: int, index: int) -> slice:
+    """Gets the children of an entry, in the level below it (or in the row order for the finest level).
+
+    Args:
+        hierarchy (Hierarchy): The hierarchy.
+        depth (int): The level of the entry, 0 being the raiz.
+        index (int): The position of the entry in its level.
+
+    Returns:
+        slice: The children.
+    """
+    offsets = hierarchy["levels"][depth]["offsets"]
+    return slice(int(offsets[index]), int(offsets[index + 1]))
+
+
+def entry_rows(hierarchy: Hierarchy, depth: int, index: int) -> np.ndarray:
+    """Gets the row positions under an entry, following the offsets down to the row order.
+
+    Args:
+        hierarchy (Hierarchy): The hierarchy.
+        depth (int): The level of the entry, 0 being the raiz.
+        index (int): The position of the entry in its level.
+
+    Returns:
+        np.ndarray: The row positions, sorted by key.
+    """
+    span = children(hierarchy, depth, index)
+    start, stop = span.start, span.stop
+    for level in hierarchy["levels"][depth + 1 :]:
+        start, stop = int(level["offsets"][start]), int(level["offsets"][stop])
+    return hierarchy["order"][start:stop]
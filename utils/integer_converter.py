@@ -6,12 +6,29 @@ Creation Date: May 15, 2024
 Version: 1.0
 """
 
-import re
-from functools import lru_cache
 from typing import Union
 
+from utils.cache import bounded_cache, is_number
 
-@lru_cache(maxsize=128)
+INTEGER_CACHE_SIZE = 4096
+
+
+class _DigitFilter(dict):
+    """Translate table that keeps decimal digits and deletes any other character.
+
+    Entries are built on first lookup, so only the characters actually seen are stored.
+    """
+
+    def __missing__(self, key: int) -> str | None:
+        char = chr(key)
+        self[key] = char if char.isdecimal() else None
+        return self[key]
+
+
+_DIGITS = _DigitFilter()
+
+
+@bounded_cache(maxsize=INTEGER_CACHE_SIZE, bypass=is_number)
 def integer_converter(value: Union[int, float, str]) -> int:
     """Convert a value to an integer.
 
@@ -28,7 +45,9 @@ def integer_converter(value: Union[int, float, str]) -> int:
     if isinstance(value, (int, float)):
         return int(value)
     if isinstance(value, str):
-        cleaned_value = re.sub(r"\D", "", value)
+        if value.isdecimal():
+            return int(value)
+        cleaned_value = value.translate(_DIGITS)
         if cleaned_value:
             try:
                 return int(cleaned_value)
@@ -0,0 +1,86 @@
+"""
+This module contains functions for composite CNPJ + CNO keys and sorted group sums.
+
+A CNPJ has 14 digits, below 2**47, so a CNPJ and the code of a CNO in a sorted code book fit together in one
+int64 while there are fewer than 2**16 distinct CNOs. Packed keys sort as the (CNPJ, CNO) pairs they hold,
+so joins and group sums over them are plain integer operations.
+
+Author: Diógenes Dornelles Costa
+Creation Date: May 15, 2024
+Version: 1.0
+"""
+
+import numpy as np  # type: ignore
+
+CNPJ_BITS = 47
+CODE_BITS = 64 - 1 - CNPJ_BITS  # the sign bit stays clear
+
+
+def cno_codebook(*cnos: np.ndarray) -> np.ndarray:
+    """Builds the sorted code book of the CNOs of one or more columns, with 0 (no CNO) always included.
+
+    Args:
+        *cnos (np.ndarray): The CNO columns.
+
+    Returns:
+        np.ndarray: The distinct CNOs, sorted. The code of a CNO is its position.
+    """
+    return np.unique(np.concatenate([np.zeros(1, dtype=np.int64), *cnos]).astype(np.int64, copy=False))
+
+
+def pack_keys(cnpj: np.ndarray, cno: np.ndarray, codebook: np.ndarray) -> np.ndarray | None:
+    """Packs CNPJ and CNO pairs into int64 keys that sort as the pairs.
+
+    Args:
+        cnpj (np.ndarray): The CNPJs.
+        cno (np.ndarray): The CNOs, all present in the code book.
+        codebook (np.ndarray): The code book, from cno_codebook.
+
+    Raises:
+        ValueError: If a CNPJ is negative or over 14 digits.
+
+    Returns:
+        np.ndarray | None: The keys, or None when the code book has too many CNOs to pack.
+    """
+    if codebook.size > 1 << CODE_BITS:
+        return None
+    cnpj = np.asarray(cnpj, dtype=np.int64)
+    if cnpj.size and (cnpj.min() < 0 or cnpj.max() >= 1 << CNPJ_BITS):
+        raise ValueError("CNPJ out of range for a packed key")
+    codes = np.searchsorted(codebook, np.asarray(cno, dtype=np.int64))
+    return (cnpj << CODE_BITS) | codes
+
+
+def lookup(values: np.ndarray, keys: np.ndarray, targets: np.ndarray, default: np.ndarray) -> np.ndarray:
+    """Maps each value to the target of the equal key, or to its default when no key is equal.
+
+    Args:
+        values (np.ndarray): The values to map.
+        keys (np.ndarray): The keys, sorted.
+        targets (np.ndarray): The target of each key.
+        default (np.ndarray): The result of each value without an equal key.
+
+    Returns:
+        np.ndarray: The mapped values.
+    """
+    if not keys.size:
+        return default.copy()
+    positions = np.minimum(np.searchsorted(keys, values), keys.size - 1)
+    return np.where(keys[positions] == values, targets[positions], default)
+
+
+def group_sums(labels: np.ndarray, values: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Sums the values of each run of equal labels, in a single pass over sorted labels.
+
+    Args:
+        labels (np.ndarray): The group labels, sorted.
+        values (np.ndarray): The values.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, np.ndarray]: The distinct labels, the sum and the row count of each.
+    """
+    if not labels.size:
+        return labels[:0], values[:0], np.zeros(0, dtype=np.int64)
+    starts = np.flatnonzero(np.concatenate([[True], labels[1:] != labels[:-1]]))
+    counts = np.diff(np.append(starts, labels.size))
+    return labels[starts], np.add.reduceat(values, starts), counts
@@ -0,0 +1,258 @@
+"""
+This module contains a store of monthly reconciliation results, one columnar partition per period, and the
+queries across periods.
+
+Each period is a file of its own (see utils.columnar), written once when the month is reconciled, so adding a
+month never touches the others. A query opens only the partitions of its periods and decodes only the columns
+it needs.
+
+Author: Diógenes Dornelles Costa
+Creation Date: May 15, 2024
+Version: 1.0
+"""
+
+import os
+import re
+from datetime import datetime
+from typing import Any, Iterator
+
+import numpy as np  # type: ignore
+from pandas import DataFrame
+
+from utils.columnar import ColumnarFile, dumps
+from utils.keys import group_sums
+
+PERIOD_PATTERN = re.compile(r"^\d{4}-(0[1-9]|1[0-2])$")  # AAAA-MM
+PARTITION_EXTENSION = ".col"
+PARTITION_FRAME = "parse"
+KEY_COLUMN = "CHAVE"
+DIFFERENCE_COLUMN = "DIFERENÇAS"
+TOLERANCE = 0.005  # differences below half a cent are rounding
+
+
+def check_period(period: str) -> str:
+    """Checks a period name.
+
+    Args:
+        period (str): The period, as AAAA-MM.
+
+    Raises:
+        ValueError: If the period is not a valid AAAA-MM month.
+
+    Returns:
+        str: The period.
+    """
+    if not isinstance(period, str) or not PERIOD_PATTERN.match(period):
+        raise ValueError(f"Período inválido: {period!r}. Use o formato AAAA-MM.")
+    return period
+
+
+class PeriodStore:
+    """A directory of reconciliation results, one partition file per period."""
+
+    def __init__(self, directory: str) -> None:
+        """Initializes a PeriodStore instance, creating its directory if needed.
+
+        Args:
+            directory (str): The directory of the partitions.
+        """
+        self._directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def directory(self) -> str:
+        """Gets the directory of the partitions.
+
+        Returns:
+            str: The directory.
+        """
+        return self._directory
+
+    def path(self, period: str) -> str:
+        """Gets the partition file of a period.
+
+        Args:
+            period (str): The period, as AAAA-MM.
+
+        Returns:
+            str: The path of the partition.
+        """
+        return os.path.join(self._directory, f"{check_period(period)}{PARTITION_EXTENSION}")
+
+    def periods(self, start: str | None = None, end: str | None = None) -> list[str]:
+        """Lists the stored periods, in order, optionally from start to end, both included.
+
+        Args:
+            start (str | None, optional): The first period. Defaults to None, the first stored.
+            end (str | None, optional): The last period. Defaults to None, the last stored.
+
+        Returns:
+            list[str]: The periods.
+        """
+        periods = sorted(
+            name[: -len(PARTITION_EXTENSION)]
+            for name in os.listdir(self._directory)
+            if name.endswith(PARTITION_EXTENSION) and PERIOD_PATTERN.match(name[: -len(PARTITION_EXTENSION)])
+        )
+        return [
+            period
+            for period in periods
+            if (start is None or period >= check_period(start)) and (end is None or period <= check_period(end))
+        ]
+
+    def save(self, period: str, frame: DataFrame, meta: dict[str, Any] | None = None) -> None:
+        """Stores the result of a period, replacing the stored one, if any.
+
+        Args:
+            period (str): The period, as AAAA-MM.
+            frame (DataFrame): The result, with the KEY_COLUMN and DIFFERENCE_COLUMN columns.
+            meta (dict[str, Any] | None, optional): Metadata serializable to JSON. Defaults to None.
+
+        Raises:
+            ValueError: If the period is not valid or the frame lacks the key or difference columns.
+        """
+        path = self.path(period)
+        missing = {KEY_COLUMN, DIFFERENCE_COLUMN} - set(frame.columns)
+        if missing:
+            raise ValueError(f"Result without the columns {sorted(missing)}")
+        meta = {**(meta or {}), "period": period, "saved": datetime.now().isoformat(timespec="seconds")}
+        temporary = f"{path}.tmp"
+        with open(temporary, "wb") as file:
+            file.write(dumps({PARTITION_FRAME: frame}, meta))
+        os.replace(temporary, path)  # a partition is either the old one or the whole new one
+
+    def remove(self, period: str) -> None:
+        """Removes the result of a period, if stored.
+
+        Args:
+            period (str): The period, as AAAA-MM.
+        """
+        path = self.path(period)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def meta(self, period: str) -> dict[str, Any]:
+        """Reads the metadata of a period, without decoding its result.
+
+        Args:
+            period (str): The period, as AAAA-MM.
+
+        Returns:
+            dict[str, Any]: The metadata.
+        """
+        with open(self.path(period), "rb") as file:
+            return ColumnarFile(file).meta
+
+    def read(self, period: str, columns: list[str] | None = None) -> DataFrame:
+        """Reads the result of a period.
+
+        Args:
+            period (str): The period, as AAAA-MM.
+            columns (list[str] | None, optional): The columns to decode. Defaults to None, all.
+
+        Returns:
+            DataFrame: The result.
+        """
+        with open(self.path(period), "rb") as file:
+            return ColumnarFile(file).read(PARTITION_FRAME, columns)
+
+    def scan(
+        self, columns: list[str], start: str | None = None, end: str | None = None
+    ) -> Iterator[tuple[str, DataFrame]]:
+        """Reads some columns of the results of the periods from start to end, one partition at a time.
+
+        Args:
+            columns (list[str]): The columns to decode.
+            start (str | None, optional): The first period. Defaults to None, the first stored.
+            end (str | None, optional): The last period. Defaults to None, the last stored.
+
+        Yields:
+            Iterator[tuple[str, DataFrame]]: Each period and its columns.
+        """
+        for period in self.periods(start, end):
+            yield period, self.read(period, columns)
+
+
+def key_differences(frame: DataFrame) -> tuple[np.ndarray, np.ndarray]:
+    """Sums the differences of each key of a result, whose rows may repeat a key (e.g. one per CNO).
+
+    Args:
+        frame (DataFrame): The result, with the KEY_COLUMN and DIFFERENCE_COLUMN columns.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The keys, sorted, and the difference of each, rounded to cents.
+    """
+    keys = frame[KEY_COLUMN].to_numpy(dtype=np.int64, na_value=0)
+    values = frame[DIFFERENCE_COLUMN].to_numpy(dtype=np.float64, na_value=0.0)
+    order = np.argsort(keys, kind="stable")
+    labels, sums, _ = group_sums(keys[order], values[order])
+    return labels, np.round(sums, 2)
+
+
+def recurring_mismatches(
+    store: PeriodStore, min_periods: int = 3, start: str | None = None, end: str | None = None
+) -> DataFrame:
+    """Finds the keys whose Siafi and Efd values differ in at least min_periods periods.
+
+    Args:
+        store (PeriodStore): The store.
+        min_periods (int, optional): The fewest periods with a difference. Defaults to 3.
+        start (str | None, optional): The first period. Defaults to None, the first stored.
+        end (str | None, optional): The last period. Defaults to None, the last stored.
+
+    Returns:
+        DataFrame: KEY_COLUMN, the number of periods with a difference (MESES), their total difference and
+        the last of them, the keys with more periods first.
+    """
+    names = store.periods(start, end)
+    if not names:
+        return DataFrame({KEY_COLUMN: [], "MESES": [], DIFFERENCE_COLUMN: [], "ÚLTIMO": []})
+    mismatched, differences, periods = [], [], []
+    for position, period in enumerate(names):
+        labels, sums = key_differences(store.read(period, [KEY_COLUMN, DIFFERENCE_COLUMN]))
+        differs = np.abs(sums) >= TOLERANCE
+        mismatched.append(labels[differs])
+        differences.append(sums[differs])
+        periods.append(np.full(int(differs.sum()), position))
+    keys, values, positions = np.concatenate(mismatched), np.concatenate(differences), np.concatenate(periods)
+    order = np.lexsort((positions, keys))
+    labels, sums, counts = group_sums(keys[order], values[order])
+    last = positions[order][np.cumsum(counts) - 1]  # the positions are sorted within each key
+    keep = counts >= min_periods
+    result = DataFrame(
+        {
+            KEY_COLUMN: labels[keep],
+            "MESES": counts[keep],
+            DIFFERENCE_COLUMN: np.round(sums[keep], 2),
+            "ÚLTIMO": np.asarray(names, dtype=object)[last[keep]],
+        }
+    )
+    order = np.lexsort((-np.abs(result[DIFFERENCE_COLUMN].to_numpy()), -result["MESES"].to_numpy()))
+    return result.iloc[order].reset_index(drop=True)
+
+
+def cumulative_differences(store: PeriodStore, start: str | None = None, end: str | None = None) -> DataFrame:
+    """Accumulates the differences of each key across periods, e.g. year to date.
+
+    Args:
+        store (PeriodStore): The store.
+        start (str | None, optional): The first period. Defaults to None, the first stored.
+        end (str | None, optional): The last period. Defaults to None, the last stored.
+
+    Returns:
+        DataFrame: KEY_COLUMN, then one column per period with the difference accumulated up to it, the
+        keys in order.
+    """
+    sums_by_period = {
+        period: key_differences(frame) for period, frame in store.scan([KEY_COLUMN, DIFFERENCE_COLUMN], start, end)
+    }
+    if not sums_by_period:
+        return DataFrame({KEY_COLUMN: []})
+    keys = np.unique(np.concatenate([labels for labels, _ in sums_by_period.values()]))
+    matrix = np.zeros((keys.size, len(sums_by_period)))
+    for column, (labels, sums) in enumerate(sums_by_period.values()):
+        matrix[np.searchsorted(keys, labels), column] = sums
+    accumulated = np.round(np.cumsum(matrix, axis=1), 2)
+    return DataFrame(
+        {KEY_COLUMN: keys, **{period: accumulated[:, column] for column, period in enumerate(sums_by_period)}}
+    )
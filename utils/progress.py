@@ -0,0 +1,189 @@
+"""
+This module contains cooperative, cancellable execution of the sheet pipelines, with progress reports.
+
+A pipeline is written once as a generator of steps, each yielding its progress before the work that follows
+it. drain() runs the steps at once, as the synchronous API does; drive() runs them as an asyncio task that
+reports each step, yields to the event loop and stops at the first step after its token is cancelled.
+
+Author: Diógenes Dornelles Costa
+Creation Date: May 15, 2024
+Version: 1.0
+"""
+
+import asyncio
+from typing import Any, Callable, Generator, TypeVar, TypedDict
+
+T = TypeVar("T")
+
+
+class Cancelled(Exception):
+    """Raised in a run whose token was cancelled, at its next step."""
+
+
+class CancelToken:
+    """A flag shared by a run and whoever may cancel it."""
+
+    def __init__(self) -> None:
+        """Initializes a CancelToken instance, not cancelled."""
+        self._cancelled = False
+
+    @property
+    def cancelled(self) -> bool:
+        """Gets whether the run was cancelled.
+
+        Returns:
+            bool: True if cancel() was called.
+        """
+        return self._cancelled
+
+    def cancel(self) -> None:
+        """Cancels the run, which stops at its next step."""
+        self._cancelled = True
+
+    def check(self) -> None:
+        """Stops the run if it was cancelled.
+
+        Raises:
+            Cancelled: If the run was cancelled.
+        """
+        if self._cancelled:
+            raise Cancelled()
+
+
+class Progress(TypedDict):
+    """The progress of a run, reported before each step.
+
+    Args:
+        TypedDict (_type_): Dictionary with the label of the run (e.g. the sheet), the stage about to run, the
+        number of stages done and of stages, and the rows processed and expected (0 when unknown).
+    """
+    label: str
+    stage: str
+    step: int
+    steps: int
+    rows: int
+    total: int
+
+
+Steps = Generator[Progress, None, T]
+
+
+class Runs:
+    """The runs in progress by name, so that starting a run cancels the stale one of the same name."""
+
+    def __init__(self) -> None:
+        """Initializes a Runs instance, with no runs."""
+        self._tokens: dict[str, CancelToken] = {}
+
+    def start(self, name: str) -> CancelToken:
+        """Starts a run, cancelling the one of the same name in progress.
+
+        Args:
+            name (str): The name of the run.
+
+        Returns:
+            CancelToken: The token of the new run.
+        """
+        self.cancel(name)
+        token = self._tokens[name] = CancelToken()
+        return token
+
+    def finish(self, name: str, token: CancelToken) -> None:
+        """Forgets a run that ended, unless a newer run of the same name replaced it.
+
+        Args:
+            name (str): The name of the run.
+            token (CancelToken): The token of the run.
+        """
+        if self._tokens.get(name) is token:
+            del self._tokens[name]
+
+    def cancel(self, name: str) -> None:
+        """Cancels the run of a name, if any.
+
+        Args:
+            name (str): The name of the run.
+        """
+        token = self._tokens.pop(name, None)
+        if token is not None:
+            token.cancel()
+
+    def cancel_all(self) -> None:
+        """Cancels every run in progress."""
+        for name in list(self._tokens):
+            self.cancel(name)
+
+    def running(self, name: str) -> bool:
+        """Checks whether a run of a name is in progress.
+
+        Args:
+            name (str): The name of the run.
+
+        Returns:
+            bool: True if the run started and did not finish.
+        """
+        return name in self._tokens
+
+
+def stage_steps(label: str, stages: list[Callable[[], Any]], rows: Callable[[], int]) -> Steps[None]:
+    """Runs stages one by one, yielding the progress before each of them.
+
+    Args:
+        label (str): The label of the run.
+        stages (list[Callable[[], Any]]): The stages.
+        rows (Callable[[], int]): Gets the rows being processed.
+
+    Yields:
+        Steps[None]: The progress before each stage.
+    """
+    for step, stage in enumerate(stages):
+        count = rows()
+        yield Progress(
+            label=label, stage=stage.__name__, step=step, steps=len(stages), rows=count, total=count
+        )
+        stage()
+
+
+def drain(steps: Steps[T]) -> T:
+    """Runs the steps at once.
+
+    Args:
+        steps (Steps[T]): The steps.
+
+    Returns:
+        T: The value returned by the steps.
+    """
+    while True:
+        try:
+            next(steps)
+        except StopIteration as stop:
+            return stop.value
+
+
+async def drive(steps: Steps[T], token: CancelToken, report: Callable[[Progress], Any] | None = None) -> T:
+    """Runs the steps as a task, reporting and yielding to the event loop before each one.
+
+    Args:
+        steps (Steps[T]): The steps.
+        token (CancelToken): The token of the run.
+        report (Callable[[Progress], Any] | None, optional): Receives the progress before each step. Defaults
+            to None.
+
+    Raises:
+        Cancelled: If the token is cancelled, before the next step. The steps are closed.
+
+    Returns:
+        T: The value returned by the steps.
+    """
+    try:
+        while True:
+            token.check()
+            try:
+                progress = next(steps)
+            except StopIteration as stop:
+                return stop.value
+            if report is not None:
+                report(progress)
+            await asyncio.sleep(0)  # let the page paint the progress and handle events, e.g. a new upload
+    finally:
+        steps.close()
@@ -0,0 +1,152 @@
+"""
+This module contains the filter and sort queries over reconciliation results, evaluated either on a frame in
+memory (the views of the page) or as SQL on the results store of the headless runs (see headless.store), so
+both answer the same query with the same rows in the same order.
+
+Author: Diógenes Dornelles Costa
+Creation Date: May 15, 2024
+Version: 1.0
+"""
+
+from typing import Any, TypedDict
+
+import numpy as np  # type: ignore
+from pandas import DataFrame
+
+from utils.periods import check_period
+
+PERIOD_COLUMN = "PERÍODO"
+SIGN_COLUMN = "SINAL"
+DIFFERENCE_COLUMN = "DIFERENÇAS"
+ORDER_COLUMNS = ("RECOLHEDOR", "CNPJ", "CNO", "VALOR_SIAFI", "VALOR_EFD", "DIFERENÇAS")
+SIGNS = {-1: "EFD maior", 0: "Conciliado", 1: "SIAFI maior"}
+
+
+class Query(TypedDict, total=False):
+    """A filter and sort query over reconciliation results.
+
+    Args:
+        TypedDict (_type_): Dictionary with the optional CNPJ, RECOLHEDOR and period the rows must have, the
+        sign of their DIFERENÇAS (see SIGNS), the column to sort by, whether descending, and the page (limit
+        and offset) of the sorted rows.
+    """
+    cnpj: int
+    recolhedor: int
+    period: str
+    sign: int
+    order_by: str
+    descending: bool
+    limit: int
+    offset: int
+
+
+def check_query(query: Query) -> Query:
+    """Checks a query.
+
+    Args:
+        query (Query): The query.
+
+    Raises:
+        ValueError: If the period, the sign, the sort column or the page is not valid.
+
+    Returns:
+        Query: The query.
+    """
+    if "period" in query:
+        check_period(query["period"])
+    if "sign" in query and query["sign"] not in SIGNS:
+        raise ValueError(f"Sinal inválido: {query['sign']!r}. Use -1, 0 ou 1.")
+    if "order_by" in query and query["order_by"] not in ORDER_COLUMNS:
+        raise ValueError(f"Coluna de ordenação inválida: {query['order_by']!r}.")
+    if query.get("limit", 0) < 0 or query.get("offset", 0) < 0:
+        raise ValueError("Paginação inválida: limite e deslocamento não podem ser negativos.")
+    return query
+
+
+def signs(differences: np.ndarray) -> np.ndarray:
+    """Gets the sign of each difference, as stored in the SIGN_COLUMN.
+
+    Args:
+        differences (np.ndarray): The differences, NaN counting as 0.
+
+    Returns:
+        np.ndarray: -1, 0 or 1 for each difference, as int8.
+    """
+    return np.sign(np.nan_to_num(differences)).astype(np.int8)
+
+
+def query_frame(frame: DataFrame, query: Query) -> DataFrame:
+    """Evaluates a query on a result in memory. A filter on a column the frame lacks (e.g. the period of a
+    single analysis) is ignored.
+
+    Args:
+        frame (DataFrame): The result.
+        query (Query): The query.
+
+    Returns:
+        DataFrame: The matching rows, sorted and paged, with the index of the frame.
+    """
+    check_query(query)
+    mask = np.ones(frame.shape[0], dtype=bool)
+    for field, column in (("cnpj", "CNPJ"), ("recolhedor", "RECOLHEDOR"), ("period", PERIOD_COLUMN)):
+        if field in query and column in frame.columns:
+            mask &= (frame[column] == query[field]).to_numpy(dtype=bool, na_value=False)
+    if "sign" in query:
+        mask &= signs(frame[DIFFERENCE_COLUMN].to_numpy(dtype=np.float64, na_value=0.0)) == query["sign"]
+    positions = np.flatnonzero(mask)
+    if "order_by" in query and query["order_by"] in frame.columns:
+        values = frame[query["order_by"]].to_numpy(dtype=np.float64, na_value=0.0)[positions]
+        # Stable in both directions: ties keep the frame order, as the rowid tie-break of the SQL query
+        order = np.argsort(-values if query.get("descending") else values, kind="stable")
+        positions = positions[order]
+    start = query.get("offset", 0)
+    stop = start + query["limit"] if "limit" in query else None
+    return frame.iloc[positions[start:stop]]
+
+
+def quoted(name: str) -> str:
+    """Quotes an SQL identifier, e.g. a column with accents.
+
+    Args:
+        name (str): The identifier.
+
+    Returns:
+        str: The quoted identifier.
+    """
+    return '"' + name.replace('"', '""') + '"'
+
+
+def sql_query(query: Query, table: str, columns: list[str]) -> tuple[str, list[Any]]:
+    """Translates a query to SQL over a table with the result columns, the PERIOD_COLUMN and the
+    SIGN_COLUMN, whose rowid follows the order the rows were inserted in.
+
+    Args:
+        query (Query): The query.
+        table (str): The table.
+        columns (list[str]): The columns to select.
+
+    Returns:
+        tuple[str, list[Any]]: The statement and its parameters.
+    """
+    check_query(query)
+    conditions, parameters = [], []
+    for field, column in (
+        ("cnpj", "CNPJ"),
+        ("recolhedor", "RECOLHEDOR"),
+        ("period", PERIOD_COLUMN),
+        ("sign", SIGN_COLUMN),
+    ):
+        if field in query:
+            conditions.append(f"{quoted(column)} = ?")
+            parameters.append(query[field])
+    statement = f'SELECT {", ".join(quoted(column) for column in columns)} FROM {quoted(table)}'
+    if conditions:
+        statement += f" WHERE {' AND '.join(conditions)}"
+    if "order_by" in query:
+        statement += f" ORDER BY {quoted(query['order_by'])}{' DESC' if query.get('descending') else ''}, rowid"
+    else:
+        statement += " ORDER BY rowid"
+    if "limit" in query or "offset" in query:
+        statement += " LIMIT ? OFFSET ?"
+        parameters += [query.get("limit", -1), query.get("offset", 0)]
+    return statement, parameters
@@ -0,0 +1,70 @@
+"""
+This module contains the ranking of the reconciliation differences: the largest ones, found by partial
+selection instead of a full sort, and the outliers, by the robust modified z-score of Iglewicz and Hoaglin.
+
+Author: Diógenes Dornelles Costa
+Creation Date: May 15, 2024
+Version: 1.0
+"""
+
+import numpy as np  # type: ignore
+
+OUTLIER_SCORE = 3.5  # modified z-scores above this are outliers
+MAD_SCALE = 0.6745  # the 0.75 quantile of the standard normal, making the MAD comparable to a deviation
+MEAN_AD_SCALE = 0.7979  # the same for the mean absolute deviation, used when over half the values are equal
+
+
+def top_n(values: np.ndarray, n: int) -> np.ndarray:
+    """Finds the n values of largest magnitude, in O(len(values) + n log n).
+
+    Args:
+        values (np.ndarray): The values, e.g. the differences.
+        n (int): The number of values.
+
+    Returns:
+        np.ndarray: The positions of the values, the largest magnitude first.
+    """
+    magnitudes = np.abs(np.nan_to_num(np.asarray(values, dtype=np.float64)))
+    if n <= 0:
+        return np.zeros(0, dtype=np.intp)
+    if n < magnitudes.size:
+        # argpartition puts the n largest last, unordered, without sorting the rest
+        positions = np.argpartition(magnitudes, magnitudes.size - n)[magnitudes.size - n :]
+    else:
+        positions = np.arange(magnitudes.size)
+    return positions[np.argsort(-magnitudes[positions], kind="stable")]
+
+
+def robust_scores(values: np.ndarray) -> np.ndarray:
+    """Gets the modified z-score of each value, its distance to the median in median absolute deviations.
+
+    Args:
+        values (np.ndarray): The values.
+
+    Returns:
+        np.ndarray: The scores, all 0 when the values do not spread.
+    """
+    values = np.nan_to_num(np.asarray(values, dtype=np.float64))
+    if not values.size:
+        return values
+    deviations = np.abs(values - np.median(values))
+    mad = np.median(deviations)
+    if mad > 0:
+        return MAD_SCALE * deviations / mad
+    mean_ad = deviations.mean()
+    if mean_ad > 0:
+        return MEAN_AD_SCALE * deviations / mean_ad
+    return np.zeros_like(values)
+
+
+def outliers(values: np.ndarray, score: float = OUTLIER_SCORE) -> np.ndarray:
+    """Flags the values whose modified z-score exceeds a score.
+
+    Args:
+        values (np.ndarray): The values.
+        score (float, optional): The score. Defaults to OUTLIER_SCORE.
+
+    Returns:
+        np.ndarray: A mask of the outliers.
+    """
+    return robust_scores(values) > score
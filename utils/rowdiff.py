@@ -0,0 +1,124 @@
+"""
+This module contains the keyed diff of two versions of a table, to patch only the rows that changed.
+
+Rows are matched by a unique key. The diff is a few sorts and searches over the key arrays, and its result
+lists the removed, inserted and changed rows, so the work done on the page is proportional to the diff.
+
+Author: Diógenes Dornelles Costa
+Creation Date: May 15, 2024
+Version: 1.0
+"""
+
+from typing import Any, TypedDict
+
+import numpy as np  # type: ignore
+
+
+class RowDiff(TypedDict):
+    """The rows that differ between an old and a new table.
+
+    Args:
+        TypedDict (_type_): Dictionary with the old positions of the removed rows, the new positions of the
+        inserted rows, the new position of the next kept row of each inserted row (-1 for the end of the
+        table), and the new positions of the kept rows whose values changed.
+    """
+    removed: np.ndarray
+    inserted: np.ndarray
+    anchors: np.ndarray
+    changed: np.ndarray
+
+
+def row_keys(table: dict[Any, np.ndarray], columns: list[str]) -> np.ndarray:
+    """Gets the key of each row from its key columns, as a single sortable array.
+
+    Args:
+        table (dict[Any, np.ndarray]): The values of each column, by name.
+        columns (list[str]): The key columns.
+
+    Returns:
+        np.ndarray: The integer keys for a single key column, or the bytes of the key columns of each row.
+    """
+    keys = [np.asarray(table[column], dtype=np.int64) for column in columns]
+    if len(keys) == 1:
+        return keys[0]
+    stacked = np.ascontiguousarray(np.stack(keys, axis=1))
+    return stacked.view(np.dtype((np.void, stacked.shape[1] * stacked.itemsize))).ravel()
+
+
+def key_label(table: dict[Any, Any], columns: list[str], position: int) -> str:
+    """Gets the key of a row as the templates write it, its key columns joined by '-'.
+
+    Args:
+        table (dict[Any, Any]): The values of each column, by name.
+        columns (list[str]): The key columns.
+        position (int): The position of the row.
+
+    Returns:
+        str: The key.
+    """
+    return "-".join(str(table[column][position]) for column in columns)
+
+
+def _differs(old: np.ndarray, new: np.ndarray) -> np.ndarray:
+    """Compares two arrays elementwise, taking NaN as equal to NaN."""
+    differs = np.asarray(old != new, dtype=bool)
+    if old.dtype.kind == "f" and new.dtype.kind == "f":
+        differs &= ~(np.isnan(old) & np.isnan(new))
+    return differs
+
+
+def diff_rows(
+    old_keys: np.ndarray,
+    new_keys: np.ndarray,
+    old_table: dict[Any, np.ndarray],
+    new_table: dict[Any, np.ndarray],
+) -> RowDiff | None:
+    """Diffs two versions of a table by the key of their rows.
+
+    Args:
+        old_keys (np.ndarray): The key of each old row.
+        new_keys (np.ndarray): The key of each new row.
+        old_table (dict[Any, np.ndarray]): The values of each old column, by name.
+        new_table (dict[Any, np.ndarray]): The values of each new column, by name.
+
+    Returns:
+        RowDiff | None: The diff, or None if it cannot be applied as row patches: the columns differ, a key
+        repeats, or the kept rows changed their relative order.
+    """
+    if list(old_table) != list(new_table):
+        return None
+    old_order = np.argsort(old_keys, kind="stable")
+    sorted_old = old_keys[old_order]
+    if np.any(sorted_old[1:] == sorted_old[:-1]):
+        return None
+    sorted_new = np.sort(new_keys)
+    if np.any(sorted_new[1:] == sorted_new[:-1]):
+        return None
+
+    found = np.zeros(new_keys.size, dtype=bool)
+    matches = np.zeros(new_keys.size, dtype=np.int64)
+    if old_keys.size:
+        positions = np.minimum(np.searchsorted(sorted_old, new_keys), old_keys.size - 1)
+        found = sorted_old[positions] == new_keys
+        matches = old_order[positions]
+    kept_new = np.flatnonzero(found)
+    kept_old = matches[found]
+    if np.any(kept_old[1:] <= kept_old[:-1]):
+        return None
+
+    removed = np.ones(old_keys.size, dtype=bool)
+    removed[kept_old] = False
+    inserted = np.flatnonzero(~found)
+    following = np.searchsorted(kept_new, inserted)
+    anchors = np.full(inserted.size, -1, dtype=np.int64)
+    before = following < kept_new.size
+    anchors[before] = kept_new[following[before]]
+    changed = np.zeros(kept_new.size, dtype=bool)
+    for column, values in new_table.items():
+        changed |= _differs(np.asarray(old_table[column])[kept_old], np.asarray(values)[kept_new])
+    return RowDiff(
+        removed=np.flatnonzero(removed),
+        inserted=inserted,
+        anchors=anchors,
+        changed=kept_new[changed],
+    )
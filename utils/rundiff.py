@@ -0,0 +1,81 @@
+"""
+This module contains the comparison of two reconciliation runs of the same period, e.g. before and after a
+corrected Siafi or Efd workbook.
+
+Both runs are reduced to their sorted keys and the difference of each (see utils.periods.key_differences),
+then aligned by a linear merge of the two sorted key arrays, so the wide result frames are never joined.
+
+Author: Diógenes Dornelles Costa
+Creation Date: May 15, 2024
+Version: 1.0
+"""
+
+import numpy as np  # type: ignore
+from pandas import DataFrame
+
+from utils.periods import DIFFERENCE_COLUMN, KEY_COLUMN, TOLERANCE
+
+NEW = "Nova divergência"
+RESOLVED = "Resolvida"
+CHANGED = "Alterada"
+SITUATION_COLUMN = "SITUAÇÃO"
+PREVIOUS_COLUMN = "ANTERIOR"
+CHANGE_COLUMN = "VARIAÇÃO"
+
+
+def align_runs(
+    before: tuple[np.ndarray, np.ndarray], after: tuple[np.ndarray, np.ndarray]
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Aligns the differences of two runs on the union of their keys, a key missing from a run counting as 0.
+
+    Args:
+        before (tuple[np.ndarray, np.ndarray]): The keys of the previous run, sorted and distinct, and their
+            differences.
+        after (tuple[np.ndarray, np.ndarray]): The same for the new run.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, np.ndarray]: The keys of either run, sorted, and the difference of each
+            in the previous and in the new run.
+    """
+    keys = np.concatenate([before[0], after[0]])
+    # Two sorted runs: the stable sort (timsort) finds them and merges them in a single linear pass
+    order = np.argsort(keys, kind="stable")
+    merged = keys[order]
+    starts = np.concatenate([[True], merged[1:] != merged[:-1]])[: merged.size]
+    slots = np.cumsum(starts) - 1  # the position of each merged key in the union
+    union = merged[starts]
+    previous, current = np.zeros(union.size), np.zeros(union.size)
+    from_before = order < before[0].size
+    previous[slots[from_before]] = before[1][order[from_before]]
+    current[slots[~from_before]] = after[1][order[~from_before] - before[0].size]
+    return union, previous, current
+
+
+def diff_runs(before: tuple[np.ndarray, np.ndarray], after: tuple[np.ndarray, np.ndarray]) -> DataFrame:
+    """Lists the keys whose difference appeared, vanished or changed from a run to the next.
+
+    Args:
+        before (tuple[np.ndarray, np.ndarray]): The keys of the previous run, sorted and distinct, and their
+            differences.
+        after (tuple[np.ndarray, np.ndarray]): The same for the new run.
+
+    Returns:
+        DataFrame: KEY_COLUMN, the situation (NEW, RESOLVED or CHANGED), the previous and the new difference
+            and the change, the keys in order.
+    """
+    keys, previous, current = align_runs(before, after)
+    was, now = np.abs(previous) >= TOLERANCE, np.abs(current) >= TOLERANCE
+    change = np.round(current - previous, 2)
+    situations = np.select(
+        [now & ~was, was & ~now, was & now & (np.abs(change) >= TOLERANCE)], [NEW, RESOLVED, CHANGED], ""
+    )
+    keep = situations != ""
+    return DataFrame(
+        {
+            KEY_COLUMN: keys[keep],
+            SITUATION_COLUMN: situations[keep].astype(object),
+            PREVIOUS_COLUMN: np.round(previous[keep], 2),
+            DIFFERENCE_COLUMN: np.round(current[keep], 2),
+            CHANGE_COLUMN: change[keep],
+        }
+    )
@@ -0,0 +1,63 @@
+import pytest
+from cache import MemoizedFunction, bounded_cache, cache_stats, configure_cache, is_number
+from format_brl_currency import format_brl_currency
+
+
+def test_hits_and_misses():
+    square = MemoizedFunction(lambda value: value * value, maxsize=4)
+    square(2)
+    square(2)
+    square(3)
+    stats = square.cache_stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+    assert stats["size"] == 2
+
+def test_evictions():
+    square = MemoizedFunction(lambda value: value * value, maxsize=2)
+    for value in range(5):
+        square(value)
+    stats = square.cache_stats()
+    assert stats["evictions"] == 3
+    assert stats["size"] == 2
+
+def test_bypass():
+    square = MemoizedFunction(lambda value: value * value, maxsize=2, bypass=is_number)
+    assert square(3) == 9
+    assert square(4) == 16
+    stats = square.cache_stats()
+    assert stats["bypasses"] == 2
+    assert stats["misses"] == 0
+
+def test_resize():
+    square = MemoizedFunction(lambda value: value * value, maxsize=2)
+    square(1)
+    square.resize(8)
+    assert square.maxsize == 8
+    assert square.cache_stats()["misses"] == 0
+
+def test_typed():
+    name = MemoizedFunction(lambda value: type(value).__name__, maxsize=2, typed=True)
+    assert name(1) == "int"
+    assert name(1.0) == "float"
+
+def test_signed_zero():
+    assert format_brl_currency(0.0) == format_brl_currency.__wrapped__(0.0)
+    assert format_brl_currency(-0.0) == format_brl_currency.__wrapped__(-0.0) != format_brl_currency(0.0)
+
+def test_registry():
+    @bounded_cache(maxsize=2)
+    def registered_double(value):
+        return value * 2
+
+    registered_double(1)
+    assert cache_stats()["registered_double"]["misses"] == 1
+    configure_cache("registered_double", 16)
+    assert registered_double.maxsize == 16
+
+def test_configure_unknown_cache():
+    with pytest.raises(ValueError):
+        configure_cache("unknown", 16)
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,22 @@
+import numpy as np
+import pytest
+from cnpj import REASON_CHECK, REASON_EMPTY, REASON_LENGTH, cnpj_valid, cpf_valid, key_valid, reject_reasons
+
+
+def test_cnpj_valid():
+    values = np.array([11222333000181, 11222333000182, 191, 0, 11111111111111, 10**14 + 11222333000181])
+    assert cnpj_valid(values).tolist() == [True, False, True, False, False, False]
+
+def test_cpf_valid():
+    values = np.array([52998224725, 52998224726, 11111111111, 0])
+    assert cpf_valid(values).tolist() == [True, False, False, False]
+
+def test_key_valid():
+    assert key_valid(np.array([11222333000181, 52998224725, 12345])).tolist() == [True, True, False]
+
+def test_reject_reasons():
+    reasons = reject_reasons(np.array([0, 10**14, 12345]))
+    assert reasons.tolist() == [REASON_EMPTY, REASON_LENGTH, REASON_CHECK]
+
+if __name__ == "__main__":
+    pytest.main()
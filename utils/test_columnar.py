@@ -0,0 +1,65 @@
+import io
+import struct
+
+import numpy as np
+import pandas as pd
+import pytest
+from columnar import MAGIC, ColumnarFile, dumps, loads
+
+
+def sample_frame():
+    return pd.DataFrame(
+        {
+            "RECOLHEDOR": np.array([12345678000190, 98765432000155], dtype=np.int64),
+            "VALOR": [1234.56, -0.01],
+            "CNPJ": pd.array([1, None], dtype="Int64"),
+            "DIFERENÇAS": pd.array([0.5, None], dtype="Float64"),
+            "DOCUMENTO": np.array(["2024NS000001", "ação"], dtype=object),
+            "CNO": np.array([1, None], dtype=object),
+        },
+        index=np.arange(1, 3),
+    )
+
+
+def test_round_trip():
+    frame = sample_frame()
+    frames, meta = loads(dumps({"siafi": frame}, {"sum": np.float64(1.5), "count": 2}))
+    pd.testing.assert_frame_equal(frames["siafi"], frame)
+    assert meta == {"sum": 1.5, "count": 2}
+
+def test_range_index_and_empty_frame():
+    frame = pd.DataFrame({"VALOR": np.array([], dtype=np.float64)})
+    frames, _ = loads(dumps({"empty": frame}))
+    pd.testing.assert_frame_equal(frames["empty"], frame)
+
+def test_read_selected_columns():
+    file = ColumnarFile(dumps({"siafi": sample_frame(), "efd": sample_frame()}))
+    assert file.frames == ["siafi", "efd"]
+    frame = file.read("efd", ["VALOR", "RECOLHEDOR"])
+    assert list(frame.columns) == ["VALOR", "RECOLHEDOR"]
+    assert frame["VALOR"].tolist() == [1234.56, -0.01]
+
+def test_invalid_file():
+    with pytest.raises(ValueError):
+        ColumnarFile(b"not a session file")
+
+def test_truncated_file():
+    data = dumps({"siafi": sample_frame()})
+    file = ColumnarFile(data[:-10])
+    with pytest.raises(ValueError):
+        file.read("siafi")
+
+def test_unsupported_version():
+    data = bytearray(dumps({"siafi": sample_frame()}))
+    struct.pack_into("<8sH", data, 0, MAGIC, 99)
+    with pytest.raises(ValueError):
+        ColumnarFile(data)
+
+def test_read_from_file():
+    frame = sample_frame()
+    file = ColumnarFile(io.BytesIO(dumps({"siafi": frame}, {"period": "2024-01"})))
+    assert file.meta == {"period": "2024-01"}
+    pd.testing.assert_frame_equal(file.read("siafi", ["VALOR", "CNPJ"]), frame[["VALOR", "CNPJ"]])
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,20 @@
+import pytest
+
+from benchmarks import reference
+from benchmarks.differential import differential, run_all
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_fast_paths_match_reference(seed):
+    outcomes = run_all(cases=2000, rows=300, seed=seed, repeat=1)
+    assert [outcome["name"] for outcome in outcomes if outcome["mismatches"]] == []
+
+def test_differential_reports_mismatches():
+    cases = [("1.234,56",), ("abc",), (None,), (float("nan"),), (-2.5,), (-0.0,)]
+    outcome = differential("float", reference.float_converter, lambda value: abs(reference.float_converter(value)), cases, 1)
+    assert len(outcome["mismatches"]) == 2  # -2.5 and -0.0
+    outcome = differential("int", reference.integer_converter, int, [("12",), (float("nan"),)], 1)
+    assert outcome["mismatches"] == []  # both return 12 and both raise ValueError
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,84 @@
+import io
+import zipfile
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from headless.stubs import install_stubs
+
+install_stubs()
+
+# pylint: disable=wrong-import-position
+from benchmarks.bench_pipeline import run_pipeline  # noqa: E402
+from benchmarks.synthetic import generate  # noqa: E402
+from pub_sub.pub_sub import pub_sub  # noqa: E402
+from sheets.export import export  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def result():
+    sheets = {}
+
+    def measure(name, stage):
+        stage()
+        sheets.setdefault(name.split(".")[0], getattr(stage, "__self__", None))
+
+    run_pipeline(generate(rows=400, cnpjs=60, mismatch=0.3), measure)
+    parse = sheets["parse"]
+    yield parse.df.reset_index(drop=True), parse.export_views()
+    pub_sub.reset()
+
+@pytest.fixture
+def large():
+    rng = np.random.default_rng(0)
+    size = 25_000  # more than two chunks
+    siafi, efd = rng.normal(size=size).round(2), rng.normal(size=size).round(2)
+    frame = pd.DataFrame(
+        {
+            "RECOLHEDOR": rng.integers(10**13, 10**14, size=size),
+            "VALOR_SIAFI": siafi,
+            "CNPJ": rng.integers(10**13, 10**14, size=size),
+            "VALOR_EFD": efd,
+            "DIFERENÇAS": (siafi - efd).round(2),
+        }
+    )
+    return frame, {"Conciliação": None, "SIAFI maior": siafi > efd, "EFD maior": efd > siafi}
+
+def expected(frame, mask):
+    return frame if mask is None else frame[mask].reset_index(drop=True)
+
+def test_xlsx_round_trip(result):
+    frame, views = result
+    assert list(views) == ["Conciliação", "SIAFI maior", "EFD maior"]
+    buffer, _ = export(frame, views, "xlsx")
+    sheets = pd.read_excel(buffer, sheet_name=None)
+    assert list(sheets) == list(views)
+    for title, mask in views.items():
+        pd.testing.assert_frame_equal(sheets[title], expected(frame, mask), check_dtype=False)
+
+@pytest.mark.parametrize("fixture", ["result", "large"])
+def test_csv_zip_round_trip(request, fixture):
+    frame, views = request.getfixturevalue(fixture)
+    buffer, mime = export(frame, views, "csv")
+    assert mime == "application/zip"
+    with zipfile.ZipFile(buffer) as archive:
+        assert archive.namelist() == [f"{title}.csv" for title in views]
+        for title, mask in views.items():
+            data = io.BytesIO(archive.read(f"{title}.csv"))
+            read = pd.read_csv(data, sep=";", decimal=",", encoding="utf-8-sig")
+            pd.testing.assert_frame_equal(read, expected(frame, mask), check_dtype=False)
+
+def test_empty_view(large):
+    frame, _ = large
+    buffer, _ = export(frame, {"Vazia": np.zeros(frame.shape[0], dtype=bool)}, "csv")
+    with zipfile.ZipFile(buffer) as archive:
+        read = pd.read_csv(io.BytesIO(archive.read("Vazia.csv")), sep=";", encoding="utf-8-sig")
+    assert read.columns.tolist() == frame.columns.tolist() and read.empty
+
+def test_unknown_format(large):
+    with pytest.raises(ValueError):
+        export(large[0], {}, "ods")
+
+if __name__ == "__main__":
+    pytest.main()
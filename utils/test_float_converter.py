@@ -21,6 +21,12 @@ def test_string_input_with_dot_and_comma():
 def test_string_input_with_multiple_dots():
     assert float_converter("1.234.567,89") == 1234567.89
 
+def test_string_input_with_multiple_dots_without_comma():
+    assert float_converter("1.234.567") == 1234.567
+
+def test_string_input_with_currency_symbol():
+    assert float_converter("R$ 1.234,56") == 1234.56
+
 def test_string_input_invalid():
     assert float_converter("invalid") == 0.0
 
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+from hierarchy import build_hierarchy, children, entry_rows
+
+CNPJ = np.array([11222333000281, 11222333000181, 99888777000100, 11222333000181, 11222333000181])
+CNO = np.array([0, 512345670002, 0, 512345670001, 512345670002])
+VALUES = {"VALOR": np.array([5.0, 1.0, -2.0, 0.0, 3.0])}
+
+
+def test_levels_without_cno():
+    hierarchy = build_hierarchy(CNPJ, VALUES)
+    raiz, cnpj = hierarchy["levels"]
+    assert raiz["key"].tolist() == [11222333, 99888777]
+    assert raiz["rows"].tolist() == [4, 1]
+    assert raiz["sums"]["VALOR"].tolist() == [9.0, -2.0]
+    assert raiz["counts"]["VALOR"].tolist() == [3, 1]
+    assert cnpj["key"].tolist() == [11222333000181, 11222333000281, 99888777000100]
+    assert cnpj["sums"]["VALOR"].tolist() == [4.0, 5.0, -2.0]
+    assert children(hierarchy, 0, 0) == slice(0, 2)
+
+def test_levels_with_cno():
+    hierarchy = build_hierarchy(CNPJ, VALUES, CNO)
+    raiz, cnpj, cno = hierarchy["levels"]
+    assert [level["name"] for level in hierarchy["levels"]] == ["raiz", "cnpj", "cno"]
+    assert cno["key"].tolist() == [512345670001, 512345670002, 0, 0]
+    assert cno["rows"].tolist() == [1, 2, 1, 1]
+    assert cnpj["sums"]["VALOR"].tolist() == [4.0, 5.0, -2.0]
+    assert raiz["rows"].sum() == CNPJ.size
+
+def test_entry_rows():
+    hierarchy = build_hierarchy(CNPJ, VALUES, CNO)
+    assert sorted(entry_rows(hierarchy, 0, 0).tolist()) == [0, 1, 3, 4]
+    assert sorted(entry_rows(hierarchy, 2, 1).tolist()) == [1, 4]
+    assert entry_rows(hierarchy, 1, 2).tolist() == [2]
+
+def test_empty():
+    hierarchy = build_hierarchy(CNPJ[:0], {"VALOR": VALUES["VALOR"][:0]}, CNO[:0])
+    assert all(level["key"].size == 0 for level in hierarchy["levels"])
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,83 @@
+import io
+
+import pandas as pd
+import pytest
+
+from headless.stubs import install_stubs
+
+install_stubs()
+
+# pylint: disable=wrong-import-position
+from benchmarks.synthetic import generate, to_csv  # noqa: E402
+from components.infos import siafi_info  # noqa: E402
+from components.tables import siafi_table  # noqa: E402
+from sheets.ingestion import (  # noqa: E402
+    EAGER_BYTES_PER_CELL,
+    STREAMING_BYTES_PER_CELL,
+    assemble,
+    iter_chunks,
+    plan_ingestion,
+    read_spill,
+    read_streaming,
+)
+from sheets.preflight import PREFLIGHTS  # noqa: E402
+from sheets.siafi import Siafi  # noqa: E402
+from sheets.table import READERS  # noqa: E402
+from utils.upload import BufferReader  # noqa: E402
+
+NAMES = ["RECOLHEDOR", "DOCUMENTO", "VALOR"]
+
+
+@pytest.fixture(scope="module", params=["xlsx", "csv"])
+def upload(request):
+    workbooks = generate(rows=300, cnpjs=30, **({"writer": to_csv} if request.param == "csv" else {}))
+    return request.param, workbooks.siafi
+
+def test_plan_thresholds():
+    size, rows, columns = 50 * 2**20, 100_000, 3  # a large workbook, whose frame is smaller
+    eager = size + rows * columns * EAGER_BYTES_PER_CELL
+    streaming = size + rows * columns * STREAMING_BYTES_PER_CELL
+    assert plan_ingestion(size, rows, columns, eager)["strategy"] == "eager"
+    assert plan_ingestion(size, rows, columns, eager - 1)["strategy"] == "streaming"
+    assert plan_ingestion(size, rows, columns, streaming)["strategy"] == "streaming"
+    plan = plan_ingestion(size, rows, columns, streaming - 1)
+    assert plan["strategy"] == "spill"
+    assert plan["estimate"] <= plan["budget"] == streaming - 1
+    assert "excede o limite" in plan["reason"]
+    with pytest.raises(ValueError, match="limite de memória"):
+        plan_ingestion(size, rows, columns, size)
+
+@pytest.mark.parametrize("reader", [read_streaming, read_spill])
+def test_strategies_match_eager(upload, reader):
+    file_format, data = upload
+    layout = PREFLIGHTS[file_format](io.BytesIO(data), NAMES)
+    eager = READERS[file_format](io.BytesIO(data), layout, NAMES)
+    pd.testing.assert_frame_equal(reader(io.BytesIO(data), layout, NAMES), eager)
+
+def test_chunks_match_eager(upload):
+    file_format, data = upload
+    layout = PREFLIGHTS[file_format](io.BytesIO(data), NAMES)
+    eager = READERS[file_format](io.BytesIO(data), layout, NAMES)
+    chunks = list(iter_chunks(io.BytesIO(data), layout, chunk_rows=70))
+    assert len(chunks) == 5
+    frame = assemble(NAMES, [list(parts) for parts in zip(*chunks)])
+    pd.testing.assert_frame_equal(frame, eager, check_dtype=False)
+
+def test_plan_and_notes_in_describe(upload):
+    file_format, data = upload
+    siafi = Siafi(NAMES, siafi_table, siafi_info)
+    siafi._file = BufferReader(data)  # pylint: disable=protected-access
+    siafi.memory_budget = 1
+    with pytest.raises(ValueError):
+        siafi.read_steps().send(None)  # not even spilling fits one byte
+    siafi.memory_budget = 2**30
+    siafi._file = BufferReader(data)  # pylint: disable=protected-access
+    siafi.read()
+    siafi.sanitize_columns()
+    siafi.set_describe()
+    assert siafi.plan["strategy"] == "eager"
+    assert siafi.describe["reading"].startswith(f"{file_format.upper()} eager: 300 linhas")
+    assert siafi.describe["notes"] == []
+
+if __name__ == "__main__":
+    pytest.main()
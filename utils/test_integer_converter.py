@@ -19,6 +19,9 @@ def test_string_input_with_only_non_digits():
 def test_string_input_with_special_characters():
     assert integer_converter("12!@#34") == 1234
 
+def test_string_input_with_cnpj_mask():
+    assert integer_converter("12.345.678/0001-90") == 12345678000190
+
 def test_empty_string_input():
     assert integer_converter("") == 0
 
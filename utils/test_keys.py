@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+from keys import CODE_BITS, cno_codebook, group_sums, lookup, pack_keys
+
+
+def test_packed_keys_sort_as_pairs():
+    cnpj = np.array([99999999999999, 11222333000181, 11222333000181, 11222333000181])
+    cno = np.array([0, 512345670001, 0, 900000000000])
+    keys = pack_keys(cnpj, cno, cno_codebook(cno))
+    pairs = sorted(zip(cnpj.tolist(), cno.tolist()))
+    assert [(cnpj[i], cno[i]) for i in np.argsort(keys)] == pairs
+    assert keys.dtype == np.int64
+
+def test_codebook_overflow():
+    codebook = np.arange((1 << CODE_BITS) + 1)
+    assert pack_keys(np.array([1]), np.array([0]), codebook) is None
+
+def test_cnpj_out_of_range():
+    with pytest.raises(ValueError):
+        pack_keys(np.array([-1]), np.array([0]), cno_codebook())
+
+def test_lookup():
+    keys = np.array([10, 20, 30])
+    values = np.array([20, 5, 30, 40])
+    assert lookup(values, keys, np.array([1, 2, 3]), values).tolist() == [2, 5, 3, 40]
+    assert lookup(values, keys[:0], keys[:0], values).tolist() == values.tolist()
+
+def test_group_sums():
+    labels, sums, counts = group_sums(np.array([1, 1, 2, 5, 5, 5]), np.array([1.0, 2.0, 3.0, 4.0, 5.0, 6.0]))
+    assert labels.tolist() == [1, 2, 5]
+    assert sums.tolist() == [3.0, 3.0, 15.0]
+    assert counts.tolist() == [2, 1, 3]
+    labels, sums, counts = group_sums(np.array([], dtype=np.int64), np.array([]))
+    assert labels.size == sums.size == counts.size == 0
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from headless.stubs import install_stubs
+
+install_stubs()
+
+# pylint: disable=wrong-import-position
+from components.component import Variables  # noqa: E402
+from components.infos import parse_info  # noqa: E402
+from components.tables import parse_table  # noqa: E402
+from sheets import parse as parse_module  # noqa: E402
+from sheets.parse import TOP_ITEMS, Parse  # noqa: E402
+
+
+def greater(differences):
+    size = len(differences)
+    return pd.DataFrame(
+        {
+            "RECOLHEDOR": np.arange(1, size + 1),
+            "CNPJ": np.arange(1, size + 1) * 10,
+            "VALOR_SIAFI": np.zeros(size),
+            "VALOR_EFD": np.zeros(size),
+            "DIFERENÇAS": np.array(differences, dtype=np.float64),
+        }
+    )
+
+@pytest.fixture
+def parse():
+    typical = 100 + np.linspace(-1, 1, 50)
+    large = 10_000.0 + np.arange(TOP_ITEMS + 2)  # two outliers out of the largest differences
+    siafi = greater(np.concatenate([typical, large, [0.01]]))  # and a low-side outlier
+    parse = Parse(parse_table, parse_info)
+    parse._df = pd.concat([siafi, greater(-typical)])  # pylint: disable=protected-access
+    parse._df_siafi_greater = siafi  # pylint: disable=protected-access
+    parse._df_efd_greater = greater(-typical)  # pylint: disable=protected-access
+    return parse
+
+def test_atypical_out_of_the_top(parse):
+    parse.set_describe()
+    describe = parse.describe
+    assert describe["greater_siafi_outliers"] == TOP_ITEMS + 3
+    assert all(item["outlier"] for item in describe["greater_siafi_top"])
+    assert [item["recolhedor"] for item in describe["greater_siafi_atypical"]] == [52, 51, 63]
+    assert describe["greater_siafi_atypical_more"] == 0
+    assert describe["greater_efd_outliers"] == 0 and describe["greater_efd_atypical"] == []
+
+def test_atypical_capped(parse, monkeypatch):
+    monkeypatch.setattr(parse_module, "OUTLIER_ITEMS", 2)
+    parse.set_describe()
+    assert [item["recolhedor"] for item in parse.describe["greater_siafi_atypical"]] == [52, 51]
+    assert parse.describe["greater_siafi_atypical_more"] == 1
+    parse_info.variables = Variables(describe=parse.describe, ready=True)
+    html = parse_info.render()
+    assert "Recolhedor 63" not in html and "E mais 1 atípicas" in html
+    parse_info.unset_var()
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+from periods import PeriodStore, check_period, cumulative_differences, recurring_mismatches
+
+
+def result(keys, differences):
+    return pd.DataFrame(
+        {"CHAVE": np.array(keys, dtype=np.int64), "VALOR_SIAFI": 0.0, "DIFERENÇAS": np.array(differences)}
+    )
+
+@pytest.fixture
+def store(tmp_path):
+    store = PeriodStore(str(tmp_path))
+    store.save("2024-01", result([10, 20, 30], [1.0, 0.0, -2.0]))
+    store.save("2024-02", result([10, 20, 20], [0.5, 1.0, -1.0]))  # 20 nets to zero over two rows
+    store.save("2024-03", result([10, 30], [0.25, 3.0]))
+    store.save("2024-04", result([10], [0.0]))
+    return store
+
+def test_partitions(store):
+    assert store.periods() == ["2024-01", "2024-02", "2024-03", "2024-04"]
+    assert store.periods("2024-02", "2024-03") == ["2024-02", "2024-03"]
+    assert store.meta("2024-02")["period"] == "2024-02"
+    assert store.read("2024-03", ["DIFERENÇAS"]).columns.tolist() == ["DIFERENÇAS"]
+    store.save("2024-04", result([40], [1.0]))  # a corrected month replaces the stored one
+    assert store.read("2024-04")["CHAVE"].tolist() == [40]
+    store.remove("2024-04")
+    assert store.periods() == ["2024-01", "2024-02", "2024-03"]
+
+def test_recurring_mismatches(store):
+    recurring = recurring_mismatches(store)
+    assert recurring["CHAVE"].tolist() == [10]
+    assert recurring["MESES"].tolist() == [3]
+    assert recurring["DIFERENÇAS"].tolist() == [1.75]
+    assert recurring["ÚLTIMO"].tolist() == ["2024-03"]
+    assert recurring_mismatches(store, 2)["CHAVE"].tolist() == [10, 30]
+    assert recurring_mismatches(store, 2, start="2024-02")["CHAVE"].tolist() == [10]
+    assert recurring_mismatches(store, 3, start="2024-02").empty
+
+def test_cumulative_differences(store):
+    cumulative = cumulative_differences(store, end="2024-03")
+    assert cumulative.columns.tolist() == ["CHAVE", "2024-01", "2024-02", "2024-03"]
+    assert cumulative["CHAVE"].tolist() == [10, 20, 30]
+    assert cumulative["2024-03"].tolist() == [1.75, 0.0, 1.0]
+    assert cumulative["2024-01"].tolist() == [1.0, 0.0, -2.0]
+
+def test_invalid_period(tmp_path):
+    with pytest.raises(ValueError):
+        check_period("2024-13")
+    with pytest.raises(ValueError):
+        PeriodStore(str(tmp_path)).save("2024-01", pd.DataFrame({"CHAVE": [1]}))
+
+if __name__ == "__main__":
+    pytest.main()
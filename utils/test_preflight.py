@@ -0,0 +1,117 @@
+import io
+
+import pytest
+from openpyxl import Workbook
+
+from sheets.preflight import (
+    LAYOUTS,
+    check_sample,
+    find_columns,
+    preflight,
+    preflight_csv,
+    sniff_encoding,
+)
+
+SIAFI = LAYOUTS["SIAFI"]
+EFD = LAYOUTS["EFD"]
+
+
+def workbook(rows, write_only=False, title="Plan1", before=None):
+    book = Workbook(write_only=write_only)
+    if write_only:
+        if before is not None:
+            book.create_sheet(before).append(["Resumo"])
+        sheet = book.create_sheet(title)
+    else:
+        sheet = book.active
+        sheet.title = title
+    for row in rows:
+        sheet.append(row)
+    buffer = io.BytesIO()
+    book.save(buffer)
+    buffer.seek(0)
+    return buffer
+
+def siafi_rows(count, header=("RECOLHEDOR", "DOCUMENTO", "VALOR")):
+    rows = [
+        {"RECOLHEDOR": f"12.345.678/0001-{n % 100:02d}", "DOCUMENTO": f"2024NS{n:06d}", "VALOR": f"{n},50"}
+        for n in range(count)
+    ]
+    order = header or SIAFI
+    data = [tuple(row[name] for name in order) for row in rows]
+    return data if header is None else [tuple(header)] + data
+
+def test_find_columns():
+    assert find_columns(("RECOLHEDOR", "DOCUMENTO", "VALOR"), SIAFI) == [0, 1, 2]
+    assert find_columns((None, "Valor", "Recolhedor", "Documento hábil"), SIAFI) == [2, 3, 1]
+    assert find_columns(("CNPJ/CPF", "CNO", "VALOR"), EFD) == [0, 1, 2]
+    assert find_columns(("CNPJ", "VALOR"), EFD) is None
+
+def test_preflight_shifted_and_reordered_header():
+    shifted = [(None,) + row for row in siafi_rows(30, ("VALOR", "RECOLHEDOR", "DOCUMENTO"))]
+    rows = [("Relatório SIAFI",), ()] + shifted
+    layout = preflight(workbook(rows), SIAFI)
+    assert layout["header_row"] == 2
+    assert layout["usecols"] == [2, 3, 1]
+    assert layout["rows"] == 30
+    assert layout["notes"] == ["Cabeçalho encontrado na linha 3.", "Colunas reordenadas: 2, 3, 1."]
+
+def test_preflight_reads_the_sheet_with_the_header():
+    layout = preflight(workbook(siafi_rows(10), write_only=True, title="Dados", before="Capa"), SIAFI)
+    assert layout["sheet"] == "Dados"
+    assert layout["notes"] == ["Dados lidos da aba 'Dados'."]
+
+def test_preflight_without_header():
+    layout = preflight(workbook(siafi_rows(10, header=None)), SIAFI)
+    assert layout["header_row"] == 0 and layout["usecols"] == [0, 1, 2]
+    assert layout["notes"] == ["Cabeçalho não encontrado; usando as primeiras colunas da primeira aba."]
+
+def test_preflight_rejects_other_layout():
+    with pytest.raises(ValueError, match="parece ser SIAFI"):
+        preflight(workbook(siafi_rows(10)), EFD)
+    with pytest.raises(ValueError, match="parece ser EFD"):
+        preflight_csv(io.BytesIO(b"CNPJ;CNO;VALOR\n1;2;3,00\n"), SIAFI)
+
+def test_preflight_rejects_other_files():
+    with pytest.raises(ValueError, match="XLSX"):
+        preflight(io.BytesIO(b"PK\x03\x04 not a zip"), SIAFI)
+
+def test_check_sample():
+    with pytest.raises(ValueError, match="linhas de dados"):
+        check_sample([], SIAFI, [0, 1, 2])
+    with pytest.raises(ValueError, match="menos de 4 colunas"):
+        check_sample([("1", "2", "3")], SIAFI, [0, 1, 3])
+    with pytest.raises(ValueError, match="RECOLHEDOR"):
+        check_sample([("abc", "x", "1,00")] * 3, SIAFI, [0, 1, 2])
+    with pytest.raises(ValueError, match="VALOR"):
+        check_sample([("1", "x", None)] * 3, SIAFI, [0, 1, 2])
+    check_sample([("1", "x", "1,00"), ("abc", "y", 2.5), ("3", "z", "3")], SIAFI, [0, 1, 2])
+
+def test_row_estimate_with_dimension():
+    layout = preflight(workbook(siafi_rows(5000)), SIAFI)
+    assert layout["rows"] == 5000
+
+def test_row_estimate_without_dimension():
+    assert preflight(workbook(siafi_rows(50), write_only=True), SIAFI)["rows"] == 50
+    estimate = preflight(workbook(siafi_rows(20000), write_only=True), SIAFI)["rows"]
+    assert 0.8 * 20000 < estimate < 1.2 * 20000
+
+@pytest.mark.parametrize("delimiter", [";", ",", "\t", "|"])
+def test_csv_delimiter(delimiter):
+    text = "\n".join(delimiter.join(row) for row in [("RECOLHEDOR", "DOCUMENTO", "VALOR"), ("1", "a", "2")] * 2)
+    layout = preflight_csv(io.BytesIO(text.encode()), SIAFI)
+    assert layout["delimiter"] == delimiter
+    assert layout["usecols"] == [0, 1, 2]
+
+def test_csv_encoding():
+    text = "Relatório\nRECOLHEDOR;DOCUMENTO;VALOR;Descrição\n12.345.678/0001-90;NS1;1.234,56;ação\n"
+    latin = preflight_csv(io.BytesIO(text.encode("latin-1")), SIAFI)
+    assert latin["encoding"] == "latin-1"
+    assert latin["header_row"] == 1
+    assert latin["rows"] == 1
+    assert preflight_csv(io.BytesIO(text.encode("utf-8")), SIAFI)["encoding"] == "utf-8"
+    assert sniff_encoding(b"\xef\xbb\xbfRECOLHEDOR") == "utf-8-sig"
+    assert sniff_encoding("ação".encode("utf-8")[:-1]) == "utf-8"  # a character cut by the probe
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,98 @@
+import io
+
+import numpy as np
+import pytest
+from profiler import deep_size, frame_size, profiled, profiler
+
+
+class Frame:
+    shape = (3, 2)
+
+    def memory_usage(self, index=True, deep=False):
+        return Sizes()
+
+
+class Sizes:
+    def sum(self):
+        return 48
+
+
+class Stage:
+    def __init__(self):
+        self._df = Frame()
+        self.name = "stage"
+
+    @profiled
+    def run(self):
+        return "done"
+
+    @profiled(label=lambda self: self.name)
+    def labelled(self):
+        return "done"
+
+    @profiled
+    def fail(self):
+        raise ValueError("stage failed")
+
+
+@pytest.fixture(autouse=True)
+def reset_profiler():
+    profiler.clear()
+    profiler.disable()
+    yield
+    profiler.clear()
+    profiler.disable()
+
+def test_disabled_records_nothing():
+    assert Stage().run() == "done"
+    with profiler.stage("block"):
+        pass
+    assert profiler.records == []
+
+def test_enabled_records_method():
+    profiler.enable()
+    assert Stage().run() == "done"
+    record = profiler.records[0]
+    assert record["name"] == "Stage.run"
+    assert record["rows"] == 3
+    assert record["memory"] == 48
+    assert record["seconds"] >= 0.0
+
+def test_label():
+    profiler.enable()
+    Stage().labelled()
+    assert profiler.records[0]["name"] == "Stage.labelled(stage)"
+
+def test_failing_stage_is_recorded():
+    profiler.enable()
+    with pytest.raises(ValueError):
+        Stage().fail()
+    assert [record["name"] for record in profiler.records] == ["Stage.fail"]
+    assert profiler.records[0]["rows"] == 3
+
+def test_stage_context():
+    profiler.enable()
+    with profiler.stage("upload") as record:
+        record["memory"] = 1024
+    assert profiler.records[0]["name"] == "upload"
+    assert profiler.records[0]["memory"] == 1024
+
+def test_frame_size_of_other_objects():
+    assert frame_size(None) == (None, None)
+    assert frame_size([1, 2]) == (None, None)
+
+def test_deep_size_counts_views_once():
+    array = np.arange(1000, dtype=np.int64)
+    assert deep_size(array) == 8000
+    assert deep_size(array[10:]) < 200
+    assert deep_size({"a": array, "b": array[10:]}) < 8400
+    assert deep_size(None) == 0
+
+def test_deep_size_of_files():
+    file = io.BytesIO(b"abc" * 100)
+    assert deep_size(file) == 300
+    file.close()
+    assert deep_size(file) == 0
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+from progress import Cancelled, CancelToken, Runs, drain, drive, stage_steps
+
+
+def counting(done):
+    for rows in (10, 20):
+        yield {"label": "t", "stage": "read", "step": 0, "steps": 1, "rows": rows, "total": 20}
+        done.append(rows)
+    return "df"
+
+def test_drain_and_drive():
+    done = []
+    assert drain(counting(done)) == "df" and done == [10, 20]
+    reports = []
+    assert asyncio.run(drive(counting([]), CancelToken(), reports.append)) == "df"
+    assert [progress["rows"] for progress in reports] == [10, 20]
+
+def test_cancel_between_steps():
+    done = []
+    token = CancelToken()
+
+    def report(progress):
+        if progress["rows"] == 20:
+            token.cancel()
+
+    with pytest.raises(Cancelled):
+        asyncio.run(drive(counting(done), token, report))
+    assert done == [10]
+
+def test_stage_steps():
+    calls = []
+
+    def first():
+        calls.append(1)
+
+    def second():
+        calls.append(2)
+
+    progress = list(stage_steps("Siafi", [first, second], lambda: len(calls)))
+    assert [p["stage"] for p in progress] == ["first", "second"]
+    assert [p["rows"] for p in progress] == [0, 1] and calls == [1, 2]
+
+def test_runs():
+    runs = Runs()
+    stale = runs.start("siafi")
+    token = runs.start("siafi")
+    assert stale.cancelled and not token.cancelled
+    runs.finish("siafi", stale)
+    assert runs.running("siafi")
+    runs.cancel_all()
+    assert token.cancelled and not runs.running("siafi")
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,92 @@
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+from query import check_query, query_frame, sql_query
+
+from headless import store as result_store
+from headless.store import ResultStore
+
+
+@pytest.fixture
+def result():
+    return pd.DataFrame(
+        {
+            "RECOLHEDOR": pd.array([1, 2, 3, 4, 5], dtype="Int64"),
+            "CNPJ": pd.array([10, 20, 10, pd.NA, 20], dtype="Int64"),
+            "VALOR_SIAFI": [5.0, 2.0, 3.0, 1.0, 4.0],
+            "VALOR_EFD": [5.0, 3.0, 1.0, 0.0, 2.0],
+            "DIFERENÇAS": [0.0, -1.0, 2.0, 1.0, 2.0],
+        }
+    )
+
+def test_query_frame(result):
+    assert query_frame(result, {})["RECOLHEDOR"].tolist() == [1, 2, 3, 4, 5]
+    assert query_frame(result, {"cnpj": 10})["RECOLHEDOR"].tolist() == [1, 3]
+    assert query_frame(result, {"sign": 1})["RECOLHEDOR"].tolist() == [3, 4, 5]
+    descending = query_frame(result, {"order_by": "DIFERENÇAS", "descending": True})
+    assert descending["RECOLHEDOR"].tolist() == [3, 5, 4, 1, 2]  # ties keep their order
+    page = query_frame(result, {"order_by": "DIFERENÇAS", "limit": 2, "offset": 1})
+    assert page["RECOLHEDOR"].tolist() == [1, 4]
+    assert query_frame(result, {"period": "2024-01"}).shape[0] == 5  # no period column to filter
+
+def test_sql_query():
+    statement, parameters = sql_query({"cnpj": 10, "order_by": "CNPJ", "limit": 3}, "r", ["CNPJ"])
+    assert statement == 'SELECT "CNPJ" FROM "r" WHERE "CNPJ" = ? ORDER BY "CNPJ", rowid LIMIT ? OFFSET ?'
+    assert parameters == [10, 3, 0]
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        {},
+        {"cnpj": 20},
+        {"recolhedor": 3},
+        {"sign": 0},
+        {"sign": 1, "order_by": "VALOR_EFD", "descending": True},
+        {"order_by": "DIFERENÇAS", "descending": True, "limit": 3, "offset": 1},
+        {"period": "2024-02"},
+    ],
+)
+def test_store_matches_frame(result, query):
+    with ResultStore() as store:
+        assert store.save("2024-01", result) == 5
+        store.save("2024-02", result.iloc[:2])
+        stored = store.query({**query, "period": query.get("period", "2024-01")})
+    expected = query_frame(result.iloc[:2] if query.get("period") == "2024-02" else result, query)
+    assert stored["RECOLHEDOR"].tolist() == expected["RECOLHEDOR"].tolist()
+    assert np.array_equal(stored["DIFERENÇAS"].to_numpy(), expected["DIFERENÇAS"].to_numpy())
+
+def test_store_replaces_period(result):
+    with ResultStore() as store:
+        store.save("2024-01", result)
+        store.save("2024-01", result.iloc[:1])
+        store.save("2024-03", result)
+        assert store.periods() == ["2024-01", "2024-03"]
+        assert store.query({"period": "2024-01"}).shape[0] == 1
+        store.remove("2024-03")
+        assert store.periods() == ["2024-01"]
+
+def test_failed_bulk_save_rolls_back(result, monkeypatch):
+    monkeypatch.setattr(result_store, "BULK_ROWS", 1)
+    with ResultStore() as store:
+        store.save("2024-01", result)
+        monkeypatch.setattr(result_store, "signs", lambda values: np.full(values.size, None))  # NOT NULL fails
+        with pytest.raises(sqlite3.IntegrityError):
+            store.save("2024-01", result)
+        assert store.query({"period": "2024-01"})["RECOLHEDOR"].tolist() == [1, 2, 3, 4, 5]
+        indexes = store._connection.execute(  # pylint: disable=protected-access
+            "SELECT COUNT(*) FROM sqlite_master WHERE type = 'index'"
+        ).fetchone()
+        assert indexes == (len(result_store.INDEXED_COLUMNS),)
+
+def test_invalid_query():
+    with pytest.raises(ValueError):
+        check_query({"sign": 2})
+    with pytest.raises(ValueError):
+        check_query({"order_by": "DOCUMENTO"})
+    with pytest.raises(ValueError):
+        check_query({"limit": -1})
+
+if __name__ == "__main__":
+    pytest.main()
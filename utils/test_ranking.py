@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+from ranking import outliers, robust_scores, top_n
+
+
+def test_top_n():
+    values = np.array([1.0, -9.0, 3.0, np.nan, 7.0, -2.0])
+    assert top_n(values, 3).tolist() == [1, 4, 2]
+    assert top_n(values, 10).tolist() == [1, 4, 2, 5, 0, 3]
+    assert top_n(values, 0).size == 0
+    assert top_n(np.array([]), 3).size == 0
+
+def test_top_n_matches_sort():
+    values = np.random.default_rng(0).normal(size=10_000)
+    expected = np.argsort(-np.abs(values), kind="stable")[:50]
+    assert top_n(values, 50).tolist() == expected.tolist()
+
+def test_outliers():
+    values = np.array([10.0, 12.0, 11.0, 9.0, 10.5, 500.0, -300.0])
+    assert outliers(values).tolist() == [False] * 5 + [True, True]
+    assert not outliers(np.full(5, 3.0)).any()
+    assert outliers(np.array([0.0, 0.0, 0.0, 0.0, 100.0])).tolist() == [False] * 4 + [True]
+    assert robust_scores(np.array([])).size == 0
+
+if __name__ == "__main__":
+    pytest.main()
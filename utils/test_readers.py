@@ -0,0 +1,84 @@
+import csv
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+from headless.stubs import install_stubs
+
+install_stubs()
+
+# pylint: disable=wrong-import-position
+from sheets.preflight import detect_format, preflight, preflight_csv  # noqa: E402
+from sheets.table import float_column, integer_column, read_csv_file, read_xlsx  # noqa: E402
+
+NAMES = ["RECOLHEDOR", "DOCUMENTO", "VALOR"]
+
+
+def workbook(rows):
+    book = Workbook()
+    for row in rows:
+        book.active.append(row)
+    buffer = io.BytesIO()
+    book.save(buffer)
+    buffer.seek(0)
+    return buffer
+
+def test_read_csv_brazilian_numbers():
+    text = "RECOLHEDOR;DOCUMENTO;VALOR\n12.345.678/0001-90;NS1;1.234,56\n98765432000110;NS2;-7,5\n"
+    file = io.BytesIO(text.encode())
+    frame = read_csv_file(file, preflight_csv(file, NAMES), NAMES)
+    assert frame.columns.tolist() == NAMES
+    assert frame["VALOR"].tolist() == [1234.56, -7.5]
+    assert frame["RECOLHEDOR"].tolist() == ["12.345.678/0001-90", "98765432000110"]  # masked keys keep it text
+
+@pytest.mark.parametrize("delimiter, encoding", [("\t", "latin-1"), (",", "utf-8"), ("|", "utf-8-sig")])
+def test_read_csv_delimiter_and_encoding(delimiter, encoding):
+    rows = [("Relatório de recolhimentos",), ("VALOR", "Descrição", "RECOLHEDOR", "DOCUMENTO")]
+    rows += [("10,5", "ação", "123", "NS1"), ("2.000", "obs", "456", "NS2"), (), ("3", "", "789", "NS3")]
+    text = io.StringIO()
+    csv.writer(text, delimiter=delimiter, lineterminator="\n").writerows(rows)
+    file = io.BytesIO(text.getvalue().encode(encoding))
+    layout = preflight_csv(file, NAMES)
+    assert (layout["delimiter"], layout["encoding"]) == (delimiter, encoding)
+    frame = read_csv_file(file, layout, NAMES)
+    assert frame["RECOLHEDOR"].tolist() == [123, 456, 789]
+    assert frame["DOCUMENTO"].tolist() == ["NS1", "NS2", "NS3"]
+    assert frame["VALOR"].tolist() == [10.5, 2000.0, 3.0]
+
+def test_read_xlsx_reordered_columns_and_fallback():
+    file = workbook([("VALOR", "RECOLHEDOR", "DOCUMENTO"), (1.5, 123, "NS1"), (2.25, 456, "NS2")])
+    layout = preflight(file, NAMES)
+    frame = read_xlsx(file, layout, NAMES, engines=["missing", "openpyxl"])
+    assert frame.columns.tolist() == NAMES
+    assert frame["RECOLHEDOR"].tolist() == [123, 456]
+    assert frame["VALOR"].tolist() == [1.5, 2.25]
+    assert layout["notes"][-1].startswith("Leitor missing falhou")
+    with pytest.raises(ValueError):
+        read_xlsx(file, layout, NAMES, engines=["missing"])
+
+def test_detect_format():
+    assert detect_format(workbook([("RECOLHEDOR",)])) == "xlsx"
+    assert detect_format(io.BytesIO(b"RECOLHEDOR;VALOR\n"), "dados.xlsx.csv") == "csv"
+    with pytest.raises(ValueError):
+        detect_format(io.BytesIO(b"RECOLHEDOR;VALOR\n"), "dados.xlsx")
+    with pytest.raises(ValueError):
+        detect_format(io.BytesIO(b"\x00\x01binary"), "dados.bin")
+
+def test_integer_column():
+    assert integer_column(pd.Series(["12.345", "abc", None], dtype=object)).tolist() == [12345, 0, 0]
+    assert integer_column(pd.Series(np.array([1, 2], dtype=np.int32))).dtype == np.int64
+    assert integer_column(pd.Series(np.array([1, 2], dtype=np.uint64))).dtype == np.int64
+    assert integer_column(pd.Series([1, 2], dtype="Int64")).dtype == np.int64
+    with pytest.raises((TypeError, ValueError)):
+        integer_column(pd.Series([1, None], dtype="Int64"))
+
+def test_float_column():
+    assert float_column(pd.Series(["1.234,56", "R$ 2,5", None], dtype=object)).tolist() == [1234.56, 2.5, 0.0]
+    assert float_column(pd.Series([1, 2])).dtype == np.float64
+    assert float_column(pd.Series([True, False])).tolist() == [1.0, 0.0]
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+from rowdiff import diff_rows, key_label, row_keys
+
+
+def test_diff():
+    old_keys = np.array([10, 20, 30, 40])
+    new_keys = np.array([5, 10, 30, 35, 40, 50])
+    old = {"VALOR": np.array([1.0, 2.0, np.nan, 4.0])}
+    new = {"VALOR": np.array([0.5, 1.0, np.nan, 3.5, 4.5, 5.0])}
+    diff = diff_rows(old_keys, new_keys, old, new)
+    assert diff["removed"].tolist() == [1]
+    assert diff["inserted"].tolist() == [0, 3, 5]
+    assert diff["anchors"].tolist() == [1, 4, -1]
+    assert diff["changed"].tolist() == [4]
+
+def test_no_patch():
+    table = {"VALOR": np.array([1.0, 2.0])}
+    assert diff_rows(np.array([1, 2]), np.array([2, 1]), table, table) is None
+    assert diff_rows(np.array([1, 2]), np.array([1, 1]), table, table) is None
+    assert diff_rows(np.array([1, 2]), np.array([1, 2]), table, {"OUTRO": table["VALOR"]}) is None
+
+def test_empty_sides():
+    table = {"VALOR": np.array([1.0, 2.0])}
+    empty = {"VALOR": np.array([])}
+    keys = np.array([1, 2])
+    diff = diff_rows(keys[:0], keys, empty, table)
+    assert diff["inserted"].tolist() == [0, 1] and diff["anchors"].tolist() == [-1, -1]
+    assert diff_rows(keys, keys[:0], table, empty)["removed"].tolist() == [0, 1]
+
+def test_row_keys():
+    table = {"CNPJ": np.array([11222333000181, 1]), "CNO": np.array([0, 512345670001])}
+    assert row_keys(table, ["CNPJ"]).tolist() == [11222333000181, 1]
+    keys = row_keys(table, ["CNPJ", "CNO"])
+    assert keys.size == 2 and keys[0] != keys[1]
+    moved = {"CNPJ": table["CNPJ"][::-1], "CNO": table["CNO"][::-1]}
+    assert diff_rows(keys, row_keys(moved, ["CNPJ", "CNO"]), table, moved) is None
+    assert key_label(table, ["CNPJ", "CNO"], 1) == "1-512345670001"
+
+if __name__ == "__main__":
+    pytest.main()
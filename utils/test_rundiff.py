@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+from rundiff import CHANGED, NEW, RESOLVED, align_runs, diff_runs
+
+
+def run(keys, differences):
+    return np.array(keys, dtype=np.int64), np.array(differences, dtype=np.float64)
+
+def test_align():
+    keys, previous, current = align_runs(run([10, 20, 40], [1.0, 2.0, 4.0]), run([5, 20, 30, 40], [0.5, 2.5, 3.0, 4.0]))
+    assert keys.tolist() == [5, 10, 20, 30, 40]
+    assert previous.tolist() == [0.0, 1.0, 2.0, 0.0, 4.0]
+    assert current.tolist() == [0.5, 0.0, 2.5, 3.0, 4.0]
+
+def test_diff():
+    before = run([10, 20, 30, 40, 50], [1.0, 2.0, 0.0, 4.0, 0.0])
+    after = run([10, 20, 30, 40, 60], [1.0, 0.0, 3.0, 4.25, 0.0])
+    diff = diff_runs(before, after)
+    assert diff["CHAVE"].tolist() == [20, 30, 40]
+    assert diff["SITUAÇÃO"].tolist() == [RESOLVED, NEW, CHANGED]
+    assert diff["ANTERIOR"].tolist() == [2.0, 0.0, 4.0]
+    assert diff["VARIAÇÃO"].tolist() == [-2.0, 3.0, 0.25]
+
+def test_empty_runs():
+    empty = run([], [])
+    assert diff_runs(empty, empty).empty
+    assert diff_runs(empty, run([1], [1.0]))["SITUAÇÃO"].tolist() == [NEW]
+    assert diff_runs(run([1], [1.0]), empty)["SITUAÇÃO"].tolist() == [RESOLVED]
+
+if __name__ == "__main__":
+    pytest.main()
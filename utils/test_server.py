@@ -0,0 +1,73 @@
+import asyncio
+import json
+import urllib.error
+import urllib.request
+from urllib.parse import urlencode
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from benchmarks.synthetic import generate, to_csv
+from headless.server import ReconciliationService, serve
+
+
+def fetch(port, method, path, body=None):
+    request = urllib.request.Request(f"http://127.0.0.1:{port}{path}", data=body, method=method)
+    try:
+        with urllib.request.urlopen(request, timeout=60) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as error:
+        return error.code, json.loads(error.read())
+
+async def scenario(service):
+    server = await serve("127.0.0.1", 0, service)
+    port = server.sockets[0].getsockname()[1]
+
+    async def call(method, path, body=None):
+        return await asyncio.to_thread(fetch, port, method, path, body)
+
+    workbooks = generate(rows=300, cnpjs=40, writer=to_csv)
+    async with server:
+        _, siafi = await call("POST", "/uploads", workbooks.siafi)
+        status, efd = await call("POST", "/uploads", workbooks.efd)
+        assert status == 200 and not efd["cached"]
+        assert (await call("POST", "/uploads", workbooks.efd))[1] == {**efd, "cached": True}
+        body = json.dumps({"siafi": siafi["id"], "efd": efd["id"]}).encode()
+        first, second = await asyncio.gather(
+            call("POST", "/reconciliations", body), call("POST", "/reconciliations", body)
+        )
+        assert first[0] == second[0] == 200 and first[1]["id"] == second[1]["id"]
+        status, again = await call("POST", "/reconciliations", body)
+        assert again["cached"] and again["rows"] == first[1]["rows"] > 0
+        rows = f"/reconciliations/{again['id']}/rows"
+        query = urlencode({"limit": 5, "offset": 2, "order_by": "DIFERENÇAS", "descending": 1})
+        status, page = await call("GET", f"{rows}?{query}")
+        assert status == 200 and len(page["rows"]) == 5 and page["total"] == again["rows"]
+        differences = [row["DIFERENÇAS"] for row in page["rows"]]
+        assert differences == sorted(differences, reverse=True)
+        status, positive = await call("GET", f"{rows}?sign=1")
+        assert all(row["DIFERENÇAS"] > 0 for row in positive["rows"])
+        assert (await call("GET", f"{rows}?sign=7"))[0] == 400
+        assert (await call("GET", f"{rows}?limit=-1"))[0] == 400
+        assert (await call("GET", f"{rows}?offset=-1"))[0] == 400
+        assert (await call("GET", "/reconciliations/desconhecida"))[0] == 404
+        assert (await call("GET", "/uploads"))[0] == 405
+        unknown = json.dumps({"siafi": siafi["id"], "efd": "x"}).encode()
+        assert (await call("POST", "/reconciliations", unknown))[0] == 404
+
+def test_service_on_localhost():
+    service = ReconciliationService(executor=ThreadPoolExecutor(max_workers=1))
+    try:
+        asyncio.run(scenario(service))
+    finally:
+        service.close()
+
+def test_process_pool():
+    service = ReconciliationService(workers=1)
+    try:
+        asyncio.run(scenario(service))
+    finally:
+        service.close()
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,105 @@
+import pandas as pd
+import pytest
+
+from headless.stubs import install_stubs
+
+install_stubs()
+
+# pylint: disable=wrong-import-position
+from benchmarks.synthetic import generate, to_csv  # noqa: E402
+from components.infos import efd_info, parse_info, siafi_info  # noqa: E402
+from components.tables import efd_rejects, efd_table, parse_table, siafi_rejects, siafi_table  # noqa: E402
+from pub_sub.pub_sub import pub_sub  # noqa: E402
+from sheets.efd import Efd  # noqa: E402
+from sheets.parse import Parse  # noqa: E402
+from sheets.siafi import Siafi  # noqa: E402
+from sheets.snapshot import restore_session, save_session  # noqa: E402
+from utils.cnpj import REASON_SITE  # noqa: E402
+from utils.upload import BufferReader  # noqa: E402
+
+
+def sheets():
+    siafi = Siafi(["RECOLHEDOR", "DOCUMENTO", "VALOR"], siafi_table, siafi_info, siafi_rejects)
+    efd = Efd(["CNPJ", "CNO", "VALOR"], efd_table, efd_info, efd_rejects)
+    return siafi, efd, Parse(parse_table, parse_info)
+
+@pytest.fixture(scope="module")
+def session():
+    pub_sub.reset()
+    workbooks = generate(rows=300, cnpjs=40, cnos=2, by_site=True, writer=to_csv)
+    siafi, efd, parse = sheets()
+    for sheet, data, invalid in (
+        (siafi, workbooks.siafi, b"123;2024NS999999;10,00\n"),
+        (efd, workbooks.efd, b"11.111.111/1111-11;0;5,00\n"),
+    ):
+        sheet._file = BufferReader(data + invalid)  # pylint: disable=protected-access
+        sheet.read()
+        sheet.pipeline()
+    parse._siafi = siafi  # pylint: disable=protected-access
+    parse._efd = efd  # pylint: disable=protected-access
+    parse.key_mode = "cnpj_cno"  # runs the pipeline
+    yield siafi, efd, parse
+    pub_sub.reset()
+
+def test_session_round_trip(session):
+    siafi, efd, parse = session
+    assert (siafi.rejects["MOTIVO"] != REASON_SITE).sum() == 1 and efd.rejects.shape[0] == 1
+    restored = sheets()
+    restore_session(save_session(siafi, efd, parse), *restored)
+    for original, copy in zip(session, restored):
+        pd.testing.assert_frame_equal(copy.df, original.df)
+        assert copy.describe == original.describe
+    for original, copy in zip(session[:2], restored[:2]):
+        pd.testing.assert_frame_equal(copy.rejects, original.rejects)
+        assert "MOTIVO" in copy.rejects.columns
+    assert restored[2].key_mode == "cnpj_cno"
+
+def test_session_without_analysis(session):
+    siafi, _, _ = session
+    empty_efd, empty_parse = sheets()[1:]
+    data = save_session(siafi, empty_efd, empty_parse)
+    restored = sheets()
+    restore_session(data, *restored)
+    pd.testing.assert_frame_equal(restored[0].df, siafi.df)
+    assert restored[1].df is None and restored[2].df is None
+    with pytest.raises(ValueError):
+        save_session(*sheets())
+
+def test_corrupt_session(session):
+    data = save_session(*session)
+    for size in (4, 20, len(data) // 2, len(data) - 10):
+        with pytest.raises((ValueError, KeyError)):  # the errors the session input handles
+            restore_session(data[:size], *sheets())
+    corrupt = bytearray(data)
+    corrupt[-100:] = bytes(100)
+    with pytest.raises(ValueError):
+        restore_session(corrupt, *sheets())
+
+def test_set_view_again(session):
+    for sheet in session[:2]:
+        sheet.set_view()  # already subscribed by the pipeline, without a reset in between
+        assert pub_sub.is_subscribed(sheet.table.name) and pub_sub.is_subscribed(sheet.info.name)
+
+def test_cancelled_run_keeps_baseline(session):
+    siafi, efd, _ = session
+    corrected = sheets()[1]
+    workbooks = generate(rows=300, cnpjs=40, cnos=2, by_site=True, mismatch=0.0, writer=to_csv)
+    corrected._file = BufferReader(workbooks.efd)  # pylint: disable=protected-access
+    corrected.read()
+    corrected.pipeline()
+    parse = sheets()[2]
+    parse._siafi, parse._efd = siafi, efd  # pylint: disable=protected-access
+    parse.pipeline()
+    parse._efd = corrected  # pylint: disable=protected-access
+    steps = parse.pipeline_steps()
+    for progress in steps:
+        if progress["stage"] == "plot":  # after set_run_diff
+            steps.close()  # cancelled
+            break
+    assert not parse.run_diff.empty
+    parse._efd = efd  # pylint: disable=protected-access
+    parse.pipeline()
+    assert parse.run_diff.empty  # compared with the first run, not the cancelled one
+
+if __name__ == "__main__":
+    pytest.main()
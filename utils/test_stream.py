@@ -0,0 +1,76 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from headless.stubs import install_stubs
+
+document = install_stubs()
+
+# pylint: disable=wrong-import-position
+from components.component import Component, Variables  # noqa: E402
+from pub_sub.pub_sub import PROGRESSIVE_ROWS, pub_sub  # noqa: E402
+
+ROWS = 3000
+
+
+@pytest.fixture
+def table():
+    pub_sub.reset()
+    component = Component(
+        name="T", template="table.html", rows_template="table_rows.html", _id="t", parent_id="t-out", btn_id="t-btn"
+    )
+    columns = {"CHAVE": np.arange(ROWS), "VALOR": np.arange(ROWS) / 2}
+    component.variables = Variables(table=columns, len=ROWS, columns=list(columns), ready=True)
+    pub_sub.subscribe(component)
+    for element_id in ("t-out", "t-rows"):
+        document.getElementById(element_id).innerHTML = ""  # the stub document has no tree, rows go apart
+    yield component
+    pub_sub.reset()
+
+async def drain():
+    """Runs the renders started so far to their end, raising their errors."""
+    await asyncio.gather(*(asyncio.all_tasks() - {asyncio.current_task()}))
+
+def test_stream_renders_every_row(table):
+    async def scenario():
+        assert ROWS > PROGRESSIVE_ROWS and pub_sub.publish(table.name)
+        assert pub_sub.is_published(table.name)
+        await drain()
+
+    asyncio.run(scenario())
+    assert document.getElementById("t-rows").innerHTML.count("<tr ") == ROWS
+    assert not pub_sub._streams  # pylint: disable=protected-access
+
+def test_publish_then_unpublish(table):
+    async def scenario():
+        pub_sub.publish(table.name)
+        assert pub_sub.unpublish(table.name)
+        await drain()
+
+    asyncio.run(scenario())
+    assert document.getElementById("t-out").innerHTML == document.getElementById("t-rows").innerHTML == ""
+    assert not pub_sub._streams  # pylint: disable=protected-access
+
+def test_publish_then_unsubscribe(table):
+    async def scenario():
+        pub_sub.publish(table.name)
+        pub_sub.unsubscribe(table.name)
+        await drain()
+
+    asyncio.run(scenario())
+    assert document.getElementById("t-out").innerHTML == document.getElementById("t-rows").innerHTML == ""
+    assert not pub_sub.is_subscribed(table.name) and not pub_sub._streams  # pylint: disable=protected-access
+
+def test_publish_twice(table):
+    async def scenario():
+        pub_sub.publish(table.name)
+        pub_sub.publish(table.name)
+        await drain()
+
+    asyncio.run(scenario())
+    assert document.getElementById("t-rows").innerHTML.count("<tr ") == ROWS
+    assert not pub_sub._streams  # pylint: disable=protected-access
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,90 @@
+import asyncio
+import io
+
+import pytest
+from upload import BufferReader, read_upload
+
+
+class Chunk:
+    def __init__(self, data):
+        self.data = data
+        self.length = len(data)
+
+    def assign_to(self, target):
+        target[:] = self.data
+
+
+class Result:
+    def __init__(self, chunk=None):
+        self.done = chunk is None
+        self.value = chunk
+
+
+class StreamReader:
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+
+    async def read(self):
+        if self.chunks:
+            return Result(Chunk(self.chunks.pop(0)))
+        return Result()
+
+
+class Stream:
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def getReader(self):
+        return StreamReader(self.chunks)
+
+
+class File:
+    def __init__(self, chunks, size=None, name="SIAFI.xlsx"):
+        self.chunks = chunks
+        self.name = name
+        self.size = sum(len(chunk) for chunk in chunks) if size is None else size
+
+    def stream(self):
+        return Stream(self.chunks)
+
+
+def test_read():
+    reader = BufferReader(bytearray(b"abcdef"))
+    assert reader.read(2) == b"ab"
+    assert reader.read() == b"cdef"
+    assert reader.read(1) == b""
+
+def test_seek_and_tell():
+    reader = BufferReader(b"abcdef")
+    assert reader.seek(-2, io.SEEK_END) == 4
+    assert reader.read() == b"ef"
+    reader.seek(1)
+    reader.seek(2, io.SEEK_CUR)
+    assert reader.tell() == 3
+
+def test_negative_seek():
+    with pytest.raises(ValueError):
+        BufferReader(b"abc").seek(-1)
+
+def test_relative_seek_before_start():
+    reader = BufferReader(b"abc")
+    assert reader.seek(-10, io.SEEK_END) == 0
+
+def test_readinto():
+    reader = BufferReader(b"abcdef")
+    target = bytearray(4)
+    assert reader.readinto(target) == 4
+    assert target == b"abcd"
+
+def test_read_upload():
+    reader, peak = asyncio.run(read_upload(File([b"abc", b"defgh"])))
+    assert reader.read() == b"abcdefgh"
+    assert reader.name == "SIAFI.xlsx"
+    assert peak == 8 + 5
+
+def test_read_upload_longer_than_size():
+    with pytest.raises(ValueError):
+        asyncio.run(read_upload(File([b"abc", b"def"], size=4)))
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from headless.stubs import install_stubs
+
+install_stubs()
+
+# pylint: disable=wrong-import-position
+from components.infos import efd_info, siafi_info  # noqa: E402
+from components.tables import efd_rejects, efd_table, siafi_rejects, siafi_table  # noqa: E402
+from pub_sub.pub_sub import pub_sub  # noqa: E402
+from sheets.efd import Efd  # noqa: E402
+from sheets.siafi import Siafi  # noqa: E402
+from utils.cnpj import REASON_CHECK, REASON_EMPTY, REASON_LENGTH, REASON_SITE  # noqa: E402
+
+CNPJ = 11222333000181
+CPF = 52998224725
+SHORT_CNPJ = 100000000082  # a valid CNPJ with 12 digits
+SITE = 100000000001
+OTHER_SITE = 100000000002
+
+
+@pytest.fixture(autouse=True)
+def reset():
+    pub_sub.reset()
+    yield
+    pub_sub.reset()
+
+def frame(keys, name="RECOLHEDOR"):
+    return pd.DataFrame(
+        {name: np.array(keys, dtype=np.int64), "DOCUMENTO": [f"NS{n}" for n in range(len(keys))]},
+        index=np.arange(1, len(keys) + 1),
+    ).assign(VALOR=np.arange(1.0, len(keys) + 1))
+
+def test_validate_keys():
+    efd = Efd(["CNPJ", "CNO", "VALOR"], efd_table, efd_info, efd_rejects)
+    efd._df = frame([CNPJ, 0, CPF, 10**15, CNPJ, 123, SITE], "CNPJ")  # pylint: disable=protected-access
+    efd.validate_keys()
+    assert efd.df["CNPJ"].tolist() == [CNPJ, CPF, CNPJ]
+    assert efd.df.index.tolist() == [1, 2, 3]
+    assert efd.rejects["CNPJ"].tolist() == [0, 10**15, 123, SITE]
+    assert efd.rejects["MOTIVO"].tolist() == [REASON_EMPTY, REASON_LENGTH, REASON_CHECK, REASON_CHECK]
+    assert efd.rejects.index.tolist() == [1, 2, 3, 4]
+    assert efd.rejects["DOCUMENTO"].tolist() == ["NS1", "NS3", "NS5", "NS6"]
+
+def test_validate_keys_all_valid():
+    efd = Efd(["CNPJ", "CNO", "VALOR"], efd_table, efd_info, efd_rejects)
+    efd._df = frame([CNPJ, CPF], "CNPJ")  # pylint: disable=protected-access
+    efd.validate_keys()
+    assert efd.df.shape[0] == 2 and efd.rejects.empty
+
+def test_siafi_keeps_12_digit_sites():
+    siafi = Siafi(["RECOLHEDOR", "DOCUMENTO", "VALOR"], siafi_table, siafi_info, siafi_rejects)
+    siafi._df = frame([CNPJ, SITE, SHORT_CNPJ, 123, OTHER_SITE])  # pylint: disable=protected-access
+    siafi.validate_keys()
+    assert siafi.df["RECOLHEDOR"].tolist() == [CNPJ, SITE, SHORT_CNPJ, OTHER_SITE]
+    assert siafi.rejects["MOTIVO"].tolist() == [REASON_CHECK]
+    efd = pd.DataFrame({"CNPJ": [CNPJ, CNPJ], "CNO": [0, SITE], "VALOR": [1.0, 2.0]})
+    assert siafi.declared_sites(efd)["RECOLHEDOR"].tolist() == [CNPJ, SITE, SHORT_CNPJ]
+    assert siafi.rejects["RECOLHEDOR"].tolist() == [123, OTHER_SITE]
+    assert siafi.rejects["MOTIVO"].tolist() == [REASON_CHECK, REASON_SITE]
+    assert siafi.rejects.index.tolist() == [1, 2]
+    assert siafi.df.shape[0] == 4  # a later Efd may declare the site
+    efd = pd.DataFrame({"CNPJ": [CNPJ], "CNO": [OTHER_SITE], "VALOR": [1.0]})
+    assert siafi.declared_sites(efd)["RECOLHEDOR"].tolist() == [CNPJ, SHORT_CNPJ, OTHER_SITE]
+    assert siafi.rejects["RECOLHEDOR"].tolist() == [123, SITE]
+    efd = pd.DataFrame({"CNPJ": [CNPJ, CNPJ], "CNO": [SITE, OTHER_SITE], "VALOR": [1.0, 2.0]})
+    assert siafi.declared_sites(efd).shape[0] == 4
+    assert siafi.rejects["RECOLHEDOR"].tolist() == [123]
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,160 @@
+"""
+This module contains the ingestion path of uploaded files, from the browser File to a Python file-like.
+
+The file is streamed in chunks straight into one preallocated buffer, which the readers consume through
+a memoryview, instead of copying the whole ArrayBuffer to bytes and then to a BytesIO.
+
+Author: Diógenes Dornelles Costa
+Creation Date: May 15, 2024
+Version: 1.0
+"""
+
+import io
+from typing import Any
+
+
+class BufferReader(io.RawIOBase):
+    """A read-only, seekable file-like over a buffer, which never copies the buffer as a whole."""
+
+    def __init__(self, buffer: Any, name: str = "") -> None:
+        """Initializes a BufferReader instance.
+
+        Args:
+            buffer (Any): Any object supporting the buffer protocol, e.g. bytearray or memoryview.
+            name (str, optional): The name of the uploaded file. Defaults to "".
+        """
+        super().__init__()
+        self.name = name
+        self._view = memoryview(buffer).cast("B")
+        self._position = 0
+
+    @property
+    def size(self) -> int:
+        """Gets the size of the buffer.
+
+        Returns:
+            int: The size, in bytes.
+        """
+        return self._view.nbytes
+
+    def getbuffer(self) -> memoryview:
+        """Gets a read-only view of the whole buffer.
+
+        Returns:
+            memoryview: The view.
+        """
+        return self._view.toreadonly()
+
+    def readable(self) -> bool:
+        """The reader is readable. Returns True"""
+        return True
+
+    def seekable(self) -> bool:
+        """The reader is seekable. Returns True"""
+        return True
+
+    def tell(self) -> int:
+        """Gets the current position. Returns int"""
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        """Moves the current position.
+
+        Args:
+            offset (int): The offset, relative to `whence`.
+            whence (int, optional): io.SEEK_SET, io.SEEK_CUR or io.SEEK_END. Defaults to io.SEEK_SET.
+
+        Like BytesIO, relative positions before the start are clamped to 0.
+
+        Raises:
+            ValueError: If `whence` is invalid or an absolute position is negative.
+
+        Returns:
+            int: The new position.
+        """
+        if whence == io.SEEK_SET:
+            if offset < 0:
+                raise ValueError(f"Negative seek position {offset}")
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = max(0, self._position + offset)
+        elif whence == io.SEEK_END:
+            position = max(0, self.size + offset)
+        else:
+            raise ValueError(f"Invalid whence ({whence})")
+        self._position = position
+        return position
+
+    def read(self, size: int | None = -1) -> bytes:
+        """Reads up to `size` bytes, copying only the requested slice.
+
+        Args:
+            size (int | None, optional): The number of bytes, or -1/None for the rest. Defaults to -1.
+
+        Returns:
+            bytes: The bytes read.
+        """
+        start = min(self._position, self.size)
+        end = self.size if size is None or size < 0 else min(start + size, self.size)
+        self._position = end
+        return self._view[start:end].tobytes()
+
+    def readall(self) -> bytes:
+        """Reads the rest of the buffer. Returns bytes"""
+        return self.read(-1)
+
+    def readinto(self, buffer: Any) -> int:
+        """Reads into a preallocated buffer.
+
+        Args:
+            buffer (Any): The writable destination.
+
+        Returns:
+            int: The number of bytes read.
+        """
+        target = memoryview(buffer).cast("B")
+        start = min(self._position, self.size)
+        end = min(start + target.nbytes, self.size)
+        target[: end - start] = self._view[start:end]
+        self._position = end
+        return end - start
+
+    def close(self) -> None:
+        """Releases the view of the buffer. Returns None"""
+        if not self.closed:
+            self._view.release()
+        super().close()
+
+
+async def read_upload(file: Any) -> tuple[BufferReader, int]:
+    """Streams a browser File into a BufferReader.
+
+    Each chunk of File.stream() is assigned directly into its slice of a buffer preallocated with the file
+    size, so the upload never holds more than the buffer plus one chunk.
+
+    Args:
+        file (Any): The browser File (a JsProxy).
+
+    Raises:
+        ValueError: If the stream is longer than the declared file size.
+
+    Returns:
+        tuple[BufferReader, int]: The reader and the peak memory of the upload, in bytes.
+    """
+    size = int(file.size)
+    view = memoryview(bytearray(size))
+    reader = file.stream().getReader()
+    offset = 0
+    largest_chunk = 0
+    while True:
+        result = await reader.read()
+        if result.done:
+            break
+        chunk = result.value
+        length = int(chunk.length)
+        if offset + length > size:
+            raise ValueError("Arquivo maior que o tamanho declarado.")
+        chunk.assign_to(view[offset : offset + length])
+        offset += length
+        largest_chunk = max(largest_chunk, length)
+    return BufferReader(view[:offset], str(file.name)), size + largest_chunk